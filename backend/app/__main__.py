@@ -1,18 +1,34 @@
+import asyncio
 import os
+import re
+import sys
 from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Optional
 
 import click
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 
 from .api.api import api_router
-from .config import load_settings
-from .database import init_db
+from .config import load_settings, settings, update_settings
+from .database import get_standalone_db, init_db
+from .embedding.extract_pool import extraction_pool
+from .embedding.extract_profile import PROFILES
+from .embedding.ocr_cache import prune_ocr_cache
+from .services.bulk_ingest import BulkIngestReport, bulk_ingest
+from .services.index_maintenance import (
+    IndexReport,
+    check_index,
+    compact_vector_store,
+    rebuild_index,
+)
+from .services.document_service import ingest_queue
+from .utils.admission import QueueFullError
+from .utils.upload import UPLOAD_FORM_OVERHEAD
 
 
 def create_app(config_file: Optional[Path] = None) -> FastAPI:
@@ -21,12 +37,22 @@ def create_app(config_file: Optional[Path] = None) -> FastAPI:
     @asynccontextmanager
     async def lifespan(app: FastAPI):
         """应用生命周期管理"""
+        warmup = None
         try:
             # 启动时初始化数据库
             await init_db()
+            # 在后台预热文本提取进程池
+            warmup = asyncio.create_task(extraction_pool.start())
+            # 启动文档处理队列，并恢复上次中断的任务
+            await ingest_queue.start()
             yield
         except Exception as e:
             print(f"Error during database cleanup: {e}")
+        finally:
+            await ingest_queue.stop()
+            if warmup:
+                warmup.cancel()
+            extraction_pool.shutdown()
 
     # 创建 FastAPI 应用
     app = FastAPI(
@@ -39,6 +65,59 @@ def create_app(config_file: Optional[Path] = None) -> FastAPI:
     # 注册路由
     app.include_router(api_router, prefix=settings.API_V1_STR)
 
+    # 根据 Content-Length 提前拒绝过大的上传，避免先把请求体写入临时文件
+    knowledge_prefix = re.escape(f"{settings.API_V1_STR}/knowledge")
+    upload_routes = [
+        ("POST", re.compile(f"{knowledge_prefix}/upload"), settings.MAX_UPLOAD_SIZE),
+        (
+            "POST",
+            re.compile(f"{knowledge_prefix}/upload/bulk"),
+            settings.MAX_BULK_UPLOAD_SIZE,
+        ),
+        # 替换文档文件
+        ("PUT", re.compile(f"{knowledge_prefix}/[^/]+/file"), settings.MAX_UPLOAD_SIZE),
+    ]
+
+    def upload_size_limit(request: Request) -> Optional[int]:
+        """上传文件的请求的大小上限，其他请求返回 None"""
+        for method, pattern, limit in upload_routes:
+            if request.method == method and pattern.fullmatch(request.url.path):
+                return limit
+        return None
+
+    @app.middleware("http")
+    async def limit_upload_size(request: Request, call_next):
+        limit = upload_size_limit(request)
+        content_length = request.headers.get("content-length")
+        if (
+            limit is not None
+            and content_length
+            and content_length.isdigit()
+            and int(content_length) > limit + UPLOAD_FORM_OVERHEAD
+        ):
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"文件大小超过限制: {content_length} > {limit}"},
+            )
+        return await call_next(request)
+
+    # 处理队列已满时，在接收请求体之前就拒绝上传
+    @app.middleware("http")
+    async def reject_when_ingest_queue_full(request: Request, call_next):
+        if upload_size_limit(request) is not None:
+            db = await get_standalone_db()
+            try:
+                await ingest_queue.check_capacity(db)
+            except QueueFullError as e:
+                return JSONResponse(
+                    status_code=429,
+                    content={"detail": str(e)},
+                    headers={"Retry-After": str(e.retry_after)},
+                )
+            finally:
+                await db.close()
+        return await call_next(request)
+
     # 配置 CORS
     app.add_middleware(
         CORSMiddleware,
@@ -99,5 +178,260 @@ def main(config_file: Optional[Path]):
     uvicorn.run(app, host="0.0.0.0", port=8000)
 
 
+class ProgressBars:
+    """依次显示各阶段的进度条，开始新阶段时结束上一个进度条"""
+
+    def __init__(self):
+        self.bar = None
+
+    def stage(self, label: str):
+        """返回开始该阶段时以总数调用的回调，其返回值为推进进度的回调"""
+
+        def start(length: int):
+            self.close()
+            self.bar = click.progressbar(length=length, label=label, show_pos=True)
+            self.bar.render_progress()
+            return self.bar.update
+
+        return start
+
+    def close(self):
+        if self.bar is not None:
+            self.bar.render_finish()
+            self.bar = None
+
+    def __enter__(self) -> "ProgressBars":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _echo_throughput(report: BulkIngestReport):
+    """输出处理耗时、吞吐量与失败的文件"""
+    elapsed = max(report.elapsed, 1e-9)
+    megabytes = report.bytes / (1024 * 1024)
+    click.echo(
+        f"耗时 {elapsed:.1f} 秒，{megabytes:.1f} MB，{report.chunks} 个文档块；"
+        f"吞吐量 {report.completed / elapsed * 60:.1f} 文档/分钟，"
+        f"{megabytes / elapsed:.2f} MB/秒，{report.chunks / elapsed:.1f} 文档块/秒"
+    )
+    for name, error in report.errors:
+        click.echo(f"  {name}: {error}", err=True)
+
+
+@click.command()
+@click.argument(
+    "directory",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+)
+@click.option(
+    "--config",
+    "config_file",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="配置文件，同启动服务时的参数。",
+)
+@click.option(
+    "--profile",
+    type=click.Choice(list(PROFILES)),
+    help="文本提取配置档，默认按文档类型的默认设置。",
+)
+@click.option("--description", help="所有文档的描述，默认为文件在目录中的相对位置。")
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=os.cpu_count() or 1,
+    show_default=True,
+    help="文本提取与 OCR 的进程数，默认占满所有 CPU 核心。",
+)
+@click.option(
+    "--documents",
+    type=click.IntRange(min=1),
+    help="同时处理的文档数量，默认与进程数相同。",
+)
+@click.option(
+    "--batch-size",
+    type=click.IntRange(min=1),
+    help="每批向量化的文档块数量，默认为 EMBEDDING_BATCH_SIZE。",
+)
+def ingest(
+    directory: Path,
+    config_file: Optional[Path],
+    profile: Optional[str],
+    description: Optional[str],
+    jobs: int,
+    documents: Optional[int],
+    batch_size: Optional[int],
+):
+    """
+    将目录中的所有受支持文件离线导入知识库。
+
+    中断后重新运行即可继续：已导入的文件会被跳过，处理失败的文件会重新处理。
+    导入期间请勿同时运行后端服务。
+    """
+    if config_file:
+        update_settings(config_file)
+    extraction_pool.workers = jobs
+    settings.EXTRACT_PROCESS_WORKERS = jobs
+    # 每个文档的提取大部分时间只占用一个进程，同时处理与进程数相同的文档才能占满进程池
+    settings.INGEST_WORKERS = documents or jobs
+    if batch_size:
+        settings.EMBEDDING_BATCH_SIZE = batch_size
+
+    with ProgressBars() as bars:
+        report = asyncio.run(
+            bulk_ingest(
+                directory,
+                profile=profile,
+                description=description,
+                workers=settings.INGEST_WORKERS,
+                on_registering=bars.stage("登记文件"),
+                on_processing=bars.stage("处理文档"),
+            )
+        )
+
+    unreadable = report.files - report.queued - report.skipped
+    click.echo(
+        f"共 {report.files} 个文件：完成 {report.completed}，失败 {report.failed}，"
+        f"跳过（已导入）{report.skipped}，无法导入 {unreadable}"
+    )
+    _echo_throughput(report)
+    if report.errors:
+        sys.exit(1)
+
+
+@click.group()
+@click.option(
+    "--config",
+    "config_file",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="配置文件，同启动服务时的参数。",
+)
+def index(config_file: Optional[Path]):
+    """
+    核对与修复知识库索引：SQLite 中的文档记录、上传目录中的文件与 Chroma 中的文档块。
+    """
+    if config_file:
+        update_settings(config_file)
+
+
+def _echo_index_report(report: IndexReport):
+    click.echo(
+        f"核对 {report.checked} 个文档的文档块，{report.skipped} 个文档上次核对后没有更新"
+    )
+    for document_id, (expected, actual) in report.mismatched.items():
+        click.echo(f"  文档块数量不一致: {document_id}（记录 {expected}，实际 {actual}）")
+    for document_id in report.stalled:
+        click.echo(f"  处理中断: {document_id}")
+    for document_id in report.missing_files:
+        click.echo(f"  上传文件丢失: {document_id}")
+    for document_id, count in report.orphan_vectors.items():
+        click.echo(f"  孤立文档块: {document_id}（{count} 个）")
+    for path in report.orphan_files:
+        click.echo(f"  残留文件: {path}")
+    if report.consistent:
+        click.echo("索引一致")
+
+
+full_option = click.option(
+    "--full",
+    is_flag=True,
+    help="完整核对：扫描整个向量数据库并核对所有文档，默认只核对上次核对后有更新的文档。",
+)
+queue_only_option = click.option(
+    "--queue-only",
+    is_flag=True,
+    help="只将需要重新处理的文档加入处理队列，由运行中的后端服务处理。",
+)
+
+
+@index.command()
+@full_option
+def verify(full: bool):
+    """核对索引并报告不一致之处，不做修改。"""
+    report, _, _ = asyncio.run(check_index(full=full))
+    _echo_index_report(report)
+    if not report.consistent:
+        sys.exit(1)
+
+
+@index.command()
+@full_option
+@queue_only_option
+def repair(full: bool, queue_only: bool):
+    """
+    核对并修复索引：删除孤立的文档块与残留文件，重新处理文档块缺失或处理中断的文档。
+
+    重新处理只向量化缺失的文档块，并优先使用提取结果缓存。
+    """
+    with ProgressBars() as bars:
+        report, requeued, processed = asyncio.run(
+            check_index(
+                full=full,
+                repair=True,
+                process=not queue_only,
+                on_processing=bars.stage("重新处理文档"),
+            )
+        )
+    _echo_index_report(report)
+    click.echo(
+        f"已删除 {sum(report.orphan_vectors.values())} 个孤立文档块、"
+        f"{len(report.orphan_files)} 个残留文件，重新处理 {len(requeued)} 个文档"
+    )
+    if processed:
+        _echo_throughput(processed)
+        if processed.errors:
+            sys.exit(1)
+
+
+@index.command()
+def compact():
+    """
+    压缩向量数据库，回收删除文档块后的空间，并将逐页 OCR 缓存清理到 OCR_CACHE_MAX_MB 以内。
+    执行期间请勿运行后端服务。
+    """
+    result = compact_vector_store()
+    mb = 1024 * 1024
+    click.echo(
+        f"向量数据库 {result.size_before / mb:.1f} MB → {result.size_after / mb:.1f} MB，"
+        f"删除 {len(result.removed_segments)} 个残留的索引目录"
+    )
+    pruned = prune_ocr_cache()
+    click.echo(
+        f"OCR 缓存 {pruned.size_before / mb:.1f} MB → {pruned.size_after / mb:.1f} MB，"
+        f"删除 {pruned.removed} 个最久未使用的页面"
+    )
+
+
+@index.command()
+@click.argument("document_ids", nargs=-1)
+@queue_only_option
+def rebuild(document_ids: tuple[str, ...], queue_only: bool):
+    """
+    删除文档的全部文档块并重新向量化，默认重建所有已完成或失败的文档。
+    """
+    with ProgressBars() as bars:
+        requeued, processed = asyncio.run(
+            rebuild_index(
+                list(document_ids) or None,
+                process=not queue_only,
+                on_processing=bars.stage("重建文档"),
+            )
+        )
+    click.echo(f"重建 {len(requeued)} 个文档")
+    if processed:
+        _echo_throughput(processed)
+        if processed.errors:
+            sys.exit(1)
+
+
+# 子命令，`python -m app <命令> ...`；不以子命令开头时启动后端服务
+COMMANDS = {"ingest": ingest, "index": index}
+
+
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        COMMANDS[sys.argv[1]](sys.argv[2:], prog_name=f"python -m app {sys.argv[1]}")
+    else:
+        main()
@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from .endpoints import knowledge, models, query
+from .endpoints import knowledge, metrics, models, query
 
 # 创建主路由
 api_router = APIRouter()
@@ -9,3 +9,4 @@ api_router = APIRouter()
 api_router.include_router(knowledge.router, prefix="/knowledge", tags=["knowledge"])
 api_router.include_router(query.router, prefix="/chat", tags=["chat"])
 api_router.include_router(models.router, prefix="/models", tags=["models"])
+api_router.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
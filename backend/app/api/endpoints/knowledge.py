@@ -1,27 +1,40 @@
 import os
-from typing import Optional
+from typing import List, Optional
 
 import aiosqlite
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile
 from loguru import logger
 
 from ...config import settings
 from ...database import get_db
+from ...embedding.extract_profile import get_profile
 from ...schemas import document as schemas
-from ...services.document_service import DocumentService
+from ...services.document_service import DocumentService, ingest_queue
+from ...utils.admission import QueueFullError
+from ...utils.upload import UploadBudget, UploadTooLargeError
 
 router = APIRouter()
 
 
+def too_many_requests(e: QueueFullError) -> HTTPException:
+    """队列已满时的 429 响应，Retry-After 为建议的重试等待秒数"""
+    return HTTPException(
+        status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)}
+    )
+
+
 @router.post("/upload", response_model=schemas.Document)
 async def upload_document(
     file: UploadFile = File(...),
     type: str = Form(...),
     description: Optional[str] = Form(None),
+    profile: Optional[str] = Form(None),
     db: aiosqlite.Connection = Depends(get_db),
 ):
     """
     上传文档到知识库
+
+    profile 为文本提取配置档（fast、balanced、accurate），未指定时按文档类型的默认设置
     """
     service = DocumentService(db)
 
@@ -39,22 +52,11 @@ async def upload_document(
             detail=f"不支持的文件类型: {os.path.splitext(file.filename)[1]}",
         )
 
-    # 获取文件大小
-    try:
-        content = await file.read()
-        file_size = len(content)
-        await file.seek(0)  # 重置文件指针
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"读取文件失败: {str(e)}")
-
-    # 检查文件大小
-    if file_size == 0:
-        raise HTTPException(status_code=400, detail="文件大小为0")
-
-    if file_size > settings.MAX_UPLOAD_SIZE:
+    # multipart 解析时已知文件大小，超限时无需再写盘
+    if file.size is not None and file.size > settings.MAX_UPLOAD_SIZE:
         raise HTTPException(
-            status_code=400,
-            detail=f"文件大小超过限制: {file_size} > {settings.MAX_UPLOAD_SIZE}",
+            status_code=413,
+            detail=f"文件大小超过限制: {file.size} > {settings.MAX_UPLOAD_SIZE}",
         )
 
     try:
@@ -62,12 +64,130 @@ async def upload_document(
             file=file,
             type=type,
             description=description,
+            profile=profile,
         )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except QueueFullError as e:
+        raise too_many_requests(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"创建文档失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"创建文档失败: {str(e)}")
 
 
+@router.post("/upload/bulk", response_model=schemas.BulkUploadResponse)
+async def upload_documents_bulk(
+    files: List[UploadFile] = File(...),
+    description: Optional[str] = Form(None),
+    profile: Optional[str] = Form(None),
+    db: aiosqlite.Connection = Depends(get_db),
+):
+    """
+    批量上传文档到知识库，支持多个文件或 zip 压缩包
+
+    文档类型由扩展名推断；所有文件写入磁盘并加入处理队列后立即返回各自的文档 ID，
+    单个文件失败不影响其他文件。profile 为所有文件使用的文本提取配置档，
+    批量导入价值较低的资料时可以使用 fast
+    """
+    service = DocumentService(db)
+    results = []
+
+    if profile:
+        try:
+            get_profile(profile)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # 队列已满时整体拒绝；处理过程中队列满了的文件会在各自的结果中报告错误
+    try:
+        await ingest_queue.check_capacity(db)
+    except QueueFullError as e:
+        raise too_many_requests(e)
+
+    # 文件数量与总大小按整个请求计算，压缩包中的文件按解压后计算
+    budget = UploadBudget(settings.MAX_BULK_UPLOAD_FILES, settings.MAX_BULK_UPLOAD_SIZE)
+    for file in files:
+        filename = file.filename or ""
+        logger.info(f"正在批量上传文件: {filename}, 大小: {file.size}")
+
+        try:
+            if filename.lower().endswith(".zip"):
+                results.extend(
+                    await service.create_documents_from_archive(
+                        file, description, profile, budget
+                    )
+                )
+                continue
+
+            if budget.files <= 0:
+                results.append({"filename": filename, "error": "文件数量超过限制"})
+                continue
+            budget.files -= 1
+            if not service.is_allowed_file(filename):
+                raise ValueError(
+                    f"不支持的文件类型: {os.path.splitext(filename)[1] or filename}"
+                )
+            document = await service.create_document(
+                file=file,
+                type=service.file_type_from_name(filename),
+                description=description,
+                profile=profile,
+            )
+            budget.bytes -= document["size"]
+            results.append({"filename": filename, "id": document["id"]})
+        except Exception as e:
+            logger.error(f"批量上传文件 {filename} 失败: {str(e)}")
+            results.append({"filename": filename, "error": str(e)})
+
+    return {"documents": results}
+
+
+@router.post("/estimate", response_model=schemas.IngestEstimateResponse)
+async def estimate_ingest_time(
+    files: List[UploadFile] = File(...),
+    profile: Optional[str] = Form(None),
+    db: aiosqlite.Connection = Depends(get_db),
+):
+    """
+    估计上传这些文件后的处理耗时，文件不会被保存
+
+    按页数、抽样得到的扫描页比例、幻灯片数与段落数估计各阶段的耗时，
+    并按历史处理耗时校准；eta 同时考虑了当前排队的文档
+    """
+    service = DocumentService(db)
+    results = []
+    for file in files:
+        filename = file.filename or ""
+        if not service.is_allowed_file(filename):
+            results.append(
+                {
+                    "filename": filename,
+                    "error": f"不支持的文件类型: {os.path.splitext(filename)[1] or filename}",
+                }
+            )
+            continue
+        try:
+            results.append(
+                await service.estimate_file(
+                    file, service.file_type_from_name(filename), profile
+                )
+            )
+        except (UploadTooLargeError, ValueError) as e:
+            results.append({"filename": filename, "error": str(e)})
+
+    metrics = await ingest_queue.metrics(db)
+    workers = max(1, settings.INGEST_WORKERS)
+    total = sum(result.get("total") or 0 for result in results)
+    return {
+        "files": results,
+        "total": round(total, 1),
+        "queue_wait": round(metrics["queued_cost"] / workers, 1),
+        "eta": round((metrics["queued_cost"] + total) / workers, 1),
+    }
+
+
 @router.get("/status/{document_id}", response_model=schemas.Document)
 async def get_document_status(
     document_id: str, db: aiosqlite.Connection = Depends(get_db)
@@ -82,6 +202,39 @@ async def get_document_status(
     return document
 
 
+@router.get("/{document_id}/preview", response_model=schemas.DocumentPreview)
+async def preview_document(
+    document_id: str,
+    page: int = Query(0, ge=0),
+    count: int = Query(1, ge=1, le=50),
+    db: aiosqlite.Connection = Depends(get_db),
+):
+    """
+    预览文档从 page 开始的 count 页提取结果，包括各文本块的类型与位置
+    """
+    service = DocumentService(db)
+    document = await service.get_document(document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="文档不存在")
+    pages = await service.get_document_pages(document, page, count)
+    if pages is None:
+        raise HTTPException(status_code=409, detail="文档尚未处理完成，暂无法预览")
+    return {
+        "id": document_id,
+        "pages": [
+            {
+                "page": p.number,
+                "text": p.text,
+                "blocks": [
+                    {"kind": b.kind, "start": b.start, "end": b.end, "bbox": b.bbox}
+                    for b in p.blocks
+                ],
+            }
+            for p in pages
+        ],
+    }
+
+
 @router.get("/list", response_model=schemas.DocumentList)
 async def list_documents(
     type: Optional[str] = None,
@@ -108,6 +261,52 @@ async def delete_document(document_id: str, db: aiosqlite.Connection = Depends(g
     return {"success": True, "message": "文档已成功删除"}
 
 
+@router.put("/{document_id}/file", response_model=schemas.Document)
+async def replace_document_file(
+    document_id: str,
+    file: UploadFile = File(...),
+    type: Optional[str] = Form(None),
+    db: aiosqlite.Connection = Depends(get_db),
+):
+    """
+    替换知识库文档的文件
+
+    文档会被增量地重新处理：只有内容变化的文档块会重新向量化
+    """
+    service = DocumentService(db)
+
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="文件名不能为空")
+
+    if not service.is_allowed_file(file.filename):
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支持的文件类型: {os.path.splitext(file.filename)[1]}",
+        )
+
+    if file.size is not None and file.size > settings.MAX_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"文件大小超过限制: {file.size} > {settings.MAX_UPLOAD_SIZE}",
+        )
+
+    try:
+        document = await service.replace_document_file(document_id, file, type)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except QueueFullError as e:
+        raise too_many_requests(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"替换文档文件失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"替换文档文件失败: {str(e)}")
+
+    if not document:
+        raise HTTPException(status_code=404, detail="文档不存在")
+    return document
+
+
 @router.put("/{document_id}", response_model=schemas.Document)
 async def update_document(
     document_id: str,
@@ -124,3 +323,33 @@ async def update_document(
     if not document:
         raise HTTPException(status_code=404, detail="文档不存在")
     return document
+
+
+@router.post("/reindex", response_model=schemas.ReindexResponse)
+async def reindex_documents(
+    all: bool = False,
+    db: aiosqlite.Connection = Depends(get_db),
+):
+    """
+    重新处理知识库文档，用于修改分块参数或更换 embedding 模型之后
+
+    默认只处理失败的文档与由旧配置生成的文档，all=true 时处理所有文档；
+    已缓存提取结果的文档无需重新解析文件
+    """
+    service = DocumentService(db)
+    documents = await service.reindex_documents(stale_only=not all)
+    return {"documents": documents}
+
+
+@router.post("/{document_id}/reindex", response_model=schemas.Document)
+async def reindex_document(
+    document_id: str, db: aiosqlite.Connection = Depends(get_db)
+):
+    """
+    重新处理单个知识库文档
+    """
+    service = DocumentService(db)
+    document = await service.reindex_document(document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="文档不存在")
+    return document
@@ -0,0 +1,21 @@
+import aiosqlite
+from fastapi import APIRouter, Depends
+
+from ...database import get_db
+from ...embedding.extract_pool import extraction_pool
+from ...llm.workflow import workflow_service
+from ...services.document_service import ingest_queue
+
+router = APIRouter()
+
+
+@router.get("/queues")
+async def get_queue_metrics(db: aiosqlite.Connection = Depends(get_db)):
+    """
+    文档处理队列、文本提取进程池与工作流的并发、排队情况，用于监控与容量规划
+    """
+    return {
+        "ingest": await ingest_queue.metrics(db),
+        "extraction": extraction_pool.metrics(),
+        "workflow": workflow_service.limiter.metrics(),
+    }
@@ -9,6 +9,7 @@ from ...schemas.query import (
     WorkflowType,
 )
 from ...services.query_service import QueryService
+from ...utils.admission import QueueFullError
 
 router = APIRouter()
 from loguru import logger
@@ -27,6 +28,10 @@ async def send_chat(
     """
     try:
         return await QueryService.send_chat_request(request, db)
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         logger.error(e)
         raise HTTPException(status_code=500, detail=str(e))
@@ -43,12 +43,67 @@ class Settings(BaseSettings):
         ".md",
     }
 
+    # 批量上传：单次请求的总大小与文件数量上限，zip 压缩包按解压后的文件计算
+    MAX_BULK_UPLOAD_SIZE: int = 2 * 1024 * 1024 * 1024  # 2GB
+    MAX_BULK_UPLOAD_FILES: int = 1000
+
     # embedding
     EMBEDDING_MODEL_NAME: str = "milkey/gte:large-zh-f16"
 
     # 每次向量数据库添加的文档数量
     EMBEDDING_BATCH_SIZE: int = 100
 
+    # 文档处理队列
+    INGEST_WORKERS: int = 2  # 同时处理的文档数量
+    INGEST_MAX_ATTEMPTS: int = 3  # 单个文档最多尝试处理的次数
+    INGEST_RETRY_BACKOFF: float = 10.0  # 首次重试等待秒数，之后按 2 的幂递增
+    INGEST_POLL_INTERVAL: float = 1.0  # 空闲 worker 检查新任务的间隔（秒）
+    # 老化速率：任务每等待 1 秒，其估计耗时在调度时抵扣的秒数
+    INGEST_AGING_RATE: float = 1.0
+    INGEST_MAX_QUEUED: int = 2000  # 排队文档数量上限，超出时上传返回 429
+    INGEST_MAX_RETRY_AFTER: int = 600  # 429 响应中 Retry-After 的上限（秒）
+    # 校准耗时估计时，每种文档类型、配置档与阶段使用的最近处理记录数量
+    INGEST_CALIBRATION_SAMPLES: int = 50
+
+    # 工作流（大模型调用）的并发与排队上限，超出时返回 429
+    WORKFLOW_MAX_CONCURRENT: int = 4
+    WORKFLOW_MAX_QUEUED: int = 16
+    WORKFLOW_RETRY_AFTER: int = 10  # 工作流繁忙时建议客户端等待的秒数
+    # 估计 PDF 处理耗时时，最多抽样检查的页数
+    PDF_CLASSIFY_SAMPLE_PAGES: int = 32
+    # PDF 连续文字页每次交给 pymupdf4llm 转换的页数，各页段在提取进程池中并行转换
+    PDF_MARKDOWN_RANGE_PAGES: int = 16
+    # 扫描页每批交给版面检测模型的页数；一批的区域提交 OCR 后预先渲染下一批
+    OCR_LAYOUT_BATCH_SIZE: int = 4
+    # 扫描页版面检测的渲染分辨率；检测出的文本区域再按文字大小选择分辨率单独渲染
+    OCR_LAYOUT_DPI: int = 96
+    # 文本区域渲染后文字的目标高度（像素）
+    OCR_TARGET_GLYPH_HEIGHT: int = 32
+    # 文本区域渲染分辨率的下限，上限为提取配置档的 dpi
+    OCR_MIN_DPI: int = 100
+    # 单张渲染图像的最大像素数，页面或区域过大时降低分辨率（约为 A4 页面 300 dpi 的大小）
+    OCR_MAX_RENDER_PIXELS: int = 8_700_000
+    # 已提交 OCR 而尚未完成的最大页数，限制同时驻留内存的区域图像
+    OCR_MAX_INFLIGHT_PAGES: int = 8
+    # 逐页保存 OCR 结果，重新处理或其他文档中相同的页面直接读取
+    OCR_PAGE_CACHE: bool = True
+    # 逐页 OCR 缓存的大小上限（MB），由 `index compact` 命令清理最久未使用的条目
+    OCR_CACHE_MAX_MB: int = 1024
+    # 文本提取进程在启动时加载 OCR 与版面检测模型；关闭时在首次 OCR 时加载
+    OCR_WARMUP: bool = False
+    # 文本提取进程池大小
+    EXTRACT_PROCESS_WORKERS: int = 2
+    # 默认的文本提取配置档（fast、balanced、accurate），上传时未指定时使用
+    EXTRACT_PROFILE: str = "accurate"
+    # 按文档类型（不带点的扩展名）指定的默认配置档，优先于 EXTRACT_PROFILE
+    EXTRACT_PROFILE_BY_TYPE: dict[str, str] = {}
+
+    # 提取、分块、向量化流水线各阶段之间队列的容量
+    PIPELINE_QUEUE_SIZE: int = 8
+
+    # 文档处理进度写入数据库的最小间隔（秒），期间的更新会被合并
+    PROGRESS_WRITE_INTERVAL: float = 1.0
+
     model_config = SettingsConfigDict(
         case_sensitive=True,
         env_file=".env",
@@ -116,3 +171,12 @@ def load_settings(config_file: Optional[Path] = None) -> Settings:
 
 
 settings = load_settings()
+
+
+def update_settings(config_file: Path) -> None:
+    """
+    从 TOML 文件加载配置并原地更新全局 settings。
+    命令行工具在导入其他模块后才解析参数，以此使之后读取 settings 的代码使用新的配置。
+    """
+    for key, value in load_settings(config_file).model_dump().items():
+        setattr(settings, key, value)
@@ -29,11 +29,33 @@ async def get_standalone_db() -> aiosqlite.Connection:
     return db
 
 
+# 旧版本数据库中缺失的列：(表名, 列名, 列定义)
+# schema.sql 使用 CREATE TABLE IF NOT EXISTS，不会为已存在的表补充新列
+COLUMN_MIGRATIONS: list[tuple[str, str, str]] = [
+    ("documents", "content_hash", "TEXT"),
+    ("documents", "ingest_signature", "TEXT"),
+    ("documents", "profile", "TEXT DEFAULT 'accurate'"),
+]
+
+
+async def migrate_columns(db: aiosqlite.Connection):
+    """为已存在的表补充 schema 中新增的列"""
+    for table, column, definition in COLUMN_MIGRATIONS:
+        cursor = await db.execute(f"PRAGMA table_info({table})")
+        columns = {row[1] for row in await cursor.fetchall()}
+        # 表尚不存在时由 schema.sql 创建
+        if columns and column not in columns:
+            await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
 # 初始化数据库 schema 的函数
 async def init_db():
     """初始化数据库"""
     async with aiosqlite.connect(settings.DATABASE_URL.replace("sqlite:///", "")) as db:
+        await migrate_columns(db)
         with open("schema.sql", encoding="utf-8") as f:
             await db.executescript(f.read())
         await db.execute("PRAGMA foreign_keys = ON")
+        # WAL 模式允许处理队列的后台写入与 API 读取并发进行
+        await db.execute("PRAGMA journal_mode = WAL")
         await db.commit()
@@ -10,6 +10,7 @@ from chromadb.utils.embedding_functions.ollama_embedding_function import (
 )
 
 from ..config import settings
+from .chunk import chunk_hash
 
 
 class Embedding:
@@ -27,13 +28,33 @@ class Embedding:
         )
         self.add_lock = asyncio.Lock()
 
-    async def add(self, texts: list[str], doc_id: str):
+    async def add(
+        self,
+        texts: list[str],
+        doc_id: str,
+        ids: Optional[list[str]] = None,
+        anchors: Optional[list[dict[str, int]]] = None,
+    ):
+        """
+        向量化并添加文档块。
+
+        Args:
+            texts: 文档块文本。
+            doc_id: 所属文档 ID。
+            ids: 可选的文档块 ID，默认为 `{doc_id}_{序号}`。
+            anchors: 可选的文档块位置（page、start、end，见 `document_ir.Page`），
+                     作为元数据保存，用于引用与预览。
+        """
         batch_size = settings.EMBEDDING_BATCH_SIZE
         # 为每个文本生成唯一的 ID
-        ids = [f"{doc_id}_{i}" for i in range(len(texts))]
+        if ids is None:
+            ids = [f"{doc_id}_{i}" for i in range(len(texts))]
 
-        # 为每个文本添加 doc_id 元数据
-        metadatas = [{"doc_id": doc_id} for _ in texts]
+        # 为每个文本添加 doc_id 与内容哈希元数据
+        metadatas = [{"doc_id": doc_id, "chunk_hash": chunk_hash(t)} for t in texts]
+        if anchors is not None:
+            for metadata, anchor in zip(metadatas, anchors):
+                metadata.update(anchor)
 
         # 分批处理
         for i in range(0, len(texts), batch_size):
@@ -49,9 +70,109 @@ class Embedding:
                     metadatas=batch_metadatas,  # type: ignore
                 )
 
+    async def copy(self, src_doc_id: str, dst_doc_id: str) -> int:
+        """
+        将 src_doc_id 的全部文档块（连同已计算的向量）复制为 dst_doc_id 的文档块，
+        不会重新调用 embedding 模型。
+
+        Returns:
+            复制的文档块数量
+        """
+        result = await asyncio.to_thread(
+            self.collection.get,
+            where={"doc_id": src_doc_id},
+            include=["embeddings", "documents", "metadatas"],  # type: ignore
+        )
+        src_ids = result["ids"]
+        if not src_ids:
+            return 0
+
+        prefix = f"{src_doc_id}_"
+        ids = [f"{dst_doc_id}_{id.removeprefix(prefix)}" for id in src_ids]
+        metadatas = [
+            {**(metadata or {}), "doc_id": dst_doc_id}
+            for metadata in result["metadatas"]  # type: ignore
+        ]
+        embeddings = result["embeddings"]
+        documents = result["documents"]
+
+        batch_size = settings.EMBEDDING_BATCH_SIZE
+        for i in range(0, len(ids), batch_size):
+            async with self.add_lock:
+                await asyncio.to_thread(
+                    self.collection.add,
+                    ids=ids[i : i + batch_size],
+                    embeddings=embeddings[i : i + batch_size],  # type: ignore
+                    documents=documents[i : i + batch_size],  # type: ignore
+                    metadatas=metadatas[i : i + batch_size],  # type: ignore
+                )
+        return len(ids)
+
     def remove(self, doc_id: str):
         self.collection.delete(where={"doc_id": doc_id})
 
+    def delete_ids(self, ids: list[str]):
+        """按 ID 删除文档块"""
+        batch_size = settings.EMBEDDING_BATCH_SIZE
+        for i in range(0, len(ids), batch_size):
+            self.collection.delete(ids=ids[i : i + batch_size])
+
+    def update_metadata(self, ids: list[str], metadatas: list[dict]):
+        """按 ID 更新文档块的元数据，不会重新向量化"""
+        batch_size = settings.EMBEDDING_BATCH_SIZE
+        for i in range(0, len(ids), batch_size):
+            self.collection.update(
+                ids=ids[i : i + batch_size],
+                metadatas=metadatas[i : i + batch_size],  # type: ignore
+            )
+
+    def count_chunks(self, doc_id: str) -> int:
+        """文档的文档块数量"""
+        result = self.collection.get(where={"doc_id": doc_id}, include=[])
+        return len(result["ids"])
+
+    def count_chunks_by_document(self, page_size: int = 5000) -> dict[str, int]:
+        """分页扫描整个集合，只读取元数据，统计每个文档的文档块数量"""
+        counts: dict[str, int] = {}
+        offset = 0
+        while True:
+            result = self.collection.get(
+                include=["metadatas"],  # type: ignore
+                limit=page_size,
+                offset=offset,
+            )
+            for metadata in result["metadatas"] or []:
+                doc_id = (metadata or {}).get("doc_id")
+                if doc_id is not None:
+                    counts[str(doc_id)] = counts.get(str(doc_id), 0) + 1
+            if len(result["ids"]) < page_size:
+                return counts
+            offset += page_size
+
+    def get_chunk_metadata(self, doc_id: str) -> dict[str, dict]:
+        """
+        获取文档已有文档块的元数据，其中一定包含内容哈希 chunk_hash。
+
+        Returns:
+            文档块 ID 到元数据的映射
+        """
+        result = self.collection.get(
+            where={"doc_id": doc_id},
+            include=["documents", "metadatas"],  # type: ignore
+        )
+        chunks = {}
+        for id, document, metadata in zip(
+            result["ids"],
+            result["documents"],  # type: ignore
+            result["metadatas"],  # type: ignore
+        ):
+            metadata = dict(metadata or {})
+            # 早期版本写入的文档块没有 chunk_hash 元数据，按内容计算
+            if not metadata.get("chunk_hash"):
+                metadata["chunk_hash"] = chunk_hash(document)
+            chunks[id] = metadata
+        return chunks
+
     def query(
         self,
         query_texts: list[str],
@@ -67,10 +188,21 @@ class Embedding:
             query_texts=query_texts,
             n_results=n_results,
             where=where_condition,  # type: ignore
-            include=["documents"],
+            include=["documents", "metadatas"],  # type: ignore
         )
 
         return results
 
 
-vector_db = Embedding()
+_vector_db: Optional[Embedding] = None
+
+
+def __getattr__(name: str):
+    # 全局向量数据库在首次访问时创建，
+    # 使文本提取子进程导入本包时不会连接 ChromaDB
+    global _vector_db
+    if name == "vector_db":
+        if _vector_db is None:
+            _vector_db = Embedding()
+        return _vector_db
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,3 +1,4 @@
+import hashlib
 import logging as log
 
 MAX_CHUNK_SIZE = 1024
@@ -54,6 +55,29 @@ def chunk_text(
     return chunks
 
 
+def locate_chunks(text: str, chunks: list[str]) -> list[tuple[int, int]]:
+    """
+    定位 chunk_text 得到的各文档块在原文中的起止偏移。
+
+    文档块按顺序出现在原文中（超长段落的相邻文档块有重叠），
+    因此从上一个文档块的起点之后依次查找即可。
+    """
+    spans = []
+    cursor = 0
+    for chunk in chunks:
+        start = text.find(chunk, cursor)
+        if start < 0:
+            start = cursor
+        spans.append((start, start + len(chunk)))
+        cursor = start + 1
+    return spans
+
+
+def chunk_hash(chunk: str) -> str:
+    """计算文档块内容的哈希，用于在重新处理文档时识别未变化的文档块"""
+    return hashlib.sha1(chunk.encode("utf-8")).hexdigest()
+
+
 # 示例用法
 if __name__ == "__main__":
     # 测试文本
@@ -1,42 +1,164 @@
+from collections.abc import Iterable, Iterator
 from pathlib import Path
+from typing import Optional
 
+import fitz  # PyMuPDF
 import pymupdf4llm
 from docx import Document
+from docx.table import Table
 from loguru import logger
 from pptx import Presentation
+from pptx.enum.shapes import MSO_SHAPE_TYPE
 
-from ..utils.pdf import is_text_pdf
-from .document_ocr import ocr_pdf_pages
+from ..config import settings
+from ..utils.pdf import SCANNED_PAGE, classify_pdf
+from ..utils.progress import ProgressCallback
+from .document_ir import Page, TextBlock
+from .document_ocr import iter_ocr_pdf_blocks, ocr_pdf_pages
+from .extract_profile import ACCURATE, ExtractionProfile
+
+# 文本提取逻辑的版本号，提取结果发生变化时需递增，
+# 使基于内容哈希复用的旧提取结果失效
+EXTRACTOR_VERSION = 5
+
+# 没有固定分页的文档（docx）按长度划分页面时每页的大致字符数
+PAGE_MAX_CHARS = 4000
 
 
 def flatten(xss):
     return [x for xs in xss for x in xs]
 
 
-def ocr_pdf(pdf_path: str | Path) -> str:
+def ocr_pdf(pdf_path: str | Path, progress: Optional[ProgressCallback] = None) -> str:
     """
     对 PDF 文件进行 OCR 处理，并返回 OCR 结果。
 
     Args:
         pdf_path: PDF 文件的路径。
+        progress: 可选的进度回调。
 
     Returns:
         提取到的文本字符串（Markdown 格式），或者一个描述错误的字符串（如果处理失败）。
     """
-    ocr_result = ocr_pdf_pages(str(pdf_path))
+    ocr_result = ocr_pdf_pages(str(pdf_path), progress=progress)
     return "\n".join(flatten(ocr_result.values()))
 
 
-def process_pdf_and_get_text(pdf_path: str | Path) -> str:
+def markdown_pages(
+    doc: fitz.Document | str | Path,
+    pages: list[int],
+    profile: ExtractionProfile = ACCURATE,
+) -> list[str]:
+    """
+    用 pymupdf4llm 将若干文字页转换为 Markdown，按页返回。
+    配置档不要求 Markdown 时直接读取文本层，速度快得多，但不保留标题与表格结构。
+    """
+    if not isinstance(doc, fitz.Document):
+        with fitz.open(doc) as opened:
+            return markdown_pages(opened, pages, profile)
+    if not profile.markdown:
+        return [doc.load_page(page_num).get_text() for page_num in pages]  # type: ignore
+    chunks = pymupdf4llm.to_markdown(
+        doc,
+        pages=pages,
+        page_chunks=True,
+        ignore_images=profile.skip_images,
+        ignore_graphics=profile.skip_images,
+    )
+    return [chunk["text"] for chunk in chunks]  # type: ignore
+
+
+def pdf_segments(kinds: list[str], range_pages: int) -> list[tuple[bool, list[int]]]:
+    """
+    将页面按类型切分为连续的片段，按页码顺序排列。
+
+    连续的扫描页为一个 OCR 片段；连续的其他页面每 range_pages 页为一个文字片段，
+    各文字片段可以独立地交给 pymupdf4llm 转换。
+
+    Returns:
+        (是否需要 OCR, 片段内的页码列表) 的列表
+    """
+    segments: list[tuple[bool, list[int]]] = []
+    for page_num, kind in enumerate(kinds):
+        is_ocr = kind == SCANNED_PAGE
+        if (
+            segments
+            and segments[-1][0] == is_ocr
+            and (is_ocr or len(segments[-1][1]) < range_pages)
+        ):
+            segments[-1][1].append(page_num)
+        else:
+            segments.append((is_ocr, [page_num]))
+    return segments
+
+
+def ocr_page(page_num: int, blocks: list[TextBlock]) -> Page:
+    """由 OCR 识别出的文本区域组成页面，忽略识别结果为空的区域"""
+    return Page.from_blocks(page_num, [block for block in blocks if block.text.strip()])
+
+
+def iter_pdf_pages(
+    pdf_path: str | Path,
+    progress: Optional[ProgressCallback] = None,
+    profile: ExtractionProfile = ACCURATE,
+) -> Iterator[Page]:
+    """
+    逐页提取 PDF 的文本，按页码顺序产出。
+
+    每页单独判断（见 `classify_page`）：有文本层的页面用 pymupdf4llm 直接转换为 Markdown，
+    只有图片的扫描页才送入 OCR。纯文字 PDF 无需渲染页面，混合 PDF 中的扫描页也不会遗漏。
+    文字页以 Markdown 段落为文本块；扫描页以版面检测得到的文本区域为文本块，带有位置。
+
+    progress 为可选的进度回调，以 "extract" 阶段报告已产出的页数；
+    profile 为提取配置档，见 `ExtractionProfile`。
+    """
+    # 提取需要每页的类型：检查全部页面，且不必区分矢量图形页与空白页
+    classification = classify_pdf(pdf_path, early_exit=False, check_drawings=False)
+    total_pages = classification.page_count
+    kinds = [classification.pages[i] for i in range(total_pages)]
+    ocr_pages = [i for i, kind in enumerate(kinds) if kind == SCANNED_PAGE]
+    logger.info(
+        f"PDF '{Path(pdf_path).name}' 共 {total_pages} 页，"
+        f"其中 {len(ocr_pages)} 页需要 OCR。"
+    )
+
+    ocr_results = iter_ocr_pdf_blocks(str(pdf_path), pages=ocr_pages, profile=profile)
+
+    def segment_pages(doc: fitz.Document) -> Iterator[Page]:
+        for is_ocr, pages in pdf_segments(kinds, settings.PDF_MARKDOWN_RANGE_PAGES):
+            if is_ocr:
+                # 扫描页识别完成一页即产出一页
+                for page_num in pages:
+                    ocr_page_num, blocks = next(ocr_results)
+                    assert ocr_page_num == page_num
+                    yield ocr_page(page_num, blocks)
+            else:
+                for page_num, text in zip(pages, markdown_pages(doc, pages, profile)):
+                    yield Page.from_text(page_num, text)
+
+    try:
+        with fitz.open(pdf_path) as doc:
+            for done_pages, page in enumerate(segment_pages(doc), 1):
+                if progress:
+                    progress("extract", done_pages, total_pages)
+                yield page
+    finally:
+        ocr_results.close()
+
+
+def process_pdf_and_get_text(
+    pdf_path: str | Path, progress: Optional[ProgressCallback] = None
+) -> str:
     """
     处理一个 PDF 文件，并提取其文本内容。
-    如果 PDF 是文字 PDF，则直接提取文本；否则进行 OCR。
+    有文本层的页面直接提取文本，扫描页进行 OCR，见 `iter_pdf_pages`。
 
     Args:
         pdf_path: PDF 文件的路径。
+        progress: 可选的进度回调。
 
     Returns:
-        提取到的文本字符串（Markdown 格式），或者一个描述错误的字符串（如果处理失败）。
+        提取到的文本字符串（Markdown 格式）。
     """
     if isinstance(pdf_path, str):
         pdf_path = Path(pdf_path)
@@ -45,65 +167,141 @@ def process_pdf_and_get_text(pdf_path: str | Path) -> str:
         raise FileNotFoundError(f"文件未找到 -> {pdf_path}")
 
     try:
-        # 步骤 1: 判断是否为文字 PDF
-        logger.info(f"正在判断文件 '{pdf_path.name}' 是否为文字 PDF...")
-        is_text = is_text_pdf(pdf_path)  # is_text_pdf 函数内部会处理其自身的错误和打印
-
-        if is_text:
-            logger.info(f"文件 '{pdf_path.name}' 被判断为文字 PDF，直接提取文本。")
-            return pymupdf4llm.to_markdown(pdf_path)
-        else:
-            logger.info(f"文件 '{pdf_path.name}' 未被判断为文字 PDF，执行 OCR。")
-            return ocr_pdf(pdf_path)
-
+        return "\n".join(page.text for page in iter_pdf_pages(pdf_path, progress))
     except Exception as e:
         error_msg = f"错误: 处理 PDF 文件 '{pdf_path}' 时发生未捕获的错误: {e}"
         logger.error(error_msg)
         raise
 
 
-def extract_text_from_docx(docx_file_path: str):
+def _table_row_text(cells) -> str:
+    """表格一行的文本，合并单元格只保留一次，单元格之间以 | 分隔"""
+    texts = []
+    previous = None
+    for cell in cells:
+        # 合并单元格在行中会重复出现同一个单元格
+        if previous is not None and cell._tc is previous:
+            continue
+        previous = cell._tc
+        texts.append(" ".join(cell.text.split()))
+    return " | ".join(texts) if any(texts) else ""
+
+
+def iter_docx_blocks(
+    docx_file_path: str | Path, max_chars: int = PAGE_MAX_CHARS
+) -> Iterator[TextBlock]:
     """
-    从DOCX文件中提取所有文本。
+    按文档顺序逐个产出 DOCX 正文中的段落与表格行。
+    DOCX 没有固定分页，每累积约 max_chars 个字符在块的边界处划分为一页。
     """
-    document = Document(docx_file_path)  # [11]
-    full_text = []
-    for para in document.paragraphs:
-        full_text.append(para.text)
+    document = Document(str(docx_file_path))
+    page = 0
+    size = 0
+    for item in document.iter_inner_content():
+        if isinstance(item, Table):
+            rows = (_table_row_text(row.cells) for row in item.rows)
+            kind = "table_row"
+        else:
+            rows = [item.text]
+            kind = "paragraph"
+        for text in rows:
+            if not text.strip():
+                continue
+            if size >= max_chars:
+                page, size = page + 1, 0
+            yield TextBlock(text=text, kind=kind, page=page)
+            size += len(text)
 
-    return "\n".join(full_text)
 
+def _shape_bbox(shape) -> Optional[tuple[float, float, float, float]]:
+    if shape.left is None or shape.top is None:
+        return None
+    left, top = shape.left.pt, shape.top.pt
+    width = shape.width.pt if shape.width is not None else 0
+    height = shape.height.pt if shape.height is not None else 0
+    return (left, top, left + width, top + height)
 
-def extract_text_from_pptx(pptx_file_path: str):
+
+def _iter_shapes(shapes):
+    """展开组合形状，按幻灯片中的顺序产出所有形状"""
+    for shape in shapes:
+        if shape.shape_type == MSO_SHAPE_TYPE.GROUP:
+            yield from _iter_shapes(shape.shapes)
+        else:
+            yield shape
+
+
+def iter_pptx_blocks(pptx_file_path: str | Path) -> Iterator[TextBlock]:
     """
-    从PPTX文件中提取所有文本，包括幻灯片文本和备注。
+    逐张幻灯片产出文本框、表格行与演示者备注。
     """
-    prs = Presentation(pptx_file_path)  # [3]
-    full_text = []
-    for slide in prs.slides:
-        # 提取幻灯片上的文本框内容
-        for shape in slide.shapes:
-            if hasattr(shape, "text_frame") and shape.text_frame:  # type: ignore # [13]
-                text = shape.text_frame.text  # type: ignore
-                if text.strip():
-                    full_text.append(text)
+    prs = Presentation(str(pptx_file_path))
+    for slide_num, slide in enumerate(prs.slides):
+        # 提取幻灯片上的文本框与表格内容
+        for shape in _iter_shapes(slide.shapes):
+            if getattr(shape, "has_table", False) and shape.has_table:
+                texts = [_table_row_text(row.cells) for row in shape.table.rows]
+                kind = "table_row"
+            elif shape.has_text_frame:
+                texts = [shape.text_frame.text]
+                kind = "paragraph"
+            else:
+                continue
+            bbox = _shape_bbox(shape)
+            for text in texts:
+                if not text.strip():
+                    continue
+                yield TextBlock(text=text, kind=kind, page=slide_num, bbox=bbox)
 
         # 提取演示者备注 (如果有的话)
         if slide.has_notes_slide:
-            notes_slide = slide.notes_slide  # [3]
-            if notes_slide.notes_text_frame:  # [6]
+            notes_slide = slide.notes_slide
+            if notes_slide.notes_text_frame:
                 notes_text = notes_slide.notes_text_frame.text
                 if notes_text.strip():
-                    full_text.append(f"备注: {notes_text}")
+                    yield TextBlock(
+                        text=f"备注: {notes_text}", kind="note", page=slide_num
+                    )
+
 
-    return "\n".join(full_text)
+def iter_block_pages(blocks: Iterable[TextBlock]) -> Iterator[Page]:
+    """将文本块按所在页合并为页面逐页产出"""
+    page_blocks: list[TextBlock] = []
+    for block in blocks:
+        if page_blocks and block.page != page_blocks[-1].page:
+            yield Page.from_blocks(page_blocks[-1].page, page_blocks)
+            page_blocks = []
+        page_blocks.append(block)
+    if page_blocks:
+        yield Page.from_blocks(page_blocks[-1].page, page_blocks)
 
 
-def process_file_to_text(file_path: str | Path, file_type: str):
+def extract_text_from_docx(docx_file_path: str):
     """
-    处理文件，并提取其文本内容。
-    如果文件是 DOCX、PPTX、ppt, doc 格式，则会调用对应的提取函数；如果文件是 txt, markdown 格式，则直接返回文件内容。
-    如果文件是 pdf 则判断是否需要 ocr。
+    从DOCX文件中提取所有文本，包括表格。
+    """
+    return "\n".join(block.text for block in iter_docx_blocks(docx_file_path))
+
+
+def extract_text_from_pptx(pptx_file_path: str):
+    """
+    从PPTX文件中提取所有文本，包括幻灯片文本、表格和备注。
+    """
+    return "\n".join(block.text for block in iter_pptx_blocks(pptx_file_path))
+
+
+def iter_file_pages(
+    file_path: str | Path,
+    file_type: str,
+    progress: Optional[ProgressCallback] = None,
+    profile: ExtractionProfile = ACCURATE,
+) -> Iterator[Page]:
+    """
+    逐页提取文件的内容（见 `document_ir.Page`），便于下游分块与向量化流水线式地并行处理。
+    PDF 按页产出文本层或 OCR 结果（见 `iter_pdf_pages`）；pptx 按幻灯片产出，
+    docx 按文档顺序每累积约 PAGE_MAX_CHARS 个字符产出一页；纯文本作为一页整体产出。
+
+    progress 为可选的进度回调，PDF 按页面报告进度；profile 为提取配置档，只影响 PDF。
     """
     if isinstance(file_path, str):
         file_path = Path(file_path)
@@ -116,19 +314,36 @@ def process_file_to_text(file_path: str | Path, file_type: str):
         logger.info(f"正在判断文件 '{file_path.name}' 类型...")
         if file_type in ["docx", "doc"]:
             logger.info(f"文件 '{file_path.name}' 是 DOCX 格式，将调用对应的提取函数。")
-            return extract_text_from_docx(str(file_path))
+            yield from iter_block_pages(iter_docx_blocks(file_path))
         elif file_type in ["pptx", "ppt"]:
             logger.info(f"文件 '{file_path.name}' 是 PPTX 格式，将调用对应的提取函数。")
-            return extract_text_from_pptx(str(file_path))
-        elif file_type in ["txt", "markdown"]:
+            yield from iter_block_pages(iter_pptx_blocks(file_path))
+        elif file_type in ["txt", "md", "markdown"]:
             logger.info(f"文件 '{file_path.name}' 是纯文本格式，直接返回文件内容。")
-            return file_path.read_text(encoding="utf-8")
+            yield Page.from_text(0, file_path.read_text(encoding="utf-8"))
         elif file_type == "pdf":
-            logger.info(f"文件 '{file_path.name}' 是 PDF 格式，将进行 OCR。")
-            return ocr_pdf(file_path)
+            logger.info(f"文件 '{file_path.name}' 是 PDF 格式，将逐页提取文本。")
+            yield from iter_pdf_pages(file_path, progress, profile)
         else:
             raise ValueError(f"文件 '{file_path.name}' 类型不支持。")
     except Exception as e:
         error_msg = f"错误: 处理文件 '{file_path}' 时发生错误: {e}"
         logger.error(error_msg)
         raise
+
+
+def process_file_to_text(
+    file_path: str | Path,
+    file_type: str,
+    progress: Optional[ProgressCallback] = None,
+    profile: ExtractionProfile = ACCURATE,
+):
+    """
+    处理文件，并提取其文本内容。
+    如果文件是 DOCX、PPTX、ppt, doc 格式，则会调用对应的提取函数；如果文件是 txt, markdown 格式，则直接返回文件内容。
+    如果文件是 pdf 则逐页判断是否需要 ocr。
+
+    progress 为可选的进度回调，OCR 时按页面报告进度；profile 为提取配置档。
+    """
+    pages = iter_file_pages(file_path, file_type, progress, profile)
+    return "\n".join(page.text for page in pages)
@@ -0,0 +1,89 @@
+"""
+文档的结构化中间表示：文档 → 页 → 文本块。
+
+各格式的提取结果统一表示为按页码排列的 Page，每页由若干 TextBlock 组成，记录块的类型、
+在页面文本中的起止偏移以及（可获得时的）位置。中间表示随提取结果缓存持久化，
+分块、引用与预览都由它得出，无需重新解析源文件。
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+BBox = tuple[float, float, float, float]
+
+# 纯文本与 Markdown 中以空行分隔的段落
+_PARAGRAPH_PATTERN = re.compile(r"[^\n](?:[^\n]|\n(?!\s*\n))*")
+
+
+@dataclass
+class TextBlock:
+    """页面中的一段文本及其位置"""
+
+    text: str
+    kind: str  # paragraph（段落或文本框）、table_row（表格的一行）、note（演示者备注）
+    page: int = 0  # 所在页（从0开始）
+    # 位置 (x0, y0, x1, y1)，单位为磅：PDF 为页面坐标，pptx 为幻灯片坐标；无法获得时为 None
+    bbox: Optional[BBox] = None
+    # 在页面文本中的起止偏移
+    start: int = 0
+    end: int = 0
+
+
+@dataclass
+class Page:
+    """
+    文档的一页。页码从0开始：PDF 为页码，pptx 为幻灯片序号，
+    docx 等没有固定分页的格式为按长度划分的段序号。
+    """
+
+    number: int
+    text: str
+    blocks: list[TextBlock] = field(default_factory=list)
+
+    @classmethod
+    def from_blocks(cls, number: int, blocks: list[TextBlock]) -> "Page":
+        """由文本块组成页面，块之间以换行分隔"""
+        offset = 0
+        for block in blocks:
+            block.page = number
+            block.start = offset
+            block.end = offset + len(block.text)
+            offset = block.end + 1
+        return cls(number, "\n".join(block.text for block in blocks), blocks)
+
+    @classmethod
+    def from_text(cls, number: int, text: str, kind: str = "paragraph") -> "Page":
+        """由一段文本组成页面，以空行分隔的每个段落为一个文本块，页面文本保持不变"""
+        blocks = [
+            TextBlock(text=m.group(), kind=kind, page=number, start=m.start(), end=m.end())
+            for m in _PARAGRAPH_PATTERN.finditer(text)
+            if m.group().strip()
+        ]
+        return cls(number, text, blocks)
+
+    def to_dict(self) -> dict[str, Any]:
+        """紧凑的可序列化形式，块的文本由偏移从页面文本中得出，不重复保存"""
+        return {
+            "page": self.number,
+            "text": self.text,
+            "blocks": [
+                [block.kind, block.start, block.end, block.bbox] for block in self.blocks
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "Page":
+        number, text = data["page"], data["text"]
+        blocks = [
+            TextBlock(
+                text=text[start:end],
+                kind=kind,
+                page=number,
+                bbox=tuple(bbox) if bbox else None,  # type: ignore
+                start=start,
+                end=end,
+            )
+            for kind, start, end, bbox in data["blocks"]
+        ]
+        return cls(number, text, blocks)
@@ -1,123 +1,469 @@
+import hashlib
 import json
+import math
 import os
-from collections.abc import Iterable
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import statistics
+import threading
+from collections import deque
+from collections.abc import Iterable, Iterator, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from importlib.metadata import PackageNotFoundError, version
 from pathlib import Path
+from typing import Optional
 
 import fitz  # PyMuPDF
 from PIL import Image
-from rapidocr import RapidOCR
-from surya.layout import LayoutPredictor
 
-# 全局初始化 OCR 和布局检测器，避免重复加载模型
-# 注意：模型下载可能需要时间
-# 建议在首次运行时确保模型已下载或手动下载并指定路径
+from ..config import settings
+from ..utils.progress import ProgressCallback
+from .document_ir import BBox, TextBlock
+from .extract_profile import ACCURATE, ExtractionProfile
+from .ocr_cache import cache_page, get_cached_page
 
-# 初始化 RapidOCR
-# RapidOCR 默认会下载模型，如果需要指定模型路径，可以参考其文档
-ocr = RapidOCR(str((Path("__file__").parent / "config.yaml").absolute()))
 
-# 初始化布局检测器
-layout_predictor = LayoutPredictor()
+def _package_version(name: str) -> str:
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return "unknown"
 
 
-def _render_pdf_page_to_image(document, page_num):
+# OCR 模型的版本，变化时识别结果可能不同，缓存的提取结果随之失效
+# （渲染分辨率等参数由提取配置档决定，见 `ExtractionProfile.signature`）
+OCR_MODEL_VERSION = (
+    f"rapidocr={_package_version('rapidocr')};surya={_package_version('surya-ocr')}"
+)
+
+# OCR 与版面检测模型在首次使用时加载（见 `get_ocr_engine`、`get_layout_predictor`），
+# 导入本模块时不加载，服务启动、测试与命令行工具不必承担加载模型的耗时与内存；
+# 提取进程池可以在子进程启动时预先加载（见 OCR_WARMUP）。
+# 注意：模型下载可能需要时间，建议在首次运行时确保模型已下载或手动下载并指定路径
+_ocr = None
+_layout_predictor = None
+_models_lock = threading.Lock()
+
+# 估计文字高度时，灰度低于该值的像素视为文字
+_DARK_PIXEL = 128
+
+# 逐页 OCR 缓存的版本号，区域划分或识别逻辑变化时需递增，使缓存的识别结果失效
+_PAGE_CACHE_VERSION = 1
+
+
+def get_ocr_engine():
+    """获取全局的 RapidOCR 实例，首次调用时加载，线程安全"""
+    global _ocr
+    if _ocr is None:
+        with _models_lock:
+            if _ocr is None:
+                from rapidocr import RapidOCR
+
+                # RapidOCR 默认会下载模型，如果需要指定模型路径，可以参考其文档
+                config_path = Path("__file__").parent / "config.yaml"
+                _ocr = RapidOCR(str(config_path.absolute()))
+    return _ocr
+
+
+def get_layout_predictor():
+    """获取全局的版面检测器，首次调用时加载，线程安全"""
+    global _layout_predictor
+    if _layout_predictor is None:
+        with _models_lock:
+            if _layout_predictor is None:
+                from surya.layout import LayoutPredictor
+
+                _layout_predictor = LayoutPredictor()
+    return _layout_predictor
+
+
+def load_ocr_models() -> None:
+    """预先加载 OCR 与版面检测模型"""
+    get_ocr_engine()
+    get_layout_predictor()
+
+
+def ocr_models_loaded() -> bool:
+    """当前进程是否已加载 OCR 与版面检测模型"""
+    return _ocr is not None and _layout_predictor is not None
+
+
+def _pixmap_to_image(pix) -> Image.Image:
+    return Image.frombytes("RGB", [pix.width, pix.height], pix.samples)  # type: ignore
+
+
+def _render_pdf_page_to_image(document, page_num, dpi: int = ACCURATE.dpi):
     """
     辅助函数：将单个 PDF 页面渲染为 PIL Image。
     """
     page = document.load_page(page_num)
-    pix = page.get_pixmap(dpi=300)
-    return Image.frombytes("RGB", [pix.width, pix.height], pix.samples)  # type: ignore
+    return _pixmap_to_image(page.get_pixmap(dpi=dpi))
+
+
+def _cap_dpi(dpi: float, width: float, height: float) -> int:
+    """降低分辨率，使 width×height 磅的区域渲染后约不超过 OCR_MAX_RENDER_PIXELS 像素"""
+    limit = 72 * math.sqrt(settings.OCR_MAX_RENDER_PIXELS / max(width * height, 1))
+    return max(1, int(min(dpi, limit)))
 
 
-def _perform_ocr_on_cropped_image(cropped_image: Image.Image):
+def _render_pages(
+    document, page_nums: Sequence[int], profile: ExtractionProfile
+) -> list[tuple[Image.Image, int]]:
+    """以版面检测用的低分辨率渲染页面，返回 (图像, 分辨率)"""
+    rendered = []
+    for page_num in page_nums:
+        rect = document.load_page(page_num).rect
+        dpi = _cap_dpi(
+            min(settings.OCR_LAYOUT_DPI, profile.dpi), rect.width, rect.height
+        )
+        rendered.append((_render_pdf_page_to_image(document, page_num, dpi), dpi))
+    return rendered
+
+
+def _render_page_regions(
+    document, page_num: int, regions: Sequence[tuple[BBox, int]]
+) -> list[Image.Image]:
+    """按各自的分辨率渲染页面上的区域（页面坐标，磅）"""
+    page = document.load_page(page_num)
+    return [
+        _pixmap_to_image(page.get_pixmap(dpi=dpi, clip=fitz.Rect(bbox)))
+        for bbox, dpi in regions
+    ]
+
+
+def _estimate_glyph_height(image: Image.Image) -> Optional[float]:
+    """
+    估计图像中文字的高度（像素）：逐行检查是否有深色像素，
+    取连续深色行段高度的中位数。没有文字时返回 None。
+    """
+    gray = image.convert("L")
+    width, height = gray.size
+    if not width or not height:
+        return None
+    data = gray.tobytes()
+    runs = []
+    run = 0
+    for y in range(height + 1):
+        if y < height and min(data[y * width : (y + 1) * width]) < _DARK_PIXEL:
+            run += 1
+            continue
+        # 忽略一两个像素高的噪点与线条
+        if run > 2:
+            runs.append(run)
+        run = 0
+    return float(statistics.median(runs)) if runs else None
+
+
+def _choose_region_dpi(
+    glyph_height: Optional[float],
+    layout_dpi: int,
+    bbox: BBox,
+    profile: ExtractionProfile,
+) -> int:
+    """
+    选择文本区域的 OCR 渲染分辨率：使文字渲染后约为 OCR_TARGET_GLYPH_HEIGHT 像素高，
+    并限制在 OCR_MIN_DPI 与配置档的 dpi 之间；无法估计文字高度时使用配置档的 dpi。
+    区域很大时进一步降低分辨率，渲染图像不超过 OCR_MAX_RENDER_PIXELS 像素。
+
+    参数:
+        glyph_height: 以 layout_dpi 渲染时估计的文字高度（像素）。
+        bbox: 区域在页面上的位置（磅）。
+    """
+    dpi: float = profile.dpi
+    if glyph_height:
+        dpi = settings.OCR_TARGET_GLYPH_HEIGHT * layout_dpi / glyph_height
+        dpi = min(max(dpi, settings.OCR_MIN_DPI), profile.dpi)
+    x_min, y_min, x_max, y_max = bbox
+    return _cap_dpi(dpi, x_max - x_min, y_max - y_min)
+
+
+def _plan_page_regions(
+    image: Image.Image,
+    layout_dpi: int,
+    boxes: list[BBox],
+    profile: ExtractionProfile,
+) -> list[tuple[BBox, int]]:
+    """将低分辨率图像上检测出的文本区域换算为页面坐标（磅），并为每个区域选择渲染分辨率"""
+    scale = 72 / layout_dpi
+    regions = []
+    for box in boxes:
+        glyph_height = _estimate_glyph_height(image.crop(box))
+        bbox = tuple(value * scale for value in box)
+        regions.append(
+            (bbox, _choose_region_dpi(glyph_height, layout_dpi, bbox, profile))  # type: ignore
+        )
+    return regions  # type: ignore
+
+
+def _page_cache_key(
+    image: Image.Image, layout_dpi: int, profile: ExtractionProfile
+) -> str:
+    """页面的 OCR 缓存键：版面检测用的渲染图像内容，以及影响识别结果的参数"""
+    params = (
+        f"v={_PAGE_CACHE_VERSION};ocr={OCR_MODEL_VERSION};layout_dpi={layout_dpi};"
+        f"dpi={profile.dpi};layout={profile.layout};cls={profile.ocr_use_cls};"
+        f"glyph={settings.OCR_TARGET_GLYPH_HEIGHT};min_dpi={settings.OCR_MIN_DPI};"
+        f"max_pixels={settings.OCR_MAX_RENDER_PIXELS};size={image.width}x{image.height}"
+    )
+    digest = hashlib.sha256(params.encode("utf-8"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def _completed(text: str) -> Future:
+    future = Future()
+    future.set_result(text)
+    return future
+
+
+def _detect_text_regions(
+    images: list[Image.Image], profile: ExtractionProfile
+) -> list[list[BBox]]:
+    """
+    对一批页面图像做版面检测，返回每页文本区域的位置（像素坐标）。
+    整批一次交给模型，摊薄每次调用的固定开销；不做版面检测时整页作为一个区域。
+    """
+    if not profile.layout:
+        return [[(0, 0, image.width, image.height)] for image in images]
+    if not images:
+        return []
+    predictions = get_layout_predictor()(images, batch_size=len(images))
+    return [
+        [
+            tuple(bbox_pred.bbox)  # type: ignore
+            for bbox_pred in prediction.bboxes
+            if bbox_pred.label == "Text"
+        ]
+        for prediction in predictions
+    ]
+
+
+def _perform_ocr_on_cropped_image(
+    cropped_image: Image.Image, use_cls: Optional[bool] = None
+):
     """
     辅助函数：对裁剪后的图片执行 OCR。
     """
-    result = ocr(cropped_image)  # type: ignore
+    result = get_ocr_engine()(cropped_image, use_cls=use_cls)  # type: ignore
     if isinstance(result.txts, Iterable):  # type: ignore
         return str("".join(result.txts))  # type: ignore
     else:
         return str(result)
 
 
-def ocr_pdf_pages(pdf_path: str) -> dict[int, list[str]]:
+def _collect_page_blocks(
+    page_num: int,
+    regions: list[tuple[BBox, Future]],
+) -> list[TextBlock]:
+    """按区域顺序收集某页的 OCR 结果，失败的区域记为空字符串"""
+    blocks = []
+    for bbox, future in regions:
+        try:
+            recognized_text = future.result()
+            assert isinstance(recognized_text, str)
+        except Exception as exc:
+            print(f"OCR for a region on page {page_num} generated an exception: {exc}")
+            recognized_text = ""
+        blocks.append(
+            TextBlock(
+                text=recognized_text,
+                kind="paragraph",
+                page=page_num,
+                bbox=bbox,
+            )
+        )
+    return blocks
+
+
+def iter_ocr_pdf_blocks(
+    pdf_path: str,
+    progress: Optional[ProgressCallback] = None,
+    pages: Optional[Sequence[int]] = None,
+    profile: ExtractionProfile = ACCURATE,
+) -> Iterator[tuple[int, list[TextBlock]]]:
     """
-    对 PDF 文件的每一页进行布局检测（串行）和 OCR（并行）。
+    对 PDF 文件的页面分批进行布局检测，并对检测出的文本区域并行 OCR，
+    按页码顺序逐页产出结果，某页的全部区域识别完成后即可产出，无需等待整个文档。
+
+    页面每 OCR_LAYOUT_BATCH_SIZE 页为一批，以较低的分辨率（OCR_LAYOUT_DPI）渲染后
+    交给版面检测模型；当前批次的区域全部提交 OCR 后，后台线程即开始渲染下一批。
+    检测出的文本区域按估计的文字高度选择分辨率（见 `_choose_region_dpi`），
+    从页面单独渲染后提交 OCR，不再渲染整页的高分辨率图像。
+
+    已提交 OCR 而尚未产出的页面至多 OCR_MAX_INFLIGHT_PAGES 页，达到上限时
+    先等待最早的页面识别完成；连同渲染中的两批页面，内存占用与文档页数无关。
+
+    每页的识别结果在产出时写入逐页 OCR 缓存（见 `ocr_cache`，OCR_PAGE_CACHE 关闭时不使用），
+    已有缓存的页面不再做版面检测与 OCR。
 
     参数:
         pdf_path: PDF 文件路径。
+        progress: 可选的进度回调，分别以 "render"、"ocr" 阶段报告
+                  已完成版面分析的页数与已完成识别的页数。
+        pages: 只处理这些页（从0开始，升序），默认处理所有页。
+        profile: 提取配置档，决定最高渲染分辨率、是否进行版面检测与 OCR 参数。
 
-    返回:
-        一个字典，键为页码（从0开始），值为该页的 OCR 结果列表。
-        每个结果是一个字典，包含 'bbox' (边界框) 和 'text' (识别文本)。
+    产出:
+        (页码（从0开始）, 该页各文本区域的识别结果，带有区域在页面上的位置)
     """
     if not os.path.exists(pdf_path):
         raise FileNotFoundError(f"PDF file not found: {pdf_path}")
 
     document = fitz.open(pdf_path)
-    total_pages = document.page_count
-    all_ocr_futures = []
-    # 存储 (page_num, original_bbox) 对应 future 的索引
-    future_to_bbox_map = {}
-    current_future_index = 0
-
-    print("Starting layout detection and parallel OCR...")
-    with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as executor:
-        for page_num in range(total_pages):
-            print(f"Processing page {page_num + 1}/{total_pages}...")
-            pil_image = _render_pdf_page_to_image(document, page_num)
-
-            layout_predictions = layout_predictor([pil_image], batch_size=1)
-            if not layout_predictions:
-                continue
-
-            layout_pred = layout_predictions[0]
-
-            for bbox_pred in layout_pred.bboxes:
-                if bbox_pred.label != "Text":
-                    continue
-
-                x_min, y_min, x_max, y_max = bbox_pred.bbox
-                cropped_image = pil_image.crop((x_min, y_min, x_max, y_max))
-
-                # 提交 OCR 任务到线程池
-                future = executor.submit(_perform_ocr_on_cropped_image, cropped_image)
-                all_ocr_futures.append(future)
-                future_to_bbox_map[future] = (
-                    page_num,
-                    [x_min, y_min, x_max, y_max],
-                    current_future_index,
-                )
-                current_future_index += 1
+    page_nums = list(range(document.page_count)) if pages is None else list(pages)
+    total_pages = len(page_nums)
+    batch_size = max(1, settings.OCR_LAYOUT_BATCH_SIZE)
+    batches = [
+        page_nums[i : i + batch_size] for i in range(0, total_pages, batch_size)
+    ]
+    max_inflight = max(1, settings.OCR_MAX_INFLIGHT_PAGES)
+    # 已提交 OCR 但尚未产出的页面，按页码排列：(页码, 各区域的位置与识别任务, 缓存键)
+    pending: deque[tuple[int, list, Optional[str]]] = deque()
+    detected_pages = 0
+    ocr_done_pages = 0
 
-    document.close()
+    def finish_oldest() -> tuple[int, list[TextBlock]]:
+        """等待最早提交的页面识别完成并取出结果，该页的区域图像随即可以释放"""
+        nonlocal ocr_done_pages
+        done_page, done_regions, cache_key = pending.popleft()
+        blocks = _collect_page_blocks(done_page, done_regions)
+        # 识别失败的区域记为空字符串，这样的页面不缓存
+        if cache_key and all(f.exception() is None for _, f in done_regions):
+            cache_page(cache_key, blocks)
+        ocr_done_pages += 1
+        if progress:
+            progress("ocr", ocr_done_pages, total_pages)
+        return done_page, blocks
 
-    print(f"Waiting for {len(all_ocr_futures)} OCR tasks to complete...")
-    ocr_results_flat = []
-    for future in as_completed(all_ocr_futures):
-        page_num, bbox, original_index = future_to_bbox_map[future]
-        try:
-            recognized_text = future.result()
-            assert isinstance(recognized_text, str)
-            ocr_results_flat.append((original_index, page_num, bbox, recognized_text))
-        except Exception as exc:
-            print(
-                f"OCR for region {bbox} on page {page_num} generated an exception: {exc}"
+    def collect_ready() -> Iterator[tuple[int, list[TextBlock]]]:
+        """产出前面已全部识别完成的页面"""
+        while pending and all(f.done() for _, f in pending[0][1]):
+            yield finish_oldest()
+
+    print("Starting batched layout detection and parallel OCR...")
+    try:
+        # 渲染只在单独的线程中进行，PyMuPDF 文档对象不会被并发访问
+        with ThreadPoolExecutor(max_workers=1) as renderer, ThreadPoolExecutor(
+            max_workers=os.cpu_count() or 4
+        ) as executor:
+            rendering = (
+                renderer.submit(_render_pages, document, batches[0], profile)
+                if batches
+                else None
             )
-            ocr_results_flat.append((original_index, page_num, bbox, ""))
+            for index, batch in enumerate(batches):
+                rendered = rendering.result()  # type: ignore
+                print(
+                    f"Detecting layout of pages {batch[0] + 1}-{batch[-1] + 1} "
+                    f"({detected_pages + len(batch)}/{total_pages})..."
+                )
+                # 已有缓存的页面跳过版面检测与 OCR
+                cache_keys = [
+                    _page_cache_key(image, layout_dpi, profile)
+                    if settings.OCR_PAGE_CACHE
+                    else None
+                    for image, layout_dpi in rendered
+                ]
+                cached_pages = [
+                    get_cached_page(key, page_num) if key else None
+                    for key, page_num in zip(cache_keys, batch)
+                ]
+                uncached = [i for i, blocks in enumerate(cached_pages) if blocks is None]
+                images = [rendered[i][0] for i in uncached]
+                boxes_per_page = dict(
+                    zip(uncached, _detect_text_regions(images, profile))
+                )
+                detected_pages += len(batch)
+                if progress:
+                    progress("render", detected_pages, total_pages)
+
+                for i, page_num in enumerate(batch):
+                    # 在途页面达到上限时先等待最早的页面识别完成，
+                    # 同时驻留内存的区域图像不随文档页数增长
+                    while len(pending) >= max_inflight:
+                        yield finish_oldest()
+                    if cached_pages[i] is not None:
+                        pending.append(
+                            (
+                                page_num,
+                                [
+                                    (block.bbox, _completed(block.text))
+                                    for block in cached_pages[i]  # type: ignore
+                                ],
+                                None,
+                            )
+                        )
+                        continue
+                    image, layout_dpi = rendered[i]
+                    planned = _plan_page_regions(
+                        image, layout_dpi, boxes_per_page[i], profile
+                    )
+                    crops = renderer.submit(
+                        _render_page_regions, document, page_num, planned
+                    ).result()
+                    regions = []
+                    for (bbox, _), cropped_image in zip(planned, crops):
+                        # 提交 OCR 任务到线程池
+                        regions.append(
+                            (
+                                bbox,
+                                executor.submit(
+                                    _perform_ocr_on_cropped_image,
+                                    cropped_image,
+                                    profile.ocr_use_cls,
+                                ),
+                            )
+                        )
+                    pending.append((page_num, regions, cache_keys[i]))
+                    # 区域图像只由 OCR 任务引用，任务完成后即释放
+                    del crops
+                del rendered, images
 
-    # 将扁平化的 OCR 结果重组回按页码和边界框的结构
-    sorted_ocr_results_flat = sorted(ocr_results_flat, key=lambda x: x[0])
-    final_ocr_results = {i: [] for i in range(total_pages)}
+                # 本批各页的区域渲染完成后再预先渲染下一批，区域渲染不必排在其后；
+                # 下一批的渲染与本批的 OCR 同时进行
+                rendering = (
+                    renderer.submit(
+                        _render_pages, document, batches[index + 1], profile
+                    )
+                    if index + 1 < len(batches)
+                    else None
+                )
+
+                yield from collect_ready()
 
-    for _, page_num, bbox, recognized_text in sorted_ocr_results_flat:
-        final_ocr_results[page_num].append(recognized_text)
+            print(f"Waiting for OCR tasks of {len(pending)} pages to complete...")
+            while pending:
+                yield finish_oldest()
+    finally:
+        document.close()
 
     print("OCR process completed.")
-    # 按页码排序结果
-    sorted_results = {k: final_ocr_results[k] for k in sorted(final_ocr_results.keys())}
-    return sorted_results
+
+
+def iter_ocr_pdf_pages(
+    pdf_path: str,
+    progress: Optional[ProgressCallback] = None,
+    pages: Optional[Sequence[int]] = None,
+) -> Iterator[tuple[int, list[str]]]:
+    """
+    同 `iter_ocr_pdf_blocks`，只产出各文本区域的识别结果列表。
+    """
+    for page_num, blocks in iter_ocr_pdf_blocks(pdf_path, progress, pages):
+        yield page_num, [block.text for block in blocks]
+
+
+def ocr_pdf_pages(
+    pdf_path: str, progress: Optional[ProgressCallback] = None
+) -> dict[int, list[str]]:
+    """
+    对 PDF 文件的每一页进行布局检测（分批）和 OCR（并行）。
+
+    参数:
+        pdf_path: PDF 文件路径。
+        progress: 可选的进度回调，见 `iter_ocr_pdf_pages`。
+
+    返回:
+        一个字典，键为页码（从0开始），值为该页各文本区域的 OCR 结果列表。
+    """
+    return dict(iter_ocr_pdf_pages(pdf_path, progress))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,392 @@
+import asyncio
+import multiprocessing
+import queue
+from collections.abc import Callable, Iterator
+from contextlib import aclosing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, AsyncIterator, Optional
+
+from loguru import logger
+
+from ..config import settings
+from ..utils.progress import ProgressCallback
+from .document_ir import Page
+from .extract_profile import ACCURATE, ExtractionProfile
+
+# 子进程回传进度的轮询间隔（秒）
+PROGRESS_RELAY_INTERVAL = 0.5
+
+
+# OCR 模型的预热状态：未加载（首次 OCR 时在各子进程中按需加载）、加载中、已就绪
+OCR_COLD = "cold"
+OCR_WARMING = "warming"
+OCR_READY = "ready"
+
+
+def _init_worker(warm_up_ocr: bool = False):
+    """
+    子进程初始化：预先导入 PyMuPDF、pymupdf4llm、python-docx、python-pptx
+    以及 OCR 相关模块，使首个任务无需承担导入开销。
+    warm_up_ocr 为 True 时同时加载 OCR 与版面检测模型，否则在首次 OCR 时加载。
+    """
+    from . import doc_to_text_utils  # noqa: F401
+
+    if warm_up_ocr:
+        from .document_ocr import load_ocr_models
+
+        load_ocr_models()
+
+
+def _ping() -> None:
+    """空任务，用于预热子进程"""
+
+
+class _ExtractionStopped(Exception):
+    """主进程已停止消费页面"""
+
+
+def _stream_pages(
+    produce: Callable[[ProgressCallback], Iterator[Page]],
+    page_queue: Any,
+    stop_event: Any,
+) -> int:
+    """
+    在子进程中将 produce 产出的页面（以 `Page.to_dict()` 的形式）与进度事件依次放入有界队列。
+    队列已满时阻塞，从而对提取施加背压；主进程停止消费（stop_event 被设置）时中止提取。
+
+    Returns:
+        产出的页数
+    """
+
+    def put(item: tuple[str, Any]) -> None:
+        while True:
+            if stop_event.is_set():
+                raise _ExtractionStopped()
+            try:
+                page_queue.put(item, timeout=PROGRESS_RELAY_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+    def progress(stage: str, done: int, total: int) -> None:
+        put(("progress", (stage, done, total)))
+
+    pages = 0
+    try:
+        for page in produce(progress):
+            put(("page", page.to_dict()))
+            pages += 1
+    except _ExtractionStopped:
+        pass
+    return pages
+
+
+def _extract_pages(
+    file_path: str,
+    file_type: str,
+    profile: ExtractionProfile,
+    page_queue: Any,
+    stop_event: Any,
+) -> int:
+    """在子进程中逐页提取文件文本，见 `_stream_pages`"""
+    from .doc_to_text_utils import iter_file_pages
+
+    return _stream_pages(
+        lambda progress: iter_file_pages(file_path, file_type, progress, profile),
+        page_queue,
+        stop_event,
+    )
+
+
+def _ocr_pages(
+    file_path: str,
+    pages: list[int],
+    profile: ExtractionProfile,
+    page_queue: Any,
+    stop_event: Any,
+) -> int:
+    """在子进程中逐页 OCR PDF 的指定页面，见 `_stream_pages`"""
+    from .doc_to_text_utils import ocr_page
+    from .document_ocr import iter_ocr_pdf_blocks
+
+    def produce(progress: ProgressCallback) -> Iterator[Page]:
+        for page_num, blocks in iter_ocr_pdf_blocks(
+            file_path, progress, pages=pages, profile=profile
+        ):
+            yield ocr_page(page_num, blocks)
+
+    return _stream_pages(produce, page_queue, stop_event)
+
+
+def _classify_pdf(file_path: str) -> list[str]:
+    """在子进程中判断 PDF 每页的类型"""
+    from ..utils.pdf import classify_pdf
+
+    classification = classify_pdf(file_path, early_exit=False, check_drawings=False)
+    return [classification.pages[i] for i in range(classification.page_count)]
+
+
+def _markdown_range(
+    file_path: str, pages: list[int], profile: ExtractionProfile
+) -> list[dict[str, Any]]:
+    """在子进程中将一段文字页转换为 Markdown，以 `Page.to_dict()` 的形式返回"""
+    from .doc_to_text_utils import markdown_pages
+
+    return [
+        Page.from_text(page_num, text).to_dict()
+        for page_num, text in zip(pages, markdown_pages(file_path, pages, profile))
+    ]
+
+
+def _drain(progress_queue: Any) -> list[tuple[str, int, int]]:
+    items = []
+    while True:
+        try:
+            items.append(progress_queue.get_nowait())
+        except queue.Empty:
+            return items
+
+
+class ExtractionPool:
+    """
+    用于 CPU 密集型文本提取的进程池。
+
+    PDF 渲染、pymupdf4llm 转换与 docx/pptx 解析在子进程中执行，
+    不再与 uvicorn 事件循环争抢 GIL。子进程以 spawn 方式启动，避免 fork
+    多线程进程带来的死锁风险。
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._manager: Optional[Any] = None
+        # 子进程中 OCR 模型的预热状态，见 `start`
+        self.ocr_state = OCR_COLD
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers or settings.EXTRACT_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(settings.OCR_WARMUP,),
+            )
+        return self._pool
+
+    @property
+    def manager(self) -> Any:
+        # Manager 创建的队列、事件的代理对象可以作为参数传给进程池中的任务
+        if self._manager is None:
+            self._manager = multiprocessing.get_context("spawn").Manager()
+        return self._manager
+
+    async def start(self) -> None:
+        """
+        启动并预热全部子进程。
+
+        OCR_WARMUP 开启时子进程在启动时加载 OCR 与版面检测模型，
+        全部子进程启动完成后 ocr_state 变为 ready，首个扫描 PDF 无需等待模型加载。
+        """
+        loop = asyncio.get_running_loop()
+        workers = self.workers or settings.EXTRACT_PROCESS_WORKERS
+        warm_up_ocr = settings.OCR_WARMUP and self._pool is None
+        if warm_up_ocr:
+            self.ocr_state = OCR_WARMING
+        try:
+            await asyncio.gather(
+                *(loop.run_in_executor(self.pool, _ping) for _ in range(workers))
+            )
+        except BaseException:
+            if warm_up_ocr:
+                self.ocr_state = OCR_COLD
+            raise
+        if warm_up_ocr:
+            self.ocr_state = OCR_READY
+            logger.info("OCR 与版面检测模型已在所有文本提取进程中加载")
+        logger.info(f"文本提取进程池已就绪，进程数量: {workers}")
+
+    def metrics(self) -> dict:
+        """进程池的统计信息"""
+        return {
+            "workers": self.workers or settings.EXTRACT_PROCESS_WORKERS,
+            # OCR 模型的预热状态：cold、warming 或 ready
+            "ocr": self.ocr_state,
+        }
+
+    async def iter_pages(
+        self,
+        file_path: str | Path,
+        file_type: str,
+        progress: Optional[ProgressCallback] = None,
+        profile: ExtractionProfile = ACCURATE,
+    ) -> AsyncIterator[Page]:
+        """
+        在进程池中逐页提取文件内容，页面提取完成后即可被消费。
+
+        子进程与主进程之间通过容量为 PIPELINE_QUEUE_SIZE 的队列传递页面，
+        消费过慢时子进程的提取会暂停；停止迭代（包括取消）时子进程在下一次产出时中止。
+        PDF 见 `_iter_pdf_pages`。
+        """
+        if file_type == "pdf":
+            async with aclosing(
+                self._iter_pdf_pages(file_path, progress, profile)
+            ) as pages:
+                async for page in pages:
+                    yield page
+            return
+
+        async with aclosing(
+            self._stream(
+                _extract_pages, str(file_path), file_type, profile, progress=progress
+            )
+        ) as pages:
+            async for page in pages:
+                yield page
+
+    async def _iter_pdf_pages(
+        self,
+        file_path: str | Path,
+        progress: Optional[ProgressCallback] = None,
+        profile: ExtractionProfile = ACCURATE,
+    ) -> AsyncIterator[Page]:
+        """
+        逐页提取 PDF 内容，按页码顺序产出。
+
+        先判断每页的类型并切分为片段（见 `pdf_segments`）：各文字片段作为独立任务
+        在多个子进程中并行转换为 Markdown，同时最多预取与进程数相同的片段；
+        连续的扫描页在一个子进程中流式 OCR。大型文字 PDF 因此能用满所有进程，
+        而不是由 pymupdf4llm 在单核上逐页转换。
+        """
+        from .doc_to_text_utils import pdf_segments
+
+        loop = asyncio.get_running_loop()
+        path = str(file_path)
+        kinds = await loop.run_in_executor(self.pool, _classify_pdf, path)
+        segments = pdf_segments(kinds, settings.PDF_MARKDOWN_RANGE_PAGES)
+        total_pages = len(kinds)
+        logger.info(
+            f"PDF '{Path(path).name}' 共 {total_pages} 页，切分为 {len(segments)} 个片段，"
+            f"其中 {sum(1 for is_ocr, _ in segments if is_ocr)} 个片段需要 OCR。"
+        )
+
+        window = self.workers or settings.EXTRACT_PROCESS_WORKERS
+        # 已提交的文字片段转换任务，键为片段序号
+        text_futures: dict[int, asyncio.Future[list[dict[str, Any]]]] = {}
+        next_segment = 0
+
+        def prefetch():
+            nonlocal next_segment
+            while next_segment < len(segments) and len(text_futures) < window:
+                is_ocr, pages = segments[next_segment]
+                if not is_ocr:
+                    text_futures[next_segment] = loop.run_in_executor(
+                        self.pool, _markdown_range, path, pages, profile
+                    )
+                next_segment += 1
+
+        done_pages = 0
+        # 各扫描片段的 "render"、"ocr" 进度换算为整个文档中扫描页的进度
+        ocr_total = sum(len(pages) for is_ocr, pages in segments if is_ocr)
+        ocr_offset = 0
+        try:
+            for index, (is_ocr, pages) in enumerate(segments):
+                prefetch()
+                if is_ocr:
+                    segment_pages = self._stream(
+                        _ocr_pages,
+                        path,
+                        pages,
+                        profile,
+                        progress=(
+                            _offset_progress(progress, ocr_offset, ocr_total)
+                            if progress
+                            else None
+                        ),
+                    )
+                    ocr_offset += len(pages)
+                else:
+                    segment_pages = _iter_pages(await text_futures.pop(index))
+                async with aclosing(segment_pages):
+                    async for page in segment_pages:
+                        done_pages += 1
+                        if progress:
+                            progress("extract", done_pages, total_pages)
+                        yield page
+        finally:
+            # 尚未开始的转换任务直接取消，已开始的任务结果被丢弃
+            for future in text_futures.values():
+                future.cancel()
+
+    async def _stream(
+        self,
+        func: Callable[..., int],
+        *args: Any,
+        progress: Optional[ProgressCallback] = None,
+    ) -> AsyncIterator[Page]:
+        """在进程池中执行 func(*args, page_queue, stop_event)，逐个产出其放入队列的页面"""
+        loop = asyncio.get_running_loop()
+        page_queue = self.manager.Queue(settings.PIPELINE_QUEUE_SIZE)
+        stop_event = self.manager.Event()
+        future = loop.run_in_executor(self.pool, func, *args, page_queue, stop_event)
+
+        def get_item() -> Optional[tuple[str, Any]]:
+            try:
+                return page_queue.get(timeout=PROGRESS_RELAY_INTERVAL)
+            except queue.Empty:
+                return None
+
+        try:
+            while True:
+                item = await asyncio.to_thread(get_item)
+                if item is None:
+                    if future.done():
+                        # 子进程已结束：抛出其异常，或在取完剩余页面后结束
+                        future.result()
+                        remaining = await asyncio.to_thread(_drain, page_queue)
+                        for kind, value in remaining:
+                            if kind == "page":
+                                yield Page.from_dict(value)
+                            elif progress:
+                                progress(*value)
+                        return
+                    continue
+
+                kind, value = item
+                if kind == "page":
+                    yield Page.from_dict(value)
+                elif progress:
+                    progress(*value)
+        finally:
+            if not future.done():
+                await asyncio.to_thread(stop_event.set)
+
+    def shutdown(self) -> None:
+        self.ocr_state = OCR_COLD
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+
+def _offset_progress(
+    progress: ProgressCallback, offset: int, total: int
+) -> ProgressCallback:
+    """将片段内的进度（已完成 done 页）换算为从 offset 开始、共 total 页的进度"""
+
+    def report(stage: str, done: int, _: int) -> None:
+        progress(stage, offset + done, total)
+
+    return report
+
+
+async def _iter_pages(items: list[dict[str, Any]]) -> AsyncIterator[Page]:
+    for item in items:
+        yield Page.from_dict(item)
+
+
+# 全局文本提取进程池
+extraction_pool = ExtractionPool()
@@ -0,0 +1,73 @@
+"""
+文本提取配置档：在提取质量与速度之间取舍。
+
+上传文档时可以指定配置档，未指定时按文档类型取 EXTRACT_PROFILE_BY_TYPE 中的设置，
+再退回 EXTRACT_PROFILE。所用的配置档记录在文档的 profile 列中，重新处理时保持不变。
+"""
+
+from dataclasses import astuple, dataclass
+from typing import Optional
+
+from ..config import settings
+
+
+@dataclass(frozen=True)
+class ExtractionProfile:
+    name: str
+    dpi: int  # 扫描页文本区域的最高渲染分辨率，实际分辨率按文字大小选择
+    layout: bool  # 扫描页是否先做版面检测、只识别文本区域；否则整页识别
+    markdown: bool  # 文字页是否用 pymupdf4llm 转换为 Markdown（保留标题与表格）；否则直接读取文本层
+    skip_images: bool  # 转换 Markdown 时是否跳过图片与矢量图形
+    ocr_use_cls: Optional[bool]  # OCR 是否进行文字方向分类，None 时使用模型配置
+
+    @property
+    def signature(self) -> str:
+        """影响提取结果的参数，用于区分不同配置档的提取结果缓存"""
+        return ",".join(str(value) for value in astuple(self))
+
+
+# 批量导入价值较低的资料时使用：低分辨率整页 OCR，文字页只读取文本层
+FAST = ExtractionProfile(
+    name="fast",
+    dpi=150,
+    layout=False,
+    markdown=False,
+    skip_images=True,
+    ocr_use_cls=False,
+)
+BALANCED = ExtractionProfile(
+    name="balanced",
+    dpi=200,
+    layout=True,
+    markdown=True,
+    skip_images=True,
+    ocr_use_cls=None,
+)
+# 引入配置档之前的提取方式
+ACCURATE = ExtractionProfile(
+    name="accurate",
+    dpi=300,
+    layout=True,
+    markdown=True,
+    skip_images=False,
+    ocr_use_cls=None,
+)
+
+PROFILES = {profile.name: profile for profile in (FAST, BALANCED, ACCURATE)}
+
+
+def get_profile(name: str) -> ExtractionProfile:
+    """按名称获取配置档，名称未知时抛出 ValueError"""
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(
+            f"未知的提取配置档: {name}，可选: {', '.join(PROFILES)}"
+        ) from None
+
+
+def resolve_profile_name(file_type: str, name: Optional[str] = None) -> str:
+    """确定文档使用的配置档名称：优先使用上传时指定的，其次按文档类型的默认设置"""
+    if not name:
+        name = settings.EXTRACT_PROFILE_BY_TYPE.get(file_type, settings.EXTRACT_PROFILE)
+    return get_profile(name).name
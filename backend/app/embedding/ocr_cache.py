@@ -0,0 +1,105 @@
+"""
+扫描页的逐页 OCR 结果缓存。
+
+每页识别完成、产出结果时即保存在上传目录的 ocr_cache 子目录中，以页面渲染内容的哈希与
+识别参数（渲染分辨率、OCR 模型版本等，见 `document_ocr._page_cache_key`）为键。
+OCR 被取消（删除文档）或进程中断后重新处理时，已识别的页面直接读取缓存；
+不同文档中相同的页面（封面、标准表格等）也只识别一次。
+
+缓存与文档无关，删除文档时不会删除；`python -m app index compact` 按 OCR_CACHE_MAX_MB
+删除最久未使用的条目。
+"""
+
+import json
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger
+
+from ..config import settings
+from .document_ir import TextBlock
+
+
+def ocr_cache_dir() -> Path:
+    return Path(settings.UPLOAD_DIR) / "ocr_cache"
+
+
+def _entry_path(key: str) -> Path:
+    # 按键的前两位分目录，避免单个目录中的文件过多
+    return ocr_cache_dir() / key[:2] / f"{key}.json"
+
+
+def get_cached_page(key: str, page_num: int) -> Optional[list[TextBlock]]:
+    """读取缓存的页面识别结果，没有缓存或缓存损坏时返回 None"""
+    path = _entry_path(key)
+    try:
+        with open(path, encoding="utf-8") as f:
+            regions = json.load(f)
+        # 更新修改时间，清理缓存时按最近使用时间保留
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"读取 OCR 缓存 {path} 失败: {e}")
+        return None
+    return [
+        TextBlock(text=text, kind="paragraph", page=page_num, bbox=tuple(bbox))  # type: ignore
+        for text, bbox in regions
+    ]
+
+
+def cache_page(key: str, blocks: list[TextBlock]) -> None:
+    """保存页面识别结果；写入失败只记录日志，不影响识别"""
+    path = _entry_path(key)
+    part_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.part")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(part_path, "w", encoding="utf-8") as f:
+            json.dump(
+                [[block.text, block.bbox] for block in blocks], f, ensure_ascii=False
+            )
+        os.replace(part_path, path)
+    except OSError as e:
+        logger.warning(f"写入 OCR 缓存 {path} 失败: {e}")
+        part_path.unlink(missing_ok=True)
+
+
+@dataclass
+class PruneResult:
+    """OCR 缓存清理结果"""
+
+    size_before: int  # 字节
+    size_after: int
+    removed: int  # 删除的条目数
+
+
+def prune_ocr_cache(max_bytes: Optional[int] = None) -> PruneResult:
+    """按最近使用时间从旧到新删除缓存条目，直到总大小不超过 max_bytes（默认为 OCR_CACHE_MAX_MB）"""
+    if max_bytes is None:
+        max_bytes = settings.OCR_CACHE_MAX_MB * 1024 * 1024
+    entries = []
+    if ocr_cache_dir().is_dir():
+        for path in ocr_cache_dir().glob("*/*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    size_before = size = sum(entry_size for _, entry_size, _ in entries)
+    removed = 0
+    for _, entry_size, path in sorted(entries):
+        if size <= max_bytes:
+            break
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"删除 OCR 缓存 {path} 失败: {e}")
+            continue
+        size -= entry_size
+        removed += 1
+    return PruneResult(size_before, size, removed)
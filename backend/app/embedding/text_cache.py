@@ -0,0 +1,98 @@
+"""
+提取结果缓存。
+
+每个文件逐页提取出的结构化内容（见 `document_ir.Page`）以 gzip 压缩的 JSON Lines
+保存在上传目录的 text_cache 子目录中，文件名由内容哈希、提取配置档与提取签名（提取逻辑
+版本、OCR 模型版本、配置档参数）组成。修改分块参数或更换 embedding 模型后重新处理文档时
+直接读取缓存，无需重新解析与 OCR；内容与配置档都相同的文件共享缓存。
+预览也直接读取缓存中的页面。
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import uuid
+from contextlib import aclosing
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from loguru import logger
+
+from ..config import settings
+from .doc_to_text_utils import EXTRACTOR_VERSION
+from .document_ir import Page
+from .document_ocr import OCR_MODEL_VERSION
+from .extract_profile import ExtractionProfile
+
+
+def text_cache_signature(profile: ExtractionProfile) -> str:
+    """影响提取结果的配置签名"""
+    return (
+        f"extractor={EXTRACTOR_VERSION};ocr={OCR_MODEL_VERSION};"
+        f"profile={profile.signature}"
+    )
+
+
+def cache_dir() -> Path:
+    return Path(settings.UPLOAD_DIR) / "text_cache"
+
+
+def cache_path(content_hash: str, profile: ExtractionProfile) -> Path:
+    """内容哈希在某一配置档下、当前提取签名对应的缓存文件路径"""
+    signature = text_cache_signature(profile).encode("utf-8")
+    digest = hashlib.sha1(signature).hexdigest()[:12]
+    return cache_dir() / f"{content_hash}.{profile.name}.{digest}.jsonl.gz"
+
+
+def has_cached_pages(content_hash: Optional[str], profile: ExtractionProfile) -> bool:
+    return bool(content_hash) and cache_path(content_hash, profile).exists()  # type: ignore
+
+
+async def iter_cached_pages(
+    content_hash: str, profile: ExtractionProfile
+) -> AsyncIterator[Page]:
+    """逐页读取缓存的提取结果"""
+    with gzip.open(cache_path(content_hash, profile), "rt", encoding="utf-8") as f:
+        while line := await asyncio.to_thread(f.readline):
+            yield Page.from_dict(json.loads(line))
+
+
+async def cache_pages(
+    content_hash: str, profile: ExtractionProfile, pages: AsyncIterator[Page]
+) -> AsyncIterator[Page]:
+    """
+    原样产出 pages，同时将其写入缓存。
+
+    只有 pages 被完整消费后缓存才会生效；提取失败或被取消时丢弃已写入的部分。
+    """
+    path = cache_path(content_hash, profile)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # 内容相同的文档可能同时处理，各自写入不同的临时文件
+    part_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.part")
+    completed = False
+    try:
+        with gzip.open(part_path, "wt", encoding="utf-8") as f:
+            async with aclosing(pages):
+                async for page in pages:
+                    f.write(json.dumps(page.to_dict(), ensure_ascii=False) + "\n")
+                    yield page
+        os.replace(part_path, path)
+        completed = True
+        # 清理同一内容、同一配置档在旧提取签名下的缓存
+        for stale in path.parent.glob(f"{content_hash}.{profile.name}.*.jsonl.gz"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+    finally:
+        if not completed:
+            part_path.unlink(missing_ok=True)
+
+
+def remove_cached_pages(content_hash: str) -> None:
+    """删除某一内容在所有配置档下的缓存"""
+    for path in cache_dir().glob(f"{content_hash}.*.jsonl.gz"):
+        try:
+            path.unlink()
+        except OSError as e:
+            logger.error(f"删除提取结果缓存 {path} 失败: {e}")
@@ -49,6 +49,14 @@ async def get_wikipedia_content(keyword, lang="zh") -> str:
             return str(e)
 
 
+def _cite(document: str, metadata) -> str:
+    """为文档块加上所在页的引用标记，早期版本写入的文档块没有页码"""
+    page = (metadata or {}).get("page")
+    if page is None:
+        return document
+    return f"[第 {page + 1} 页] {document}"
+
+
 async def query_vector_db(query_texts: list[str], n_results: int = 5) -> str:
     """
     从向量数据库中查询与 query_texts 距离最近（最相关）的文本内容。
@@ -59,13 +67,15 @@ async def query_vector_db(query_texts: list[str], n_results: int = 5) -> str:
         n_results (int, optional): 查询结果数量。默认为 5。
 
     Returns:
-        str: 合并的查询结果。
+        str: 合并的查询结果，记录了页码的文档块以 "[第 n 页]" 开头。
     """
 
     results = vector_db.query(query_texts, n_results)
     if results and results.get("ids") and results["ids"][0]:
+        documents = results["documents"][0]  # type: ignore
+        metadatas = (results.get("metadatas") or [[]])[0] or [None] * len(documents)
         return "\n".join(
-            [results["documents"][0][i] for i in range(len(results["ids"][0]))]  # type: ignore
+            _cite(document, metadata) for document, metadata in zip(documents, metadatas)
         )
     else:
         return "未找到相关内容"
@@ -16,6 +16,7 @@ from ..schemas.query import (
     WorkflowStep,
     WorkflowType,
 )
+from ..utils.admission import ConcurrencyLimiter
 from ..utils.llm_utils import flatten_svg_in_markdown, remove_think
 from . import RAGAgent, llm
 from .svg_gen import process_text_with_svg_generation
@@ -257,6 +258,13 @@ class WorkflowService:
         self.workflows: dict[str, WorkflowType] = {}
         # 存储每个工作流的任务
         self.tasks: Dict[str, asyncio.Task] = {}
+        # 限制同时调用大模型的工作流数量与排队数量，避免突发请求耗尽资源
+        self.limiter = ConcurrencyLimiter(
+            "工作流",
+            max_concurrent=settings.WORKFLOW_MAX_CONCURRENT,
+            max_queued=settings.WORKFLOW_MAX_QUEUED,
+            retry_after=settings.WORKFLOW_RETRY_AFTER,
+        )
 
     async def create_workflow(
         self,
@@ -266,8 +274,26 @@ class WorkflowService:
         max_tokens: int | None = None,
         mode: AppMode = AppMode.TEACHING_PLAN,  # 新增 mode 参数
     ) -> str:
-        """创建一个新的工作流"""
+        """
+        创建一个新的工作流
 
+        Raises:
+            QueueFullError: 执行中与排队中的工作流数量已达上限
+        """
+        # 先做准入检查，过载时不再访问数据库
+        self.limiter.admit()
+        try:
+            return await self._create_workflow(messages, db, mode)
+        except BaseException:
+            self.limiter.release()
+            raise
+
+    async def _create_workflow(
+        self,
+        messages: List[dict[str, str]],
+        db: aiosqlite.Connection,
+        mode: AppMode,
+    ) -> str:
         try:
             if not self.llm.current_model:
                 await self.llm.update_current_model_from_db(db)
@@ -374,15 +400,18 @@ class WorkflowService:
             # 创建异步任务
             if mode != AppMode.FREE:
                 assert agents is not None
-                self.agents_workflow = Workflow(self.workflows[workflow_id], agents)
+                # 工作流可能需要排队，每个任务持有自己的 Workflow 实例
+                agents_workflow = Workflow(self.workflows[workflow_id], agents)
                 task = asyncio.create_task(
-                    self._process_workflow(workflow_id, messages)
+                    self._process_workflow(workflow_id, messages, agents_workflow)
                 )
             else:
                 task = asyncio.create_task(
                     self._process_workflow_simple(workflow_id, messages)
                 )
             self.tasks[workflow_id] = task
+            # 任务结束（包括排队时被取消）后归还排队位置
+            task.add_done_callback(lambda _: self.limiter.release())
             # 添加完成回调
             task.add_done_callback(
                 lambda t: asyncio.create_task(
@@ -401,6 +430,14 @@ class WorkflowService:
         messages: List[dict[str, str]],
     ):
         """异步处理工作流，用于简单模式"""
+        async with self.limiter.slot():
+            await self._run_workflow_simple(workflow_id, messages)
+
+    async def _run_workflow_simple(
+        self,
+        workflow_id: str,
+        messages: List[dict[str, str]],
+    ):
         workflow = self.workflows[workflow_id]
 
         try:
@@ -433,8 +470,18 @@ class WorkflowService:
         self,
         workflow_id: str,
         messages: List[dict[str, str]],
+        agents_workflow: Workflow,
     ) -> None:
         """异步处理工作流"""
+        async with self.limiter.slot():
+            await self._run_workflow(workflow_id, messages, agents_workflow)
+
+    async def _run_workflow(
+        self,
+        workflow_id: str,
+        messages: List[dict[str, str]],
+        agents_workflow: Workflow,
+    ) -> None:
         workflow = self.workflows[workflow_id]
 
         try:
@@ -446,11 +493,11 @@ class WorkflowService:
             workflow.current_step = 0
             messages_extract = [x["content"] for x in messages]
             logger.info(f"WorkflowService got user message: {messages_extract}")
-            workflow_outputs = await self.agents_workflow.run(messages_extract)
+            workflow_outputs = await agents_workflow.run(messages_extract)
 
             workflow.status = WorkflowStatus.COMPLETED
             workflow.final_content = (
-                workflow_outputs[self.agents_workflow.agents[-1].name]
+                workflow_outputs[agents_workflow.agents[-1].name]
                 or workflow.steps[-1].result
                 or "无内容，请检查 workflow 内是否有错误"
             )
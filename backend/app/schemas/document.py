@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, ConfigDict
 
@@ -24,6 +24,9 @@ class Document(DocumentBase):
     progress: int
     message: Optional[str] = None
     chunk_size: Optional[int] = None
+    profile: Optional[str] = None  # 文本提取配置档
+    queue_position: Optional[int] = None  # 排队中时在处理队列中的位置（从 1 开始）
+    eta_seconds: Optional[float] = None  # 排队中时预计处理完成前的时间（秒）
     enabled: bool
     created_at: datetime
     updated_at: datetime
@@ -37,6 +40,72 @@ class DocumentList(BaseModel):
     documents: List[Document]
 
 
+class BulkUploadItem(BaseModel):
+    """批量上传中单个文件的结果"""
+
+    filename: str
+    id: Optional[str] = None  # 创建成功时的文档 ID
+    error: Optional[str] = None  # 创建失败的原因
+
+
+class BulkUploadResponse(BaseModel):
+    """批量上传响应模型"""
+
+    documents: List[BulkUploadItem]
+
+
+class FileEstimate(BaseModel):
+    """单个文件的处理耗时估计"""
+
+    filename: str
+    type: Optional[str] = None
+    profile: Optional[str] = None  # 文本提取配置档
+    pages: Optional[int] = None  # PDF 页数、幻灯片数或段落数
+    scanned_pages: Optional[float] = None  # 估计需要 OCR 的页数
+    stages: Dict[str, float] = {}  # 各阶段的估计耗时（秒）：extract、embed
+    total: Optional[float] = None  # 估计的总耗时（秒）
+    error: Optional[str] = None  # 无法估计的原因
+
+
+class IngestEstimateResponse(BaseModel):
+    """处理耗时估计响应模型"""
+
+    files: List[FileEstimate]
+    total: float  # 所有文件估计耗时之和（秒）
+    queue_wait: float  # 当前排队的文档预计还需处理的时间（秒）
+    eta: float  # 现在上传这些文件时，预计全部处理完成前的时间（秒）
+
+
+class ReindexResponse(BaseModel):
+    """重新处理文档响应模型"""
+
+    documents: List[str]  # 加入处理队列的文档 ID
+
+
+class PreviewBlock(BaseModel):
+    """预览页面中的文本块"""
+
+    kind: str  # paragraph、table_row 或 note
+    start: int  # 在页面文本中的起止偏移
+    end: int
+    bbox: Optional[List[float]] = None  # 位置 [x0, y0, x1, y1]，单位为磅
+
+
+class PreviewPage(BaseModel):
+    """预览页面"""
+
+    page: int  # 页码（从 0 开始）
+    text: str
+    blocks: List[PreviewBlock]
+
+
+class DocumentPreview(BaseModel):
+    """文档预览响应模型"""
+
+    id: str
+    pages: List[PreviewPage]
+
+
 class DocumentDelete(BaseModel):
     """文档删除请求模型"""
 
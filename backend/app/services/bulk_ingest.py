@@ -0,0 +1,217 @@
+"""
+离线批量导入：不经过 HTTP 接口，直接将目录树中的文件导入知识库。
+
+文件逐个复制到上传目录并登记为文档（写入 SQLite 的 documents 表），
+再由持久化处理队列（见 `IngestQueue`）处理：文本提取与 OCR 在提取进程池中并行执行，
+文档块按 EMBEDDING_BATCH_SIZE 批量向量化后写入 Chroma。
+导入期间不应同时运行后端服务，二者会争抢同一个处理队列。
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+import aiosqlite
+from loguru import logger
+
+from ..database import get_standalone_db, init_db
+from ..embedding.extract_pool import extraction_pool
+from .document_service import DocumentService, ingest_queue
+
+# 进度回调，参数为新完成的数量
+AdvanceCallback = Callable[[int], None]
+
+# 等待处理完成时查询文档状态的间隔（秒）
+STATUS_POLL_INTERVAL = 1.0
+
+# 单条查询中 IN 列表的最大长度，避免超过 SQLite 的参数数量限制
+_QUERY_BATCH = 500
+
+
+@dataclass
+class BulkIngestReport:
+    """批量导入的结果统计"""
+
+    files: int = 0  # 找到的受支持文件数
+    queued: int = 0  # 加入处理队列的文档数
+    skipped: int = 0  # 已导入过而跳过的文件数
+    completed: int = 0
+    failed: int = 0
+    bytes: int = 0  # 处理的文档总大小
+    chunks: int = 0  # 生成的文档块数量
+    elapsed: float = 0  # 总耗时（秒）
+    # 无法导入或处理失败的文件：(路径或文件名, 原因)
+    errors: list[tuple[str, str]] = field(default_factory=list)
+
+
+def find_ingest_files(root: Path) -> list[Path]:
+    """按路径顺序列出目录树中受支持的文件，跳过隐藏的文件与目录"""
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for filename in sorted(filenames):
+            if not filename.startswith(".") and DocumentService.is_allowed_file(filename):
+                files.append(Path(dirpath) / filename)
+    return files
+
+
+async def register_files(
+    db: aiosqlite.Connection,
+    root: Path,
+    files: Iterable[Path],
+    report: BulkIngestReport,
+    profile: Optional[str] = None,
+    description: Optional[str] = None,
+    advance: Optional[AdvanceCallback] = None,
+) -> list[str]:
+    """
+    将文件登记为文档并加入处理队列，已导入过的文件会被跳过（见
+    `DocumentService.create_document_from_path`）。
+    未指定描述时以文件在目录树中的相对位置作为描述。
+
+    Returns:
+        加入处理队列的文档 ID
+    """
+    service = DocumentService(db)
+    document_ids = []
+    for path in files:
+        relative = path.relative_to(root).as_posix()
+        try:
+            document_id = await service.create_document_from_path(
+                path,
+                description=description or relative,
+                profile=profile,
+                skip_existing=True,
+            )
+        except Exception as e:
+            logger.error(f"导入文件 {relative} 失败: {e}")
+            report.errors.append((relative, str(e)))
+        else:
+            if document_id is None:
+                report.skipped += 1
+            else:
+                document_ids.append(document_id)
+        if advance:
+            advance(1)
+    report.queued = len(document_ids)
+    return document_ids
+
+
+async def wait_for_documents(
+    db: aiosqlite.Connection,
+    document_ids: list[str],
+    report: BulkIngestReport,
+    advance: Optional[AdvanceCallback] = None,
+    poll_interval: float = STATUS_POLL_INTERVAL,
+) -> None:
+    """等待文档全部处理完成或失败，并统计结果"""
+    pending = list(document_ids)
+    while pending:
+        finished = []
+        for i in range(0, len(pending), _QUERY_BATCH):
+            batch = pending[i : i + _QUERY_BATCH]
+            cursor = await db.execute(
+                f"""
+                SELECT id, filename, status, size, chunk_size, message FROM documents
+                WHERE status IN ('completed', 'failed')
+                    AND id IN ({", ".join("?" * len(batch))})
+                """,
+                batch,
+            )
+            finished.extend(await cursor.fetchall())
+        for row in finished:
+            if row["status"] == "completed":
+                report.completed += 1
+                report.bytes += row["size"] or 0
+                report.chunks += row["chunk_size"] or 0
+            else:
+                report.failed += 1
+                report.errors.append((row["filename"], row["message"] or ""))
+        if finished:
+            done = {row["id"] for row in finished}
+            pending = [id for id in pending if id not in done]
+            if advance:
+                advance(len(finished))
+        if pending:
+            await asyncio.sleep(poll_interval)
+
+
+async def process_documents(
+    db: aiosqlite.Connection,
+    document_ids: list[str],
+    report: BulkIngestReport,
+    workers: Optional[int] = None,
+    advance: Optional[AdvanceCallback] = None,
+) -> None:
+    """
+    在当前进程中运行提取进程池与处理队列，直到 document_ids 全部处理完成或失败。
+    队列中其他排队的任务（例如上次中断的任务）也会一并处理。
+    """
+    try:
+        await extraction_pool.start()
+        await ingest_queue.start(workers)
+        await wait_for_documents(db, document_ids, report, advance)
+    finally:
+        await ingest_queue.stop()
+        extraction_pool.shutdown()
+
+
+async def bulk_ingest(
+    root: Path,
+    profile: Optional[str] = None,
+    description: Optional[str] = None,
+    workers: Optional[int] = None,
+    on_registering: Optional[Callable[[int], AdvanceCallback]] = None,
+    on_processing: Optional[Callable[[int], AdvanceCallback]] = None,
+) -> BulkIngestReport:
+    """
+    将目录树 root 中的文件导入知识库，并等待处理完成。
+
+    Args:
+        root: 目录。
+        profile: 文本提取配置档的名称，未指定时按文档类型的默认设置。
+        description: 所有文档的描述，默认为文件在目录树中的相对位置。
+        workers: 同时处理的文档数量，默认为 INGEST_WORKERS。
+        on_registering: 开始登记文件时以文件数量调用，返回登记进度的回调。
+        on_processing: 开始处理时以文档数量调用，返回处理进度的回调。
+    """
+    started_at = time.monotonic()
+    report = BulkIngestReport()
+    files = find_ingest_files(root)
+    report.files = len(files)
+
+    await init_db()
+    db = await get_standalone_db()
+    try:
+        # 登记文件期间在后台预热提取进程池
+        warmup = asyncio.create_task(extraction_pool.start())
+        try:
+            document_ids = await register_files(
+                db,
+                root,
+                files,
+                report,
+                profile,
+                description,
+                on_registering(len(files)) if on_registering else None,
+            )
+            await warmup
+        except BaseException:
+            warmup.cancel()
+            extraction_pool.shutdown()
+            raise
+        await process_documents(
+            db,
+            document_ids,
+            report,
+            workers,
+            on_processing(len(document_ids)) if on_processing else None,
+        )
+    finally:
+        await db.close()
+
+    report.elapsed = time.monotonic() - started_at
+    return report
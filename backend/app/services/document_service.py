@@ -1,6 +1,10 @@
 import asyncio
 import os
-from typing import Any, Dict, Optional
+import time
+import zipfile
+from contextlib import aclosing
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional
 from uuid import uuid4
 
 from fastapi import UploadFile
@@ -11,11 +15,43 @@ from ..database import get_standalone_db
 
 # from ..database import get_db  # 移除 get_db 导入
 from ..embedding import vector_db
-from ..embedding.chunk import chunk_text
-from ..embedding.doc_to_text_utils import process_file_to_text
-
-# 全局字典，用于存储正在进行的文档处理任务
-processing_tasks: Dict[str, asyncio.Task] = {}
+from ..embedding.doc_to_text_utils import EXTRACTOR_VERSION
+from ..embedding.document_ir import Page
+from ..embedding.extract_pool import extraction_pool
+from ..embedding.extract_profile import get_profile, resolve_profile_name
+from ..embedding.text_cache import (
+    cache_pages,
+    has_cached_pages,
+    iter_cached_pages,
+    remove_cached_pages,
+)
+from ..utils.progress import ProgressCallback
+from ..utils.upload import (
+    UploadBudget,
+    hash_file,
+    save_stream,
+    save_upload_file,
+    zip_member_filename,
+)
+from .ingest_cost import estimate_ingest, record_ingest_timing
+from .ingest_pipeline import run_ingest_pipeline
+from .ingest_queue import IngestQueue
+from .progress import DocumentProgress
+
+# 文档分块参数
+CHUNK_MAX_SIZE = 700
+CHUNK_OVERLAP_SIZE = 50
+
+
+def ingest_signature() -> str:
+    """
+    当前提取、分块与 embedding 配置的签名。
+    内容哈希与签名都相同的已完成文档，其文本块与向量可以直接复用。
+    """
+    return (
+        f"extractor={EXTRACTOR_VERSION};chunk={CHUNK_MAX_SIZE}/{CHUNK_OVERLAP_SIZE};"
+        f"embedding={settings.EMBEDDING_MODEL_NAME}"
+    )
 
 
 class DocumentService:
@@ -29,15 +65,32 @@ class DocumentService:
             return False
         return os.path.splitext(filename)[1].lower() in settings.ALLOWED_EXTENSIONS
 
+    @staticmethod
+    def file_type_from_name(filename: str) -> str:
+        """根据扩展名推断文档类型（与前端上传时的约定一致，即不带点的小写扩展名）"""
+        return os.path.splitext(filename)[1].lower().lstrip(".")
+
     async def create_document(
         self,
         file: UploadFile,
         type: str,
         description: Optional[str] = None,
+        profile: Optional[str] = None,
     ) -> Dict[str, Any]:
-        """创建新文档记录"""
+        """
+        创建新文档记录
+
+        profile 为文本提取配置档的名称，未指定时按文档类型的默认设置。
+
+        Raises:
+            QueueFullError: 处理队列已满
+            ValueError: 文件名为空或配置档未知
+        """
         if not file.filename:
             raise ValueError("文件名不能为空")
+        profile = resolve_profile_name(type, profile)
+        # 队列已满时在写入文件前拒绝
+        await ingest_queue.check_capacity(self.db)
 
         document_id = str(uuid4())
 
@@ -45,37 +98,293 @@ class DocumentService:
         file_path = os.path.join(settings.UPLOAD_DIR, document_id)
         os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
 
-        content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
+        # 流式写入磁盘，边写边检查大小并计算哈希，避免整个文件驻留内存
+        size, content_hash = await save_upload_file(
+            file, file_path, max_size=settings.MAX_UPLOAD_SIZE
+        )
+        return await self._register_document(
+            document_id, file.filename, type, description, size, content_hash, profile
+        )
+
+    async def create_documents_from_archive(
+        self,
+        archive: UploadFile,
+        description: Optional[str] = None,
+        profile: Optional[str] = None,
+        budget: Optional[UploadBudget] = None,
+    ) -> list[Dict[str, Any]]:
+        """
+        将 zip 压缩包中的每个受支持的文件创建为一个文档。
+        profile 为所有条目使用的文本提取配置档，未指定时按各自类型的默认设置。
+
+        条目逐个流式解压到上传目录，不会整体读入内存。
+        budget 为所在批量上传请求剩余的文件数量与字节数，每个条目（包括失败的）占用
+        一个文件数量，解压出的字节数从中扣除；用尽时其余条目报告错误。
+        未指定时为 MAX_BULK_UPLOAD_FILES 与 MAX_BULK_UPLOAD_SIZE。
+
+        Returns:
+            每个条目的结果，成功时包含 id，失败时包含 error
+        """
+        if budget is None:
+            budget = UploadBudget(
+                settings.MAX_BULK_UPLOAD_FILES, settings.MAX_BULK_UPLOAD_SIZE
+            )
+        results = []
+        try:
+            # UploadFile 的底层文件为可随机访问的临时文件，zipfile 可以直接读取
+            zf = zipfile.ZipFile(archive.file)
+        except zipfile.BadZipFile:
+            raise ValueError(f"无法解析压缩包: {archive.filename}")
+
+        with zf:
+            for info in zf.infolist():
+                filename = zip_member_filename(info)
+                if info.is_dir() or filename.startswith("__MACOSX/"):
+                    continue
+                name = os.path.basename(filename)
+                if not self.is_allowed_file(name):
+                    continue
+                if budget.files <= 0:
+                    results.append({"filename": name, "error": "文件数量超过限制"})
+                    break
+                budget.files -= 1
+                if info.file_size > settings.MAX_UPLOAD_SIZE:
+                    results.append(
+                        {
+                            "filename": name,
+                            "error": f"文件大小超过限制: {info.file_size} > {settings.MAX_UPLOAD_SIZE}",
+                        }
+                    )
+                    continue
+                if info.file_size > budget.bytes:
+                    results.append({"filename": name, "error": "文件总大小超过限制"})
+                    continue
+
+                document_id = str(uuid4())
+                file_path = os.path.join(settings.UPLOAD_DIR, document_id)
+                try:
+                    await ingest_queue.check_capacity(self.db)
+                    # 条目声明的大小可能不实，按实际解压出的字节数限制
+                    max_size = min(settings.MAX_UPLOAD_SIZE, budget.bytes)
+                    with zf.open(info) as stream:
+                        size, content_hash = await asyncio.to_thread(
+                            save_stream, stream, file_path, max_size
+                        )
+                    budget.bytes -= size
+                    type = self.file_type_from_name(name)
+                    document = await self._register_document(
+                        document_id,
+                        name,
+                        type,
+                        description,
+                        size,
+                        content_hash,
+                        resolve_profile_name(type, profile),
+                    )
+                    results.append({"filename": name, "id": document["id"]})
+                except Exception as e:
+                    logger.error(f"解压文件 {filename} 失败: {e}")
+                    results.append({"filename": name, "error": str(e)})
+
+        return results
+
+    async def create_document_from_path(
+        self,
+        path: str | Path,
+        description: Optional[str] = None,
+        profile: Optional[str] = None,
+        skip_existing: bool = False,
+    ) -> Optional[str]:
+        """
+        将本地文件复制到上传目录并创建文档，用于离线批量导入（见 `bulk_ingest`）。
+        不检查处理队列的容量。
+
+        Args:
+            path: 本地文件路径，文档类型由扩展名推断。
+            description: 描述。
+            profile: 文本提取配置档的名称，未指定时按文档类型的默认设置。
+            skip_existing: 已有文件名、内容与配置档都相同的文档时不再创建：
+                           该文档已完成时跳过；处理失败或未完成时返回其 ID，
+                           不在处理队列中的重新加入队列。
+                           使中断后重新运行的导入能够继续，且不会产生重复文档。
+
+        Returns:
+            加入处理队列（或仍在队列中）的文档 ID，跳过时为 None
+
+        Raises:
+            UploadTooLargeError: 文件超过大小限制
+            ValueError: 文件大小为0或配置档未知
+        """
+        name = os.path.basename(path)
+        type = self.file_type_from_name(name)
+        profile = resolve_profile_name(type, profile)
+
+        if skip_existing:
+            # 先就地计算哈希，已导入过的文件无需复制到上传目录
+            _, content_hash = await asyncio.to_thread(hash_file, path)
+            # 优先已完成的文档，其次未完成的，最后是失败的
+            cursor = await self.db.execute(
+                """
+                SELECT d.*, j.status AS job_status FROM documents d
+                LEFT JOIN ingest_jobs j ON j.document_id = d.id
+                WHERE d.filename = ? AND d.content_hash = ? AND d.profile = ?
+                ORDER BY d.status != 'completed', d.status = 'failed', d.created_at
+                LIMIT 1
+                """,
+                (name, content_hash, profile),
+            )
+            existing = await cursor.fetchone()
+            if existing is not None:
+                if existing["status"] == "completed":
+                    return None
+                # 上次导入中断时未处理完的文档仍在队列中，由队列恢复处理；
+                # 失败或不在队列中的文档重新加入队列
+                if existing["status"] == "failed" or existing["job_status"] not in (
+                    "queued",
+                    "running",
+                ):
+                    await self._requeue(dict(existing))
+                return existing["id"]
+
+        document_id = str(uuid4())
+        file_path = os.path.join(settings.UPLOAD_DIR, document_id)
+        os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+        with open(path, "rb") as stream:
+            size, content_hash = await asyncio.to_thread(
+                save_stream, stream, file_path, settings.MAX_UPLOAD_SIZE
+            )
+
+        await self._add_document(
+            document_id, name, type, description, size, content_hash, profile
+        )
+        return document_id
+
+    async def estimate_file(
+        self, file: UploadFile, type: str, profile: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        检查上传的文件并估计其处理耗时（见 `estimate_ingest`），文件不会被保存。
+
+        Raises:
+            UploadTooLargeError: 文件超过大小限制
+            ValueError: 配置档未知
+        """
+        profile = resolve_profile_name(type, profile)
+        os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+        file_path = os.path.join(settings.UPLOAD_DIR, f".estimate-{uuid4().hex}")
+        try:
+            await save_upload_file(file, file_path, max_size=settings.MAX_UPLOAD_SIZE)
+            estimate = await estimate_ingest(self.db, file_path, type, get_profile(profile))
+        finally:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        return {
+            "filename": file.filename,
+            "type": type,
+            "profile": profile,
+            "pages": estimate.features.pages,
+            "scanned_pages": round(estimate.features.scanned_pages, 1),
+            "stages": {stage: round(t, 1) for stage, t in estimate.stages.items()},
+            "total": round(estimate.total, 1),
+        }
+
+    async def _register_document(
+        self,
+        document_id: str,
+        filename: str,
+        type: str,
+        description: Optional[str],
+        size: int,
+        content_hash: str,
+        profile: str,
+    ) -> Dict[str, Any]:
+        """为已保存到上传目录的文件创建文档记录，并加入处理队列"""
+        await self._add_document(
+            document_id, filename, type, description, size, content_hash, profile
+        )
+        result = await self.get_document(document_id)
+        if not result:
+            raise FileNotFoundError(f"Failed to create document {document_id}")
+
+        return result
+
+    async def _add_document(
+        self,
+        document_id: str,
+        filename: str,
+        type: str,
+        description: Optional[str],
+        size: int,
+        content_hash: str,
+        profile: str,
+    ) -> None:
+        """插入文档记录并加入处理队列，见 `_register_document`"""
+        file_path = os.path.join(settings.UPLOAD_DIR, document_id)
+        if size == 0:
+            os.remove(file_path)
+            raise ValueError("文件大小为0")
 
         # 创建文档记录
         await self.db.execute(
             """
             INSERT INTO documents (
                 id, filename, type, description,
-                status, size
-            ) VALUES (?, ?, ?, ?, ?, ?)
+                status, size, content_hash, profile
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             """,
             (
                 document_id,
-                file.filename,
+                filename,
                 type,
                 description,
                 "processing",
-                len(content),
+                size,
+                content_hash,
+                profile,
             ),
         )
 
-        result = await self.get_document(document_id)
-        if not result:
-            raise FileNotFoundError(f"Failed to create document {document_id}")
+        # 加入持久化处理队列，由后台 worker 按估计耗时调度处理
+        await self._enqueue(document_id, file_path, type, content_hash, profile)
 
-        # 在后台启动文档处理任务并保存任务句柄
-        task = asyncio.create_task(self.process_document(result))
-        processing_tasks[document_id] = task
+    async def _enqueue(
+        self,
+        document_id: str,
+        file_path: str,
+        type: str,
+        content_hash: Optional[str],
+        profile: str,
+    ):
+        """
+        估计文档处理耗时并加入处理队列。
 
-        return result
+        已有内容相同的已完成文档时直接复用其处理结果（见 `_reuse_duplicate`），
+        文档立即完成，不进入处理队列，也不必检查文件、估计耗时。
+        """
+        duplicate = {"id": document_id, "content_hash": content_hash, "profile": profile}
+        if await self._reuse_duplicate(self.db, duplicate, ingest_signature()):
+            return
+
+        extraction_profile = get_profile(profile)
+        estimate = await estimate_ingest(
+            self.db,
+            file_path,
+            type,
+            extraction_profile,
+            # 已有提取结果缓存时只需分块与向量化
+            cached=has_cached_pages(content_hash, extraction_profile),
+        )
+        await ingest_queue.enqueue(self.db, document_id, estimate.total)
+
+    async def _release_text_cache(self, content_hash: Optional[str]):
+        """没有文档再引用某一内容时，删除其提取结果缓存"""
+        if not content_hash:
+            return
+        cursor = await self.db.execute(
+            "SELECT 1 FROM documents WHERE content_hash = ? LIMIT 1", (content_hash,)
+        )
+        if await cursor.fetchone() is None:
+            await asyncio.to_thread(remove_cached_pages, content_hash)
 
     async def get_document(self, document_id: str) -> Optional[Dict[str, Any]]:
         """获取文档记录"""
@@ -83,7 +392,43 @@ class DocumentService:
             "SELECT * FROM documents WHERE id = ?", (document_id,)
         )
         row = await cursor.fetchone()
-        return dict(row) if row else None
+        if not row:
+            return None
+        document = dict(row)
+        self._set_schedule(document, await ingest_queue.schedule(self.db))
+        return document
+
+    @staticmethod
+    def _set_schedule(
+        document: Dict[str, Any], schedule: Dict[str, tuple[int, float]]
+    ) -> None:
+        """填入文档在处理队列中的位置与预计处理完成前的时间"""
+        position, eta = schedule.get(document["id"], (None, None))
+        document["queue_position"] = position
+        document["eta_seconds"] = round(eta, 1) if eta is not None else None
+
+    async def get_document_pages(
+        self, document: Dict[str, Any], start: int = 0, count: int = 1
+    ) -> Optional[list[Page]]:
+        """
+        读取文档页码在 [start, start + count) 内的页面，用于预览与引用定位。
+
+        页面来自提取结果缓存中的结构化中间表示，无需重新解析文件；
+        文档尚未提取完成（没有缓存）时返回 None。
+        """
+        content_hash = document.get("content_hash")
+        profile = get_profile(document["profile"])
+        if not has_cached_pages(content_hash, profile):
+            return None
+        pages = []
+        cached = iter_cached_pages(content_hash, profile)  # type: ignore
+        async with aclosing(cached):
+            async for page in cached:
+                if page.number >= start + count:
+                    break
+                if page.number >= start:
+                    pages.append(page)
+        return pages
 
     async def list_documents(
         self,
@@ -102,6 +447,9 @@ class DocumentService:
         # 获取文档列表
         cursor = await self.db.execute(" ".join(query), params)
         documents = [dict(row) for row in await cursor.fetchall()]
+        schedule = await ingest_queue.schedule(self.db)
+        for document in documents:
+            self._set_schedule(document, schedule)
 
         return {
             "documents": documents,
@@ -114,15 +462,9 @@ class DocumentService:
             return False
 
         # 取消正在进行的文档处理任务
-        if document_id in processing_tasks:
-            task = processing_tasks.pop(document_id)
-            if not task.done():
-                task.cancel()
-                try:
-                    await task  # 等待任务取消完成
-                except asyncio.CancelledError:
-                    logger.warning(f"文档 {document_id} 的处理任务已取消。")
+        await ingest_queue.cancel(document_id)
 
+        # 对应的 ingest_jobs 记录随文档级联删除
         await self.db.execute("DELETE FROM documents WHERE id = ?", (document_id,))
 
         # 删除文件
@@ -135,9 +477,144 @@ class DocumentService:
             vector_db.remove(doc_id=document_id)
         except Exception as e:
             logger.error(f"删除向量数据库中的文档块失败: {e}")
+            # 记录下来，由索引维护命令（见 `index_maintenance`）稍后重试
+            await self.db.execute(
+                "INSERT OR IGNORE INTO vector_cleanups (document_id) VALUES (?)",
+                (document_id,),
+            )
+
+        await self._release_text_cache(document["content_hash"])
 
         return True
 
+    async def replace_document_file(
+        self,
+        document_id: str,
+        file: UploadFile,
+        type: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        替换已有文档的文件，并增量地重新处理。
+
+        重新处理时只向量化内容发生变化的文档块，并删除已不存在的文档块，
+        文档 ID 与其他属性保持不变。
+        """
+        if not file.filename:
+            raise ValueError("文件名不能为空")
+
+        document = await self.get_document(document_id)
+        if not document:
+            return None
+        await ingest_queue.check_capacity(self.db)
+
+        # 先写入临时文件，在新文件完整保存后再替换原文件
+        file_path = os.path.join(settings.UPLOAD_DIR, document_id)
+        new_path = file_path + ".new"
+        size, content_hash = await save_upload_file(
+            file, new_path, max_size=settings.MAX_UPLOAD_SIZE
+        )
+        if size == 0:
+            os.remove(new_path)
+            raise ValueError("文件大小为0")
+
+        if (
+            content_hash == document["content_hash"]
+            and document["status"] == "completed"
+        ):
+            os.remove(new_path)
+            logger.info(f"文档 {document_id} 的新文件内容未变化，无需重新处理")
+            return document
+
+        # 停止正在进行的处理，避免其读取到被替换的文件
+        await ingest_queue.cancel(document_id)
+        os.replace(new_path, file_path)
+
+        type = type or self.file_type_from_name(file.filename)
+        await self.db.execute(
+            """
+            UPDATE documents
+            SET filename = ?, type = ?, size = ?, content_hash = ?,
+                status = ?, progress = ?, message = ?
+            WHERE id = ?
+            """,
+            (
+                file.filename,
+                type,
+                size,
+                content_hash,
+                "processing",
+                0,
+                "文件已替换，等待重新处理",
+                document_id,
+            ),
+        )
+        await self._release_text_cache(document["content_hash"])
+        await self._enqueue(
+            document_id, file_path, type, content_hash, document["profile"]
+        )
+        return await self.get_document(document_id)
+
+    async def reindex_document(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """
+        重新处理文档，例如修改分块参数或更换 embedding 模型之后。
+
+        存在提取结果缓存时无需重新解析文件；文档已在排队或处理中时不做任何操作。
+        """
+        document = await self.get_document(document_id)
+        if not document:
+            return None
+        if document["queue_position"] is not None or document_id in ingest_queue.running:
+            return document
+
+        await self._requeue(document)
+        return await self.get_document(document_id)
+
+    async def reindex_documents(self, stale_only: bool = True) -> list[str]:
+        """
+        重新处理知识库中的文档。
+
+        Args:
+            stale_only: 只处理失败的文档，以及由不同的提取、分块或 embedding 配置
+                        生成的文档；为 False 时处理所有文档。
+
+        Returns:
+            加入处理队列的文档 ID
+        """
+        query = [
+            """
+            SELECT * FROM documents
+            WHERE id NOT IN (
+                SELECT document_id FROM ingest_jobs WHERE status IN ('queued', 'running')
+            )
+            """
+        ]
+        params = []
+        if stale_only:
+            query.append(
+                "AND (status = 'failed' OR ingest_signature IS NULL OR ingest_signature != ?)"
+            )
+            params.append(ingest_signature())
+        cursor = await self.db.execute(" ".join(query), params)
+        documents = [dict(row) for row in await cursor.fetchall()]
+
+        for document in documents:
+            await self._requeue(document)
+        logger.info(f"已将 {len(documents)} 个文档加入重新处理队列")
+        return [document["id"] for document in documents]
+
+    async def _requeue(self, document: Dict[str, Any]):
+        await self.db.execute(
+            "UPDATE documents SET status = ?, progress = ?, message = ? WHERE id = ?",
+            ("processing", 0, "等待重新处理", document["id"]),
+        )
+        await self._enqueue(
+            document["id"],
+            os.path.join(settings.UPLOAD_DIR, document["id"]),
+            document["type"],
+            document["content_hash"],
+            document["profile"],
+        )
+
     async def update_document(
         self,
         document_id: str,
@@ -173,64 +650,185 @@ class DocumentService:
         await self.db.execute(sql, params)
         return await self.get_document(document_id)
 
+    async def _reuse_duplicate(
+        self, db, document: Dict[str, Any], signature: str
+    ) -> bool:
+        """
+        若已存在内容哈希、提取配置档与处理签名都相同的已完成文档，则直接复制其文本块与向量。
+
+        Returns:
+            是否复用成功
+        """
+        document_id = document["id"]
+        if not document.get("content_hash"):
+            return False
+
+        cursor = await db.execute(
+            """
+            SELECT id FROM documents
+            WHERE content_hash = ? AND profile = ? AND ingest_signature = ?
+                AND status = 'completed' AND id != ?
+            ORDER BY created_at
+            LIMIT 1
+            """,
+            (document["content_hash"], document["profile"], signature, document_id),
+        )
+        row = await cursor.fetchone()
+        if not row:
+            return False
+
+        source_id = row["id"]
+        # 清除文档原有（例如替换文件前，或上次中断时）的文档块
+        await asyncio.to_thread(vector_db.remove, doc_id=document_id)
+        copied = await vector_db.copy(source_id, document_id)
+        if copied == 0:
+            # 源文档的向量已丢失，回退到完整处理流程
+            logger.warning(f"文档 {source_id} 没有可复用的文档块，重新处理 {document_id}")
+            return False
+
+        await db.execute(
+            """
+            UPDATE documents
+            SET status = ?, chunk_size = ?, ingest_signature = ?, progress = ?, message = ?
+            WHERE id = ?
+            """,
+            (
+                "completed",
+                copied,
+                signature,
+                100,
+                f"内容与文档 {source_id} 相同，已复用其处理结果",
+                document_id,
+            ),
+        )
+        await db.commit()
+        logger.info(f"文档 {document_id} 复用了文档 {source_id} 的 {copied} 个文档块")
+        return True
+
     async def process_document(self, document: Dict[str, Any]):
-        """处理文档并在数据库中更新进度"""
+        """
+        处理文档并在数据库中更新进度。
+
+        处理失败时异常会向上抛出，由处理队列负责重试或标记失败。
+        """
         document_id = document["id"]
-        db = None  # 初始化 db 为 None
+        # 在后台任务中获取独立的数据库连接
+        db = await get_standalone_db()
         try:
-            # 在后台任务中获取独立的数据库连接
-            db = await get_standalone_db()
+            signature = ingest_signature()
+            # 登记时已尝试复用；排队期间内容相同的文档可能已处理完成
+            if await self._reuse_duplicate(db, document, signature):
+                return
 
-            # 模拟文档处理过程
             logger.info(f"开始处理文档: {document_id}, type: {document['type']}")
-            text = await asyncio.to_thread(
-                process_file_to_text,
+            profile = get_profile(document["profile"])
+            # 处理前的先验估计，与实际耗时一起记录，用于校准之后的估计
+            estimate = await estimate_ingest(
+                db,
                 os.path.join(settings.UPLOAD_DIR, document_id),
                 document["type"],
+                profile,
+                cached=has_cached_pages(document.get("content_hash"), profile),
             )
+            started_at = time.monotonic()
+            extracted_at = None
+            async with DocumentProgress(db, document_id) as progress:
+
+                async def on_extracted():
+                    nonlocal extracted_at
+                    extracted_at = time.monotonic()
+                    progress.report("extract", 1, 1)
+                    # 更新文档状态为 'embedding'
+                    await db.execute(
+                        "UPDATE documents SET status = ? WHERE id = ?",
+                        ("embedding", document_id),
+                    )
+                    await db.commit()  # 提交事务
+                    logger.info(f"文档 {document_id} 文本提取完成，正在等待向量化完成...")
+
+                # 已有文档块由不同的分块或 embedding 配置生成时无法复用
+                if document.get("ingest_signature") not in (None, signature):
+                    await asyncio.to_thread(vector_db.remove, doc_id=document_id)
+
+                # 提取、分块与向量化以流水线方式并行进行
+                chunk_count = await run_ingest_pipeline(
+                    document_id,
+                    self._iter_document_pages(document, progress.report),
+                    max_chunk_size=CHUNK_MAX_SIZE,
+                    overlap_size=CHUNK_OVERLAP_SIZE,
+                    progress=progress.report,
+                    on_extracted=on_extracted,
+                )
 
-            # 更新文档状态为 'embedding'
-            await db.execute(
-                "UPDATE documents SET status = ? WHERE id = ?",
-                ("embedding", document_id),
-            )
-            await db.commit()  # 提交事务
-
-            logger.info(f"文档 {document_id} 处理中，正在向向量数据库添加文档块...")
-            chunked = chunk_text(text, max_chunk_size=700, overlap_size=50)
-
-            await vector_db.add(texts=chunked, doc_id=document_id)
-
-            logger.info(f"文档 {document_id} 处理完成，chunked_size: {len(chunked)}")
+            logger.info(f"文档 {document_id} 处理完成，chunked_size: {chunk_count}")
+            if extracted_at is not None:
+                durations = {
+                    "extract": extracted_at - started_at,
+                    "embed": time.monotonic() - extracted_at,
+                }
+                for stage, seconds in durations.items():
+                    # 使用缓存时提取阶段的先验耗时为 0，不参与校准
+                    if estimate.priors[stage] > 0:
+                        await record_ingest_timing(
+                            db,
+                            document_id,
+                            document["type"],
+                            profile.name,
+                            stage,
+                            estimate.priors[stage],
+                            seconds,
+                        )
 
             # 更新文档状态为 'completed'
             await db.execute(
-                "UPDATE documents SET status = ?, chunk_size = ? WHERE id = ?",
-                ("completed", len(chunked), document_id),
+                """
+                UPDATE documents
+                SET status = ?, chunk_size = ?, ingest_signature = ?, progress = ?,
+                    message = NULL
+                WHERE id = ?
+                """,
+                ("completed", chunk_count, signature, 100, document_id),
             )
             await db.commit()  # 提交事务
 
             logger.info(f"文档 {document_id} 处理完成。")
-        except asyncio.CancelledError:
-            logger.warning(f"文档 {document_id} 的处理任务被取消。")
-            if db:
-                await db.execute(
-                    "UPDATE documents SET status = ? WHERE id = ?",
-                    ("cancelled", document_id),
-                )
-                await db.commit()  # 提交事务
-        except Exception as e:
-            # 如果处理失败，更新文档状态为 'failed'
-            logger.error(f"文档 {document_id} 处理失败: {e}")
-            if db:
-                await db.execute(
-                    "UPDATE documents SET status = ? WHERE id = ?",
-                    ("failed", document_id),
-                )
-                await db.commit()  # 提交事务
         finally:
-            # 无论成功、失败还是取消，都从全局字典中移除任务
-            if document_id in processing_tasks:
-                del processing_tasks[document_id]
-            if db:
-                await db.close()  # 关闭连接
+            await db.close()  # 关闭连接
+
+    def _iter_document_pages(
+        self, document: Dict[str, Any], progress: ProgressCallback
+    ) -> AsyncIterator[Page]:
+        """逐页产出文档内容：优先读取提取结果缓存，否则提取并写入缓存"""
+        content_hash = document.get("content_hash")
+        profile = get_profile(document["profile"])
+        if has_cached_pages(content_hash, profile):
+            logger.info(f"文档 {document['id']} 使用缓存的提取结果")
+            return iter_cached_pages(content_hash, profile)  # type: ignore
+
+        pages = extraction_pool.iter_pages(
+            os.path.join(settings.UPLOAD_DIR, document["id"]),
+            document["type"],
+            progress,
+            profile,
+        )
+        if not content_hash:
+            return pages
+        return cache_pages(content_hash, profile, pages)
+
+
+async def run_ingest_job(document_id: str):
+    """处理队列的任务入口：读取文档记录并处理"""
+    db = await get_standalone_db()
+    try:
+        document = await DocumentService(db).get_document(document_id)
+    finally:
+        await db.close()
+
+    if document is None:
+        logger.warning(f"文档 {document_id} 不存在，跳过处理")
+        return
+    await DocumentService(None).process_document(document)
+
+
+# 全局文档处理队列
+ingest_queue = IngestQueue(run_ingest_job)
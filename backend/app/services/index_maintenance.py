@@ -0,0 +1,366 @@
+"""
+知识库索引维护：核对并修复三处存储之间的不一致。
+
+文档记录（SQLite 的 documents 表）、上传目录中的文件与 Chroma 中的文档块会因为删除失败
+（`vector_db.remove` 出错时只记录日志）、被取消的处理任务或进程崩溃而不一致。
+
+核对默认是增量的：文档块数量只对上次核对后有更新的已完成文档逐个统计，一致的文档记录在
+index_checks 表中；没有文档记录的文档块只检查删除失败时记录在 vector_cleanups 表中的文档。
+完整核对（full）扫描整个 Chroma 集合，能发现崩溃等原因留下的其他孤立文档块。
+上传目录与处理队列的检查开销很小，每次都会完整进行。
+"""
+
+import asyncio
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import aiosqlite
+from loguru import logger
+
+from ..config import settings
+from ..database import get_standalone_db, init_db
+from ..embedding import vector_db
+from ..embedding.extract_profile import get_profile
+from ..embedding.text_cache import cache_dir, cache_path, has_cached_pages
+from .bulk_ingest import AdvanceCallback, BulkIngestReport, process_documents
+from .document_service import DocumentService
+
+# 不属于任何文档的文件超过该时间（秒）未修改才视为残留，
+# 避免删除后端服务正在写入、尚未登记为文档的上传文件
+ORPHAN_GRACE_SECONDS = 3600
+
+
+@dataclass
+class IndexReport:
+    """索引核对结果"""
+
+    checked: int = 0  # 统计了文档块数量的文档数
+    skipped: int = 0  # 上次核对后没有更新而跳过的文档数
+    # 文档块数量与记录不一致的已完成文档：文档 ID → (记录的数量, 实际的数量)
+    mismatched: dict[str, tuple[int, int]] = field(default_factory=dict)
+    # 状态为处理中，但没有排队或正在运行的任务的文档（例如任务被取消、进程崩溃）
+    stalled: list[str] = field(default_factory=list)
+    # 上传文件已丢失的已完成文档
+    missing_files: list[str] = field(default_factory=list)
+    # 没有文档记录的文档块：文档 ID → 数量
+    orphan_vectors: dict[str, int] = field(default_factory=dict)
+    # 删除失败的记录（vector_cleanups 表）中的文档 ID
+    cleanups: list[str] = field(default_factory=list)
+    # 上传目录中不属于任何文档的文件、残留的临时文件与失效的提取结果缓存
+    orphan_files: list[Path] = field(default_factory=list)
+
+    @property
+    def consistent(self) -> bool:
+        return not (
+            self.mismatched
+            or self.stalled
+            or self.missing_files
+            or self.orphan_vectors
+            or self.orphan_files
+        )
+
+
+def find_orphan_files(
+    documents: dict[str, dict[str, Any]], now: Optional[float] = None
+) -> list[Path]:
+    """
+    上传目录中不属于任何文档的文件（包括残留的 .part、.new 与估计耗时时的临时文件），
+    以及没有文档引用、或由旧提取签名生成的提取结果缓存。
+    """
+    now = time.time() if now is None else now
+    valid_caches = {
+        cache_path(document["content_hash"], get_profile(document["profile"])).name
+        for document in documents.values()
+        if document["content_hash"]
+    }
+    orphans = []
+    for directory, valid in (
+        (Path(settings.UPLOAD_DIR), documents.keys()),
+        (cache_dir(), valid_caches),
+    ):
+        if not directory.is_dir():
+            continue
+        for entry in os.scandir(directory):
+            if entry.is_dir() or entry.name in valid:
+                continue
+            if now - entry.stat().st_mtime < ORPHAN_GRACE_SECONDS:
+                continue
+            orphans.append(Path(entry.path))
+    return sorted(orphans)
+
+
+async def verify_index(db: aiosqlite.Connection, full: bool = False) -> IndexReport:
+    """
+    核对文档记录、上传文件与文档块，只报告问题，不做修改。
+    文档块数量一致的文档会被记录，之后的增量核对在其更新前跳过它。
+    """
+    report = IndexReport()
+    cursor = await db.execute(
+        """
+        SELECT d.id, d.status, d.chunk_size, d.content_hash, d.profile, d.updated_at,
+            c.updated_at AS checked_updated_at
+        FROM documents d LEFT JOIN index_checks c ON c.document_id = d.id
+        """
+    )
+    documents = {row["id"]: dict(row) for row in await cursor.fetchall()}
+
+    cursor = await db.execute(
+        """
+        SELECT id FROM documents
+        WHERE status IN ('processing', 'embedding')
+            AND id NOT IN (
+                SELECT document_id FROM ingest_jobs WHERE status IN ('queued', 'running')
+            )
+        """
+    )
+    report.stalled = [row["id"] for row in await cursor.fetchall()]
+
+    cursor = await db.execute("SELECT document_id FROM vector_cleanups")
+    report.cleanups = [row["document_id"] for row in await cursor.fetchall()]
+
+    completed = [d for d in documents.values() if d["status"] == "completed"]
+    if full:
+        counts = await asyncio.to_thread(vector_db.count_chunks_by_document)
+        to_check = completed
+        orphan_candidates = [id for id in counts if id not in documents]
+    else:
+        to_check = [d for d in completed if d["checked_updated_at"] != d["updated_at"]]
+        counts = {}
+        for document in to_check:
+            counts[document["id"]] = await asyncio.to_thread(
+                vector_db.count_chunks, document["id"]
+            )
+        orphan_candidates = [id for id in report.cleanups if id not in documents]
+        for id in orphan_candidates:
+            counts[id] = await asyncio.to_thread(vector_db.count_chunks, id)
+    report.skipped = len(completed) - len(to_check)
+    report.orphan_vectors = {
+        id: counts[id] for id in orphan_candidates if counts.get(id)
+    }
+
+    consistent = []
+    for document in to_check:
+        report.checked += 1
+        id = document["id"]
+        expected, actual = document["chunk_size"] or 0, counts.get(id, 0)
+        ok = True
+        if actual != expected:
+            report.mismatched[id] = (expected, actual)
+            ok = False
+        if not os.path.exists(os.path.join(settings.UPLOAD_DIR, id)):
+            report.missing_files.append(id)
+            ok = False
+        if ok:
+            consistent.append((id, document["updated_at"]))
+    await db.executemany(
+        "INSERT OR REPLACE INTO index_checks (document_id, updated_at) VALUES (?, ?)",
+        consistent,
+    )
+    await db.commit()
+
+    report.orphan_files = await asyncio.to_thread(find_orphan_files, documents)
+    return report
+
+
+async def repair_index(db: aiosqlite.Connection, report: IndexReport) -> list[str]:
+    """
+    按核对结果修复：删除孤立的文档块与文件，并将文档块缺失或多余、以及卡在处理中的文档
+    重新加入处理队列。重新处理是增量的，优先读取提取结果缓存，只向量化缺失的文档块
+    并删除多余的文档块（见 `run_ingest_pipeline`）。
+    上传文件与提取结果缓存都已丢失的文档无法重新处理，会被标记为失败。
+
+    Returns:
+        加入处理队列的文档 ID
+    """
+    removed = set()
+    for doc_id, count in report.orphan_vectors.items():
+        try:
+            await asyncio.to_thread(vector_db.remove, doc_id=doc_id)
+        except Exception as e:
+            logger.error(f"删除文档 {doc_id} 的 {count} 个孤立文档块失败: {e}")
+            continue
+        removed.add(doc_id)
+        logger.info(f"已删除文档 {doc_id} 的 {count} 个孤立文档块")
+    # 删除失败的记录中，文档块已不存在或已删除的可以清除
+    await db.executemany(
+        "DELETE FROM vector_cleanups WHERE document_id = ?",
+        [
+            (id,)
+            for id in report.cleanups
+            if id in removed or id not in report.orphan_vectors
+        ],
+    )
+
+    for path in report.orphan_files:
+        try:
+            path.unlink(missing_ok=True)
+        except OSError as e:
+            logger.error(f"删除残留文件 {path} 失败: {e}")
+
+    service = DocumentService(db)
+    requeued = []
+    for document_id in [*report.mismatched, *report.stalled]:
+        cursor = await db.execute(
+            "SELECT content_hash, profile FROM documents WHERE id = ?", (document_id,)
+        )
+        row = await cursor.fetchone()
+        if row is None:
+            continue
+        if not os.path.exists(
+            os.path.join(settings.UPLOAD_DIR, document_id)
+        ) and not has_cached_pages(row["content_hash"], get_profile(row["profile"])):
+            await db.execute(
+                "UPDATE documents SET status = ?, message = ? WHERE id = ?",
+                ("failed", "上传文件与提取结果缓存均已丢失，无法重新处理", document_id),
+            )
+            continue
+        await service.reindex_document(document_id)
+        requeued.append(document_id)
+    await db.commit()
+    return requeued
+
+
+async def rebuild_documents(
+    db: aiosqlite.Connection, document_ids: Optional[list[str]] = None
+) -> list[str]:
+    """
+    删除文档的全部文档块并重新处理（提取结果缓存仍会被复用）。
+    默认处理所有已完成或失败的文档；已在排队或处理中的文档会被跳过。
+
+    Returns:
+        加入处理队列的文档 ID
+    """
+    cursor = await db.execute(
+        """
+        SELECT id, status FROM documents
+        WHERE id NOT IN (
+            SELECT document_id FROM ingest_jobs WHERE status IN ('queued', 'running')
+        )
+        """
+    )
+    candidates = {row["id"]: row["status"] for row in await cursor.fetchall()}
+    if document_ids is None:
+        document_ids = [
+            id for id, status in candidates.items() if status in ("completed", "failed")
+        ]
+    else:
+        document_ids = [id for id in document_ids if id in candidates]
+
+    service = DocumentService(db)
+    for document_id in document_ids:
+        await asyncio.to_thread(vector_db.remove, doc_id=document_id)
+        await service.reindex_document(document_id)
+    return document_ids
+
+
+@dataclass
+class CompactResult:
+    """向量数据库压缩结果"""
+
+    size_before: int  # 字节
+    size_after: int
+    removed_segments: list[str] = field(default_factory=list)
+
+
+def _directory_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def compact_vector_store(chroma_dir: Optional[Path] = None) -> CompactResult:
+    """
+    压缩 Chroma 的持久化目录：删除不属于任何段（segment）的向量索引目录
+    （删除集合或进程崩溃后的残留），并对 Chroma 的 SQLite 数据库执行 VACUUM，
+    回收删除文档块后留下的空闲页。
+
+    注意：执行期间不能有其他进程写入 Chroma。
+    """
+    chroma_dir = Path(chroma_dir or settings.CHROMA_DIRECTORY)
+    size_before = _directory_size(chroma_dir)
+    removed = []
+    with sqlite3.connect(chroma_dir / "chroma.sqlite3") as conn:
+        segments = {row[0] for row in conn.execute("SELECT id FROM segments")}
+        for entry in os.scandir(chroma_dir):
+            if not entry.is_dir() or entry.name in segments:
+                continue
+            try:
+                uuid.UUID(entry.name)
+            except ValueError:
+                # 只处理以段 ID 命名的目录
+                continue
+            shutil.rmtree(entry.path)
+            removed.append(entry.name)
+            logger.info(f"已删除不属于任何段的向量索引目录 {entry.name}")
+        conn.execute("VACUUM")
+    return CompactResult(size_before, _directory_size(chroma_dir), removed)
+
+
+async def check_index(
+    full: bool = False,
+    repair: bool = False,
+    process: bool = True,
+    workers: Optional[int] = None,
+    on_processing: Optional[Callable[[int], AdvanceCallback]] = None,
+) -> tuple[IndexReport, list[str], Optional[BulkIngestReport]]:
+    """
+    核对索引，可选地修复，并在当前进程中处理重新加入队列的文档。
+
+    Args:
+        full: 完整核对，见模块说明。
+        repair: 是否修复，见 `repair_index`。
+        process: 修复后是否在当前进程中处理重新加入队列的文档；为 False 时只加入队列，
+                 由运行中的后端服务处理。
+        workers: 同时处理的文档数量。
+        on_processing: 开始处理时以文档数量调用，返回处理进度的回调。
+
+    Returns:
+        (核对结果, 重新加入队列的文档 ID, 处理结果)
+    """
+    await init_db()
+    db = await get_standalone_db()
+    try:
+        report = await verify_index(db, full)
+        requeued = await repair_index(db, report) if repair else []
+        processed = await _process(db, requeued, process, workers, on_processing)
+    finally:
+        await db.close()
+    return report, requeued, processed
+
+
+async def rebuild_index(
+    document_ids: Optional[list[str]] = None,
+    process: bool = True,
+    workers: Optional[int] = None,
+    on_processing: Optional[Callable[[int], AdvanceCallback]] = None,
+) -> tuple[list[str], Optional[BulkIngestReport]]:
+    """重建文档的文档块（见 `rebuild_documents`），参数同 `check_index`"""
+    await init_db()
+    db = await get_standalone_db()
+    try:
+        requeued = await rebuild_documents(db, document_ids)
+        processed = await _process(db, requeued, process, workers, on_processing)
+    finally:
+        await db.close()
+    return requeued, processed
+
+
+async def _process(
+    db: aiosqlite.Connection,
+    document_ids: list[str],
+    process: bool,
+    workers: Optional[int],
+    on_processing: Optional[Callable[[int], AdvanceCallback]],
+) -> Optional[BulkIngestReport]:
+    if not document_ids or not process:
+        return None
+    started_at = time.monotonic()
+    processed = BulkIngestReport(files=len(document_ids), queued=len(document_ids))
+    advance = on_processing(len(document_ids)) if on_processing else None
+    await process_documents(db, document_ids, processed, workers, advance)
+    processed.elapsed = time.monotonic() - started_at
+    return processed
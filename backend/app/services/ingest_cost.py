@@ -0,0 +1,226 @@
+"""
+文档处理耗时的估计。
+
+先低成本地检查文件得到少量特征（PDF 的页数与抽样得到的扫描页比例、pptx 的幻灯片数、
+docx 的段落数、文件大小），按各阶段的先验单价得到先验耗时，再乘以由历史处理耗时
+（`ingest_timings` 表）得到的校准系数。处理队列按估计耗时调度，上传前也可以
+通过估计接口预估批量导入需要的时间。
+"""
+
+import asyncio
+import os
+import re
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import aiosqlite
+from loguru import logger
+
+from ..config import settings
+from ..embedding.extract_profile import ACCURATE, ExtractionProfile
+from ..utils.pdf import classify_pdf
+
+# 处理阶段：提取文本（含 OCR）；提取完成后等待向量化完成
+# 两个阶段以流水线方式重叠进行，embed 只计提取完成之后的部分
+STAGES = ("extract", "embed")
+
+# 各阶段的先验单价（秒），没有历史记录时使用，之后按实际耗时校准
+# 文字页只需解析文本层，扫描页需要渲染、版面检测与 OCR（按 accurate 配置档的分辨率）
+PDF_TEXT_PAGE_COST = 0.2
+PDF_SCANNED_PAGE_COST = 3.0
+PPTX_SLIDE_COST = 0.05
+DOCX_PARAGRAPH_COST = 0.002
+# 无法计数的格式（doc、ppt）与纯文本按文件大小估计，单位：秒 / MB
+OFFICE_COST_PER_MB = 1.0
+TEXT_COST_PER_MB = 0.2
+# 向量化：每页（幻灯片、段落）或每 MB
+EMBED_PAGE_COST = 0.3
+EMBED_SLIDE_COST = 0.1
+EMBED_PARAGRAPH_COST = 0.01
+EMBED_COST_PER_MB = 20.0
+# 所有任务共有的固定开销（读取文档记录、写入数据库等）
+BASE_COST = 1.0
+
+_DOCX_PARAGRAPH = re.compile(rb"<w:p[ >]")
+_PPTX_SLIDE = re.compile(r"ppt/slides/slide\d+\.xml")
+
+
+@dataclass
+class IngestFeatures:
+    """估计处理耗时所用的文件特征"""
+
+    size_mb: float
+    # PDF 页数、pptx 幻灯片数或 docx 段落数（含表格中的段落）；无法计数时为 0
+    pages: int = 0
+    # 估计的扫描页数（PDF 按抽样比例推算）
+    scanned_pages: float = 0
+
+
+@dataclass
+class IngestEstimate:
+    """文档处理耗时的估计"""
+
+    features: IngestFeatures
+    # 各阶段未校准的先验耗时（秒）
+    priors: dict[str, float]
+    # 各阶段校准后的估计耗时（秒）
+    stages: dict[str, float]
+
+    @property
+    def total(self) -> float:
+        return BASE_COST + sum(self.stages.values())
+
+
+def inspect_ingest_file(file_path: str | Path, file_type: str) -> IngestFeatures:
+    """
+    低成本地检查文件：PDF 只抽样检查 PDF_CLASSIFY_SAMPLE_PAGES 页（见 `classify_pdf`），
+    docx、pptx 只读取压缩包的目录与正文 XML，不做完整解析。
+
+    注意：需要读取文件，应在线程中调用。
+    """
+    try:
+        size_mb = os.path.getsize(file_path) / (1024 * 1024)
+    except OSError:
+        return IngestFeatures(size_mb=0)
+
+    try:
+        if file_type == "pdf":
+            # 矢量图形页在提取时直接使用文本层，估计耗时时无需与空白页区分
+            classification = classify_pdf(
+                file_path,
+                sample_pages=settings.PDF_CLASSIFY_SAMPLE_PAGES,
+                check_drawings=False,
+            )
+            text_ratio = classification.text_ratio
+            if text_ratio is None:
+                # 抽样的页面全部为空白页时按文字页估计
+                text_ratio = 1.0
+            page_count = classification.page_count
+            logger.debug(
+                f"PDF {file_path} 共 {page_count} 页，抽样 {len(classification.pages)} 页，"
+                f"文字页比例 {text_ratio:.0%}"
+            )
+            return IngestFeatures(
+                size_mb=size_mb,
+                pages=page_count,
+                scanned_pages=page_count * (1 - text_ratio),
+            )
+        if file_type == "pptx":
+            with zipfile.ZipFile(file_path) as zf:
+                slides = sum(1 for name in zf.namelist() if _PPTX_SLIDE.fullmatch(name))
+            return IngestFeatures(size_mb=size_mb, pages=slides)
+        if file_type == "docx":
+            with zipfile.ZipFile(file_path) as zf:
+                body = zf.read("word/document.xml")
+            return IngestFeatures(size_mb=size_mb, pages=len(_DOCX_PARAGRAPH.findall(body)))
+    except Exception as e:
+        # 无法解析的文件很快会处理失败，不必排在后面
+        logger.warning(f"无法检查文件 {file_path}: {e}")
+    return IngestFeatures(size_mb=size_mb)
+
+
+def prior_stage_costs(
+    features: IngestFeatures, file_type: str, profile: ExtractionProfile = ACCURATE
+) -> dict[str, float]:
+    """按先验单价估计各阶段的耗时（秒），扫描页的代价与渲染分辨率的平方（像素数）成正比"""
+    if file_type == "pdf":
+        text_pages = features.pages - features.scanned_pages
+        scanned_page_cost = PDF_SCANNED_PAGE_COST * (profile.dpi / ACCURATE.dpi) ** 2
+        extract = (
+            text_pages * PDF_TEXT_PAGE_COST
+            + features.scanned_pages * scanned_page_cost
+        )
+        embed = features.pages * EMBED_PAGE_COST
+    elif file_type == "pptx" and features.pages:
+        extract = features.pages * PPTX_SLIDE_COST
+        embed = features.pages * EMBED_SLIDE_COST
+    elif file_type == "docx" and features.pages:
+        extract = features.pages * DOCX_PARAGRAPH_COST
+        embed = features.pages * EMBED_PARAGRAPH_COST
+    elif file_type in ["docx", "doc", "pptx", "ppt"]:
+        extract = features.size_mb * OFFICE_COST_PER_MB
+        embed = features.size_mb * EMBED_COST_PER_MB
+    else:
+        extract = features.size_mb * TEXT_COST_PER_MB
+        embed = features.size_mb * EMBED_COST_PER_MB
+    return {"extract": extract, "embed": embed}
+
+
+async def calibration_factors(
+    db: aiosqlite.Connection,
+) -> dict[tuple[str, str, str], float]:
+    """
+    各（文档类型, 配置档, 阶段）的校准系数：最近 INGEST_CALIBRATION_SAMPLES 次处理的
+    实际耗时之和与先验耗时之和的比值。没有历史记录的组合不在结果中，按 1 处理。
+    """
+    cursor = await db.execute(
+        """
+        SELECT type, profile, stage, SUM(seconds), SUM(prior) FROM (
+            SELECT *, ROW_NUMBER() OVER (
+                PARTITION BY type, profile, stage ORDER BY id DESC
+            ) AS n
+            FROM ingest_timings
+        )
+        WHERE n <= ?
+        GROUP BY type, profile, stage
+        HAVING SUM(prior) > 0
+        """,
+        (settings.INGEST_CALIBRATION_SAMPLES,),
+    )
+    return {
+        (type, profile, stage): seconds / prior
+        for type, profile, stage, seconds, prior in await cursor.fetchall()
+    }
+
+
+async def estimate_ingest(
+    db: aiosqlite.Connection,
+    file_path: str | Path,
+    file_type: str,
+    profile: ExtractionProfile = ACCURATE,
+    cached: bool = False,
+    features: Optional[IngestFeatures] = None,
+) -> IngestEstimate:
+    """
+    估计文档各阶段的处理耗时。
+
+    Args:
+        db: 数据库连接，用于读取校准系数。
+        file_path: 文件路径。
+        file_type: 文档类型。
+        profile: 提取配置档。
+        cached: 是否已有提取结果缓存，此时提取阶段几乎不耗时。
+        features: 已检查得到的文件特征，默认检查文件（见 `inspect_ingest_file`）。
+    """
+    if features is None:
+        features = await asyncio.to_thread(inspect_ingest_file, file_path, file_type)
+    priors = prior_stage_costs(features, file_type, profile)
+    if cached:
+        priors["extract"] = 0
+    factors = await calibration_factors(db)
+    stages = {
+        stage: prior * factors.get((file_type, profile.name, stage), 1.0)
+        for stage, prior in priors.items()
+    }
+    return IngestEstimate(features=features, priors=priors, stages=stages)
+
+
+async def record_ingest_timing(
+    db: aiosqlite.Connection,
+    document_id: str,
+    file_type: str,
+    profile: str,
+    stage: str,
+    prior: float,
+    seconds: float,
+) -> None:
+    """记录一次处理中某阶段的实际耗时，用于校准之后的估计"""
+    await db.execute(
+        """
+        INSERT INTO ingest_timings (document_id, type, profile, stage, prior, seconds)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (document_id, file_type, profile, stage, prior, seconds),
+    )
@@ -0,0 +1,164 @@
+import asyncio
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from loguru import logger
+
+from ..config import settings
+from ..embedding import vector_db
+from ..embedding.chunk import chunk_hash, chunk_text, locate_chunks
+from ..embedding.document_ir import Page
+from ..utils.progress import ProgressCallback
+
+# 所有页面提取完成时的回调
+ExtractedCallback = Callable[[], Awaitable[None]]
+
+# 文档块元数据中记录位置的字段
+ANCHOR_KEYS = ("page", "start", "end")
+
+# 文档块的位置：page、start、end
+Anchor = dict[str, int]
+
+
+async def run_ingest_pipeline(
+    document_id: str,
+    pages: AsyncIterator[Page],
+    max_chunk_size: int,
+    overlap_size: int,
+    progress: Optional[ProgressCallback] = None,
+    on_extracted: Optional[ExtractedCallback] = None,
+) -> int:
+    """
+    以流水线方式处理文档：提取 → 分块 → 向量化。
+
+    分块阶段逐页消费提取结果，向量化阶段按 EMBEDDING_BATCH_SIZE 批量写入，
+    阶段之间以容量为 PIPELINE_QUEUE_SIZE 的队列连接。前面页面的文档块在后续页面
+    仍在 OCR 时即可被检索，总耗时约等于最慢的阶段。
+
+    向量化是增量的：按内容哈希与文档已有的文档块比对，只向量化新增的文档块，
+    并在最后删除已不存在的文档块。因此替换文件后的重新处理，或中断后的重试，
+    都只需处理变化的部分。
+
+    每个文档块记录所在页与在页面文本中的起止偏移（见 `document_ir.Page`），
+    用于引用与预览；内容未变化但位置变化的文档块只更新元数据。
+
+    Args:
+        document_id: 文档 ID。
+        pages: 逐页产出页面的异步迭代器。
+        max_chunk_size: 分块最大长度。
+        overlap_size: 分块重叠长度。
+        progress: 可选的进度回调。
+        on_extracted: 所有页面提取完成时调用。
+
+    Returns:
+        文档块数量
+    """
+    chunk_queue: asyncio.Queue[Optional[list[tuple[str, Anchor]]]] = asyncio.Queue(
+        maxsize=settings.PIPELINE_QUEUE_SIZE
+    )
+    produced = 0
+    extracted = False
+
+    async def chunk_stage():
+        nonlocal produced, extracted
+        async with aclosing(pages):
+            async for page in pages:
+                chunks = chunk_text(
+                    page.text, max_chunk_size=max_chunk_size, overlap_size=overlap_size
+                )
+                if chunks:
+                    spans = locate_chunks(page.text, chunks)
+                    produced += len(chunks)
+                    await chunk_queue.put(
+                        [
+                            (chunk, {"page": page.number, "start": start, "end": end})
+                            for chunk, (start, end) in zip(chunks, spans)
+                        ]
+                    )
+        extracted = True
+        if progress:
+            progress("chunk", produced, produced)
+        if on_extracted:
+            await on_extracted()
+        await chunk_queue.put(None)
+
+    # 文档已有的文档块：内容哈希 → 尚未被新内容认领的 ID 列表
+    existing_chunks = await asyncio.to_thread(vector_db.get_chunk_metadata, document_id)
+    existing: dict[str, list[str]] = {}
+    for id, metadata in existing_chunks.items():
+        existing.setdefault(metadata["chunk_hash"], []).append(id)
+    used_ids = set(existing_chunks)
+
+    def new_chunk_id(hash: str) -> str:
+        id = f"{document_id}_{hash[:16]}"
+        n = 1
+        while id in used_ids:
+            id = f"{document_id}_{hash[:16]}_{n}"
+            n += 1
+        used_ids.add(id)
+        return id
+
+    async def embed_stage() -> int:
+        batch_size = settings.EMBEDDING_BATCH_SIZE
+        buffer: list[tuple[str, str, Anchor]] = []
+        # 内容未变化但位置变化的文档块：ID → 新的元数据
+        moved: dict[str, dict] = {}
+        processed = 0
+        kept = 0
+        embedded = 0
+
+        async def flush(items: list[tuple[str, str, Anchor]]):
+            nonlocal embedded
+            await vector_db.add(
+                texts=[text for _, text, _ in items],
+                doc_id=document_id,
+                ids=[id for id, _, _ in items],
+                anchors=[anchor for _, _, anchor in items],
+            )
+            embedded += len(items)
+
+        def report():
+            # 提取完成前文档块总数未知，只在提取完成后报告向量化进度
+            if progress and extracted:
+                progress("embed", processed, produced)
+
+        while (chunks := await chunk_queue.get()) is not None:
+            for chunk, anchor in chunks:
+                hash = chunk_hash(chunk)
+                if existing.get(hash):
+                    # 内容未变化的文档块直接保留，无需重新向量化
+                    id = existing[hash].pop()
+                    metadata = existing_chunks[id]
+                    if any(metadata.get(key) != anchor[key] for key in ANCHOR_KEYS):
+                        moved[id] = {**metadata, **anchor}
+                    kept += 1
+                else:
+                    buffer.append((new_chunk_id(hash), chunk, anchor))
+            processed += len(chunks)
+            while len(buffer) >= batch_size:
+                await flush(buffer[:batch_size])
+                buffer = buffer[batch_size:]
+                report()
+        if buffer:
+            await flush(buffer)
+        if moved:
+            await asyncio.to_thread(
+                vector_db.update_metadata, list(moved), list(moved.values())
+            )
+
+        # 删除新内容中已不存在的文档块
+        stale = [id for ids in existing.values() for id in ids]
+        if stale:
+            await asyncio.to_thread(vector_db.delete_ids, stale)
+        if progress:
+            progress("embed", processed, produced)
+        logger.info(
+            f"文档 {document_id} 共 {processed} 个文档块：保留 {kept} 个，"
+            f"新增 {embedded} 个，删除 {len(stale)} 个"
+        )
+        return processed
+
+    async with asyncio.TaskGroup() as tg:
+        tg.create_task(chunk_stage())
+        embed_task = tg.create_task(embed_stage())
+    return embed_task.result()
@@ -0,0 +1,316 @@
+import asyncio
+import math
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+import aiosqlite
+from loguru import logger
+
+from ..config import settings
+from ..database import get_standalone_db
+from ..utils.admission import QueueFullError
+
+IngestHandler = Callable[[str], Awaitable[None]]
+
+# 任务的调度优先级，值越小越先执行：估计耗时减去按等待时间累积的老化补偿，
+# 使小任务排在大任务之前，同时大任务等待足够久后也终将被执行。
+# 两个参数依次为当前时间与 INGEST_AGING_RATE。
+PRIORITY_SQL = "cost - (? - enqueued_at) * ?"
+
+
+class IngestQueue:
+    """
+    基于 SQLite `ingest_jobs` 表的持久化文档处理队列。
+
+    - 固定数量的 worker 协程从表中领取任务，限制同时处理的文档数量；
+    - 按估计耗时调度，小文档不会被排在前面的大型扫描 PDF 阻塞，
+      等待时间带来的老化补偿保证大任务不会饿死；
+    - 失败的任务按指数退避重试，超过最大次数后将文档标记为 failed；
+    - 进程退出时处于 running 的任务会在下次启动时重新入队；
+    - 排队任务数达到 INGEST_MAX_QUEUED 时拒绝新的文档（见 `check_capacity`）。
+    """
+
+    def __init__(self, handler: IngestHandler):
+        self.handler = handler
+        self.workers: list[asyncio.Task] = []
+        # 正在处理的任务，键为文档 ID
+        self.running: Dict[str, asyncio.Task] = {}
+        self._wakeup = asyncio.Event()
+        self._claim_lock = asyncio.Lock()
+
+    async def enqueue(
+        self, db: aiosqlite.Connection, document_id: str, cost: float = 0
+    ) -> None:
+        """
+        将文档加入处理队列（已存在的任务会被重置为排队状态）
+
+        Args:
+            db: 数据库连接。
+            document_id: 文档 ID。
+            cost: 估计的处理耗时（秒），见 `estimate_ingest`。
+        """
+        await db.execute(
+            """
+            INSERT INTO ingest_jobs (
+                document_id, status, attempts, run_after, cost, enqueued_at
+            ) VALUES (?, 'queued', 0, 0, ?, ?)
+            ON CONFLICT (document_id) DO UPDATE SET
+                status = 'queued', attempts = 0, run_after = 0, last_error = NULL,
+                cost = excluded.cost, enqueued_at = excluded.enqueued_at
+            """,
+            (document_id, cost, time.time()),
+        )
+        await db.commit()
+        self._wakeup.set()
+
+    async def check_capacity(self, db: aiosqlite.Connection) -> None:
+        """
+        检查处理队列是否还能接纳新文档。
+
+        Raises:
+            QueueFullError: 排队中的任务数量已达上限。retry_after 按排队任务的
+                平均估计耗时与 worker 数量估算出一个名额空出的时间。
+        """
+        cursor = await db.execute(
+            "SELECT COUNT(*), AVG(cost) FROM ingest_jobs WHERE status = 'queued'"
+        )
+        queued, avg_cost = await cursor.fetchone()  # type: ignore
+        if queued < settings.INGEST_MAX_QUEUED:
+            return
+        retry_after = math.ceil((avg_cost or 0) / settings.INGEST_WORKERS)
+        raise QueueFullError(
+            f"文档处理队列已满（{queued} 个文档排队中），请稍后重试",
+            min(retry_after, settings.INGEST_MAX_RETRY_AFTER),
+        )
+
+    async def metrics(self, db: aiosqlite.Connection) -> dict:
+        """处理队列的统计信息"""
+        now = time.time()
+        cursor = await db.execute(
+            """
+            SELECT
+                COUNT(*) FILTER (WHERE status = 'queued'),
+                COUNT(*) FILTER (WHERE status = 'queued' AND run_after > ?),
+                COUNT(*) FILTER (WHERE status = 'failed'),
+                COALESCE(SUM(cost) FILTER (WHERE status = 'queued'), 0),
+                MIN(enqueued_at) FILTER (WHERE status = 'queued')
+            FROM ingest_jobs
+            """,
+            (now,),
+        )
+        queued, retrying, failed, queued_cost, oldest = await cursor.fetchone()  # type: ignore
+        return {
+            "running": len(self.running),
+            "queued": queued,
+            "retrying": retrying,
+            "failed": failed,
+            "workers": len(self.workers),
+            "max_queued": settings.INGEST_MAX_QUEUED,
+            # 排队任务的估计总耗时（秒）
+            "queued_cost": round(queued_cost, 1),
+            # 排队最久的任务已等待的时间（秒）
+            "oldest_wait": round(now - oldest, 1) if oldest else 0,
+        }
+
+    async def cancel(self, document_id: str) -> bool:
+        """取消正在处理的文档任务，返回是否存在该任务"""
+        task = self.running.get(document_id)
+        if task is None:
+            return False
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        logger.warning(f"文档 {document_id} 的处理任务已取消。")
+        return True
+
+    async def recover(self, db: aiosqlite.Connection) -> None:
+        """恢复上次运行中断的任务"""
+        cursor = await db.execute(
+            "UPDATE ingest_jobs SET status = 'queued', run_after = 0 WHERE status = 'running'"
+        )
+        recovered = cursor.rowcount
+        # 旧版本直接以后台任务处理、没有对应任务记录的文档
+        cursor = await db.execute(
+            """
+            INSERT INTO ingest_jobs (document_id, status, attempts, run_after, enqueued_at)
+            SELECT id, 'queued', 0, 0, ? FROM documents
+            WHERE status IN ('processing', 'embedding')
+                AND id NOT IN (SELECT document_id FROM ingest_jobs)
+            """,
+            (time.time(),),
+        )
+        recovered += cursor.rowcount
+        await db.commit()
+        if recovered:
+            logger.info(f"已恢复 {recovered} 个中断的文档处理任务")
+
+    async def start(self, workers: Optional[int] = None) -> None:
+        """恢复中断的任务并启动 worker"""
+        db = await get_standalone_db()
+        try:
+            await self.recover(db)
+        finally:
+            await db.close()
+
+        workers = workers or settings.INGEST_WORKERS
+        self.workers = [
+            asyncio.create_task(self._worker(i), name=f"ingest-worker-{i}")
+            for i in range(workers)
+        ]
+        logger.info(f"文档处理队列已启动，worker 数量: {workers}")
+
+    async def stop(self) -> None:
+        """停止所有 worker，未完成的任务保持 running 状态，下次启动时恢复"""
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers.clear()
+
+    async def schedule(self, db: aiosqlite.Connection) -> Dict[str, tuple[int, float]]:
+        """
+        排队中的文档在队列中的位置（从 1 开始）与预计处理完成前的时间（秒），键为文档 ID。
+
+        可立即执行的任务按调度优先级排序，处于重试退避中的任务排在其后。
+        预计时间假设前面的任务由各 worker 均分，即前面任务的估计耗时之和除以
+        worker 数量，再加上自身的估计耗时；不计正在处理的任务的剩余时间。
+        """
+        now = time.time()
+        cursor = await db.execute(
+            f"""
+            SELECT document_id, cost FROM ingest_jobs
+            WHERE status = 'queued'
+            ORDER BY run_after > ?, {PRIORITY_SQL}, id
+            """,
+            (now, now, settings.INGEST_AGING_RATE),
+        )
+        rows = await cursor.fetchall()
+        workers = max(1, settings.INGEST_WORKERS)
+        schedule = {}
+        ahead = 0.0
+        for i, row in enumerate(rows, 1):
+            cost = row["cost"] or 0
+            schedule[row["document_id"]] = (i, ahead / workers + cost)
+            ahead += cost
+        return schedule
+
+    async def _claim(self, db: aiosqlite.Connection) -> Optional[aiosqlite.Row]:
+        """领取优先级最高的可执行任务"""
+        async with self._claim_lock:
+            now = time.time()
+            cursor = await db.execute(
+                f"""
+                SELECT * FROM ingest_jobs
+                WHERE status = 'queued' AND run_after <= ?
+                ORDER BY {PRIORITY_SQL}, id
+                LIMIT 1
+                """,
+                (now, now, settings.INGEST_AGING_RATE),
+            )
+            job = await cursor.fetchone()
+            if job is None:
+                return None
+            await db.execute(
+                """
+                UPDATE ingest_jobs SET status = 'running', attempts = attempts + 1
+                WHERE id = ?
+                """,
+                (job["id"],),
+            )
+            await db.commit()
+            return job
+
+    async def _worker(self, index: int) -> None:
+        db = await get_standalone_db()
+        try:
+            while True:
+                job = await self._claim(db)
+                if job is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(
+                            self._wakeup.wait(), settings.INGEST_POLL_INTERVAL
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._run(db, job)
+        except asyncio.CancelledError:
+            logger.info(f"文档处理 worker {index} 已停止")
+            raise
+        finally:
+            await db.close()
+
+    async def _run(self, db: aiosqlite.Connection, job: aiosqlite.Row) -> None:
+        document_id = job["document_id"]
+        attempts = job["attempts"] + 1
+        task = asyncio.create_task(self.handler(document_id))
+        self.running[document_id] = task
+        try:
+            await task
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():  # type: ignore
+                # worker 自身被取消（服务关闭），任务保持 running 状态等待恢复
+                raise
+            # 文档被删除或替换文件等原因单独取消了该任务；
+            # 替换文件时任务会被重新排队，此时不应删除
+            await db.execute(
+                "DELETE FROM ingest_jobs WHERE id = ? AND status = 'running'",
+                (job["id"],),
+            )
+            await db.commit()
+            return
+        except Exception as e:
+            await self._on_failure(db, job, attempts, e)
+            return
+        finally:
+            self.running.pop(document_id, None)
+
+        await db.execute(
+            "UPDATE ingest_jobs SET status = 'done', last_error = NULL WHERE id = ?",
+            (job["id"],),
+        )
+        await db.commit()
+
+    async def _on_failure(
+        self,
+        db: aiosqlite.Connection,
+        job: aiosqlite.Row,
+        attempts: int,
+        error: Exception,
+    ) -> None:
+        """处理失败的任务：未达到最大次数时按指数退避重新排队"""
+        document_id = job["document_id"]
+        if attempts < settings.INGEST_MAX_ATTEMPTS:
+            delay = settings.INGEST_RETRY_BACKOFF * 2 ** (attempts - 1)
+            logger.warning(
+                f"文档 {document_id} 第 {attempts} 次处理失败: {error}，{delay} 秒后重试"
+            )
+            await db.execute(
+                """
+                UPDATE ingest_jobs SET status = 'queued', run_after = ?, last_error = ?
+                WHERE id = ?
+                """,
+                (time.time() + delay, str(error), job["id"]),
+            )
+            await db.execute(
+                "UPDATE documents SET status = ?, message = ? WHERE id = ?",
+                (
+                    "processing",
+                    f"第 {attempts} 次处理失败，{delay} 秒后重试: {error}",
+                    document_id,
+                ),
+            )
+        else:
+            logger.error(f"文档 {document_id} 处理失败: {error}")
+            await db.execute(
+                "UPDATE ingest_jobs SET status = 'failed', last_error = ? WHERE id = ?",
+                (str(error), job["id"]),
+            )
+            await db.execute(
+                "UPDATE documents SET status = ?, message = ? WHERE id = ?",
+                ("failed", str(error), document_id),
+            )
+        await db.commit()
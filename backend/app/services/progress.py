@@ -0,0 +1,88 @@
+import asyncio
+import threading
+from typing import Optional
+
+import aiosqlite
+from loguru import logger
+
+from ..config import settings
+
+# 各处理阶段在总进度中所占的区间 (起点, 终点, 描述)
+STAGES: dict[str, tuple[int, int, str]] = {
+    "extract": (0, 70, "文本提取"),
+    "render": (0, 35, "页面渲染与版面分析"),
+    "ocr": (35, 70, "文字识别"),
+    "chunk": (70, 75, "文本分块"),
+    "embed": (75, 99, "向量化"),
+}
+
+
+class DocumentProgress:
+    """
+    记录文档处理进度，并合并写入 documents.progress / message。
+
+    `report` 可在任意线程中高频调用，只更新内存中的最新状态；
+    后台协程每隔 interval 秒检查一次，仅在进度或信息变化时写入数据库，
+    避免处理较快的文档产生大量 UPDATE。
+    """
+
+    def __init__(
+        self,
+        db: aiosqlite.Connection,
+        document_id: str,
+        interval: Optional[float] = None,
+    ):
+        self.db = db
+        self.document_id = document_id
+        self.interval = (
+            settings.PROGRESS_WRITE_INTERVAL if interval is None else interval
+        )
+        self.progress = 0
+        self.message: Optional[str] = None
+        self._written: tuple[int, Optional[str]] = (0, None)
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def report(self, stage: str, done: int, total: int) -> None:
+        """记录某阶段的进度，满足 ProgressCallback 签名"""
+        start, end, label = STAGES[stage]
+        ratio = min(done / total, 1.0) if total > 0 else 1.0
+        with self._lock:
+            # 进度只增不减
+            self.progress = max(self.progress, start + int((end - start) * ratio))
+            self.message = f"{label} {done}/{total}" if total > 0 else label
+
+    async def flush(self) -> None:
+        """若状态有变化，则写入数据库"""
+        with self._lock:
+            state = (self.progress, self.message)
+        if state == self._written:
+            return
+        await self.db.execute(
+            "UPDATE documents SET progress = ?, message = ? WHERE id = ?",
+            (*state, self.document_id),
+        )
+        await self.db.commit()
+        self._written = state
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"写入文档 {self.document_id} 的处理进度失败: {e}")
+
+    async def __aenter__(self) -> "DocumentProgress":
+        self._task = asyncio.create_task(self._flush_loop())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if exc_type is None:
+            await self.flush()
@@ -0,0 +1,68 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+
+class QueueFullError(Exception):
+    """排队的任务数量已达上限，调用方应在 retry_after 秒后重试"""
+
+    def __init__(self, message: str, retry_after: int):
+        self.retry_after = max(1, int(retry_after))
+        super().__init__(message)
+
+
+class ConcurrencyLimiter:
+    """
+    限制同时执行的任务数量，并限制等待执行的任务数量。
+
+    - `admit()` 在创建任务时同步调用，排队已满时抛出 QueueFullError；
+    - 已接纳的任务在 `slot()` 中等待执行名额；
+    - 任务结束（包括尚未开始即被取消）时调用 `release()` 归还排队位置。
+    """
+
+    def __init__(
+        self, name: str, max_concurrent: int, max_queued: int, retry_after: int
+    ):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        # 已接纳但尚未结束的任务数量（含执行中的任务）
+        self.pending = 0
+        self.running = 0
+
+    @property
+    def waiting(self) -> int:
+        return self.pending - self.running
+
+    def admit(self) -> None:
+        """接纳一个新任务，排队已满时抛出 QueueFullError"""
+        if self.pending >= self.max_concurrent + self.max_queued:
+            raise QueueFullError(
+                f"{self.name}繁忙：{self.running} 个执行中，{self.waiting} 个排队中，请稍后重试",
+                self.retry_after,
+            )
+        self.pending += 1
+
+    def release(self) -> None:
+        """已接纳的任务结束"""
+        self.pending -= 1
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """等待并占用一个执行名额"""
+        async with self._semaphore:
+            self.running += 1
+            try:
+                yield
+            finally:
+                self.running -= 1
+
+    def metrics(self) -> dict[str, int]:
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+        }
@@ -1,20 +1,152 @@
+import math
+import random
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional
 
 import fitz  # PyMuPDF
 
 
-def is_text_pdf(pdf_path: Path | str, min_text_length: int = 50) -> bool:
+# 页面类型：有可用的文本层 / 只有图片、需要 OCR / 只有矢量图形 / 既无文字也无图形
+TEXT_PAGE = "text"
+SCANNED_PAGE = "scanned"
+GRAPHIC_PAGE = "graphic"
+BLANK_PAGE = "blank"
+
+# 提前结束抽样判断时使用的置信度对应的 z 值（99%）
+EARLY_EXIT_Z = 2.576
+# 提前结束前至少需要检查的非空白页数
+EARLY_EXIT_MIN_PAGES = 5
+
+
+def classify_page(
+    page: fitz.Page, min_text_length: int = 50, check_drawings: bool = True
+) -> str:
+    """
+    判断单个页面应如何提取文本。
+
+    包含显著文字的页面直接使用文本层；文字不足但包含图片的页面视为扫描页，需要 OCR。
+    开销很大的 get_drawings() 只在既没有文字也没有图片的页面上调用，用于区分矢量图形页
+    与空白页；check_drawings 为 False 时这类页面一律视为空白页。
+    """
+    text = page.get_text().strip()  # type: ignore
+    if len(text) >= min_text_length:
+        return TEXT_PAGE
+    # get_images(full=False) 更快，只检查是否存在图片对象
+    if page.get_images(full=False):
+        return SCANNED_PAGE
+    if check_drawings and page.get_drawings():
+        return GRAPHIC_PAGE
+    return BLANK_PAGE
+
+
+@dataclass
+class PdfClassification:
+    """PDF 分类结果"""
+
+    page_count: int
+    # 已检查页面的类型，键为页码（从0开始）；抽样或提前结束时只包含部分页面
+    pages: dict[int, str]
+    # 已检查的非空白页中文字页的比例，全部为空白页时为 None
+    text_ratio: Optional[float]
+
+    @property
+    def is_text(self) -> bool:
+        """非空白页中文字页比例超过 50% 时视为文字 PDF"""
+        return self.text_ratio is not None and self.text_ratio > 0.5
+
+    @property
+    def complete(self) -> bool:
+        """是否检查了所有页面"""
+        return len(self.pages) == self.page_count
+
+
+def _decided(text_pages: int, non_blank_pages: int, threshold: float = 0.5) -> bool:
+    """文字页比例的 Wilson 置信区间是否已完全位于阈值的一侧"""
+    if non_blank_pages < EARLY_EXIT_MIN_PAGES:
+        return False
+    n = non_blank_pages
+    p = text_pages / n
+    z2 = EARLY_EXIT_Z**2
+    center = (p + z2 / (2 * n)) / (1 + z2 / n)
+    margin = (EARLY_EXIT_Z / (1 + z2 / n)) * math.sqrt(
+        p * (1 - p) / n + z2 / (4 * n * n)
+    )
+    return center - margin > threshold or center + margin < threshold
+
+
+def classify_pdf(
+    pdf_path: Path | str,
+    min_text_length: int = 50,
+    sample_pages: Optional[int] = None,
+    early_exit: bool = True,
+    check_drawings: bool = True,
+) -> PdfClassification:
+    """
+    判断 PDF 各页面的类型（见 `classify_page`），并统计文字页比例。
+
+    Args:
+        pdf_path: PDF 文件的路径。
+        min_text_length: 判断页面是否包含“显著文字”的最小文本长度阈值。
+        sample_pages: 最多检查的页数，默认检查所有页面。抽样时以页数为种子随机选取页面，
+                      结果可复现。
+        early_exit: 文字页比例已能以 99% 的置信度判断是否超过 50% 时停止检查。
+        check_drawings: 是否对无文字、无图片的页面检查矢量图形。
+
+    Returns:
+        PdfClassification，其中 pages 包含所有已检查页面的类型，可供提取时复用。
+
+    Raises:
+        文件不存在、损坏或加密时抛出 PyMuPDF 的异常。
+    """
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+        if sample_pages is None or sample_pages >= page_count:
+            order = list(range(page_count))
+        else:
+            order = random.Random(page_count).sample(range(page_count), sample_pages)
+        if early_exit and len(order) > EARLY_EXIT_MIN_PAGES:
+            # 按随机顺序检查，使提前结束时的样本能代表整个文档
+            random.Random(page_count).shuffle(order)
+
+        pages: dict[int, str] = {}
+        text_pages = 0
+        non_blank_pages = 0
+        for page_num in order:
+            kind = classify_page(doc.load_page(page_num), min_text_length, check_drawings)
+            pages[page_num] = kind
+            if kind != BLANK_PAGE:
+                non_blank_pages += 1
+                if kind == TEXT_PAGE:
+                    text_pages += 1
+            if early_exit and _decided(text_pages, non_blank_pages):
+                break
+
+    return PdfClassification(
+        page_count=page_count,
+        pages=pages,
+        text_ratio=text_pages / non_blank_pages if non_blank_pages else None,
+    )
+
+
+def is_text_pdf(
+    pdf_path: Path | str,
+    min_text_length: int = 50,
+    sample_pages: Optional[int] = None,
+) -> bool:
     """
     判断一个 PDF 文件是否为“文字 PDF”。
 
     一个 PDF 被认为是“文字 PDF”，如果其所有非空白页中，包含显著文字的
-    页面比例超过 50%。
+    页面比例超过 50%。页面按随机顺序检查，比例能以足够的置信度判断时提前结束，
+    见 `classify_pdf`。
     测试已通过。
 
     Args:
         pdf_path: PDF 文件的路径。
         min_text_length: 判断页面是否包含“显著文字”的最小文本长度阈值。
                          默认为 50 个字符（剥离空白符后）。
+        sample_pages: 最多检查的页数，默认不限制。
 
     Returns:
         如果 PDF 是文字 PDF，返回 True；否则返回 False。
@@ -27,56 +159,20 @@ def is_text_pdf(pdf_path: Path | str, min_text_length: int = 50) -> bool:
         print(f"错误: 文件未找到 -> {pdf_path}")
         return False
 
-    total_non_blank_pages = 0
-    pages_with_significant_text = 0
-
     try:
-        # 使用 'with' 语句确保文件被正确关闭
-        with fitz.open(pdf_path) as doc:
-            if doc.page_count == 0:
-                print(f"信息: PDF 文件不包含任何页面 -> {pdf_path}")
-                return False  # 零页的 PDF 不算文字 PDF
-
-            for page_num in range(doc.page_count):
-                page = doc.load_page(page_num)
-
-                # 1. 提取文本并检查长度 (判断是否包含显著文字)
-                text = page.get_text().strip()  # type: ignore
-                has_significant_text = len(text) >= min_text_length
-
-                # 2. 检查页面是否包含图片或图形 (判断是否为非空白页)
-                # get_images(full=False) 更快，只检查是否存在图片对象
-                has_images = len(page.get_images(full=False)) > 0
-                has_drawings = len(page.get_drawings()) > 0
-
-                # 如果页面包含显著文本 OR 图片 OR 图形，则认为它是非空白页
-                is_non_blank = has_significant_text or has_images or has_drawings
-
-                if is_non_blank:
-                    total_non_blank_pages += 1
-                    # 如果页面包含显著文本，则计数为有文字页
-                    if has_significant_text:
-                        pages_with_significant_text += 1
-
-        # 计算比例
-        if total_non_blank_pages == 0:
-            # 如果总非空白页数为0 (意味着所有页面都是完全空白的)，
-            # 则该 PDF 不被视为文字 PDF。
-            print(f"信息: PDF 文件只包含空白页 -> {pdf_path}")
-            return False
-
-        percentage_text_pages = (
-            pages_with_significant_text / total_non_blank_pages
-        ) * 100
-
-        # print(f"处理文件: {os.path.basename(pdf_path)}, 总页数: {doc.page_count}, 非空白页数: {total_non_blank_pages}, 显著文字页数: {pages_with_significant_text}, 比例: {percentage_text_pages:.2f}%") # 可选的调试输出
-
-        # 判断比例是否超过 50%
-        return percentage_text_pages > 50.0
-
+        result = classify_pdf(pdf_path, min_text_length, sample_pages)
     except fitz.FileDataError:
         print(f"错误: 无法打开或读取 PDF 文件 (文件可能损坏或加密) -> {pdf_path}")
         return False
     except Exception as e:
         print(f"处理文件时发生未知错误 {pdf_path}: {e}")
         return False
+
+    if result.page_count == 0:
+        print(f"信息: PDF 文件不包含任何页面 -> {pdf_path}")
+        return False  # 零页的 PDF 不算文字 PDF
+    if result.text_ratio is None:
+        # 如果已检查的页面都是完全空白的，则该 PDF 不被视为文字 PDF。
+        print(f"信息: PDF 文件只包含空白页 -> {pdf_path}")
+        return False
+    return result.is_text
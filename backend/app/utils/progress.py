@@ -0,0 +1,5 @@
+from typing import Callable
+
+# 进度回调：(阶段名, 已完成数量, 总数量)
+# 可能在工作线程中调用，实现方需保证线程安全且足够轻量
+ProgressCallback = Callable[[str, int, int], None]
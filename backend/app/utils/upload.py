@@ -0,0 +1,137 @@
+import hashlib
+import os
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+
+from fastapi import UploadFile
+
+# 每次从上传流中读取的块大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+# multipart 表单除文件外的额外开销（边界、表单字段等），用于根据 Content-Length 提前拒绝
+UPLOAD_FORM_OVERHEAD = 64 * 1024  # 64KB
+
+
+class UploadTooLargeError(Exception):
+    """上传文件超过大小限制"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"文件大小超过限制: > {max_size}")
+
+
+@dataclass
+class UploadBudget:
+    """一次批量上传请求中剩余的文件数量与字节数，压缩包中的文件按解压后计算"""
+
+    files: int
+    bytes: int
+
+
+class _HashingWriter:
+    """
+    将数据块写入 `<dest>.part`，同时统计大小、计算 sha256，
+    完成后原子地重命名为 dest；超过 max_size 或出错时删除已写入的部分。
+    """
+
+    def __init__(self, dest: str | Path, max_size: int):
+        self.dest = Path(dest)
+        self.part_path = self.dest.with_name(self.dest.name + ".part")
+        self.max_size = max_size
+        self.size = 0
+        self.hasher = hashlib.sha256()
+
+    def __enter__(self) -> "_HashingWriter":
+        self.file = open(self.part_path, "wb")
+        return self
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise UploadTooLargeError(self.max_size)
+        self.hasher.update(chunk)
+        self.file.write(chunk)
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.file.close()
+        if exc_type is None:
+            os.replace(self.part_path, self.dest)
+        else:
+            self.part_path.unlink(missing_ok=True)
+
+    @property
+    def result(self) -> tuple[int, str]:
+        return self.size, self.hasher.hexdigest()
+
+
+async def save_upload_file(
+    file: UploadFile,
+    dest: str | Path,
+    max_size: int,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> tuple[int, str]:
+    """
+    将上传文件按块流式写入磁盘，同时计算文件大小与 sha256。
+
+    文件先写入 `<dest>.part`，完成后再原子地重命名为 dest；
+    超过 max_size 时立即中止并删除已写入的部分。
+
+    Args:
+        file: 上传的文件。
+        dest: 目标路径。
+        max_size: 允许的最大字节数。
+        chunk_size: 每次读取的字节数。
+
+    Returns:
+        (文件大小, sha256 十六进制摘要)
+
+    Raises:
+        UploadTooLargeError: 文件超过 max_size。
+    """
+    with _HashingWriter(dest, max_size) as writer:
+        while chunk := await file.read(chunk_size):
+            writer.write(chunk)
+    return writer.result
+
+
+def save_stream(
+    stream: BinaryIO,
+    dest: str | Path,
+    max_size: int,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> tuple[int, str]:
+    """
+    `save_upload_file` 的同步版本，用于压缩包条目等普通文件流。
+    """
+    with _HashingWriter(dest, max_size) as writer:
+        while chunk := stream.read(chunk_size):
+            writer.write(chunk)
+    return writer.result
+
+
+def hash_file(path: str | Path, chunk_size: int = UPLOAD_CHUNK_SIZE) -> tuple[int, str]:
+    """按块读取文件，计算文件大小与 sha256（同 `save_upload_file` 的返回值），不复制文件"""
+    size = 0
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            size += len(chunk)
+            hasher.update(chunk)
+    return size, hasher.hexdigest()
+
+
+def zip_member_filename(info: zipfile.ZipInfo) -> str:
+    """
+    获取压缩包条目的文件名。
+
+    未设置 UTF-8 标志位的条目会被 zipfile 按 cp437 解码，
+    而国内 Windows 上创建的压缩包通常使用 GBK 编码文件名，这里尝试还原。
+    """
+    if info.flag_bits & 0x800:
+        return info.filename
+    try:
+        return info.filename.encode("cp437").decode("gbk")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return info.filename
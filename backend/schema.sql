@@ -12,10 +12,65 @@ CREATE TABLE
     message TEXT, -- 处理状态信息
     size INTEGER, -- 文件大小（字节）
     chunk_size INTEGER, -- 分块数量（字节）
+    content_hash TEXT, -- 文件内容的 sha256
+    ingest_signature TEXT, -- 处理完成时的提取/分块/embedding 配置签名
+    profile TEXT DEFAULT 'accurate', -- 文本提取配置档：fast、balanced、accurate
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
   );
 
+CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents (content_hash);
+
+-- ingest_jobs
+-- 文档处理队列，每个文档至多一个任务
+CREATE TABLE
+  IF NOT EXISTS ingest_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    document_id TEXT NOT NULL UNIQUE REFERENCES documents (id) ON DELETE CASCADE,
+    status TEXT NOT NULL, -- queued, running, done, failed
+    attempts INTEGER DEFAULT 0, -- 已尝试次数
+    run_after REAL DEFAULT 0, -- 最早可执行时间（unix 时间戳），用于重试退避
+    cost REAL DEFAULT 0, -- 估计的处理耗时（秒），用于调度
+    enqueued_at REAL DEFAULT 0, -- 入队时间（unix 时间戳），用于老化补偿
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+  );
+
+CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs (status, run_after);
+
+-- ingest_timings
+-- 文档处理各阶段的实际耗时，用于校准耗时估计；文档删除后保留
+CREATE TABLE
+  IF NOT EXISTS ingest_timings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    document_id TEXT NOT NULL,
+    type TEXT NOT NULL, -- 文档类型
+    profile TEXT NOT NULL, -- 文本提取配置档
+    stage TEXT NOT NULL, -- extract 或 embed
+    prior REAL NOT NULL, -- 处理前按先验单价估计的耗时（秒）
+    seconds REAL NOT NULL, -- 实际耗时（秒）
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+  );
+
+CREATE INDEX IF NOT EXISTS idx_ingest_timings_key ON ingest_timings (type, profile, stage, id);
+
+-- vector_cleanups
+-- 删除文档时未能从向量数据库删除的文档块，由索引维护命令重试
+CREATE TABLE
+  IF NOT EXISTS vector_cleanups (
+    document_id TEXT PRIMARY KEY,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+  );
+
+-- index_checks
+-- 索引维护命令已核对过、三处存储一致的文档；文档此后没有更新时增量核对会跳过
+CREATE TABLE
+  IF NOT EXISTS index_checks (
+    document_id TEXT PRIMARY KEY REFERENCES documents (id) ON DELETE CASCADE,
+    updated_at TIMESTAMP, -- 核对时文档的 updated_at
+    checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+  );
+
 -- models
 -- 远程模型配置表
 CREATE TABLE
@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+from app.utils.admission import ConcurrencyLimiter, QueueFullError
+
+
+def test_limiter_bounds_running_and_queued_tasks():
+    limiter = ConcurrencyLimiter("测试", max_concurrent=1, max_queued=1, retry_after=5)
+
+    async def run():
+        gate = asyncio.Event()
+        observed = []
+
+        async def job():
+            async with limiter.slot():
+                observed.append(limiter.metrics())
+                await gate.wait()
+
+        tasks = []
+        for _ in range(2):
+            limiter.admit()
+            task = asyncio.create_task(job())
+            task.add_done_callback(lambda _: limiter.release())
+            tasks.append(task)
+        await asyncio.sleep(0)
+
+        with pytest.raises(QueueFullError) as e:
+            limiter.admit()
+        assert e.value.retry_after == 5
+
+        gate.set()
+        await asyncio.gather(*tasks)
+        await asyncio.sleep(0)
+        return observed
+
+    observed = asyncio.run(run())
+    assert observed[0]["running"] == 1 and observed[0]["waiting"] == 1
+    assert limiter.pending == 0 and limiter.running == 0
+    limiter.admit()
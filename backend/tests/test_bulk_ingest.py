@@ -0,0 +1,161 @@
+import asyncio
+
+import pytest
+from app.config import settings
+from app.database import get_standalone_db
+from app.services import bulk_ingest as bulk
+from app.services import document_service
+from app.services.document_service import ingest_queue
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{tmp_path / 'rag.db'}")
+    monkeypatch.setattr(settings, "UPLOAD_DIR", tmp_path / "upload")
+    monkeypatch.setattr(settings, "INGEST_POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(settings, "INGEST_MAX_ATTEMPTS", 1)
+
+    async def no_warmup():
+        pass
+
+    monkeypatch.setattr(bulk.extraction_pool, "start", no_warmup)
+
+    root = tmp_path / "archive"
+    (root / "物理" / "电学").mkdir(parents=True)
+    (root / ".git").mkdir()
+    (root / "物理" / "力学.txt").write_text("牛顿定律", encoding="utf-8")
+    (root / "物理" / "电学" / "broken.txt").write_text("损坏", encoding="utf-8")
+    (root / "物理" / "电学" / "tool.exe").write_bytes(b"MZ")
+    (root / "物理" / ".draft.md").write_text("草稿", encoding="utf-8")
+    (root / ".git" / "notes.md").write_text("版本库", encoding="utf-8")
+    (root / "empty.md").write_text("", encoding="utf-8")
+    return root
+
+
+def test_find_ingest_files_skips_hidden_and_unsupported(archive):
+    files = [p.relative_to(archive).as_posix() for p in bulk.find_ingest_files(archive)]
+    assert files == ["empty.md", "物理/力学.txt", "物理/电学/broken.txt"]
+
+
+def test_bulk_ingest_resumes_without_duplicates(archive, monkeypatch):
+    attempts: dict[str, int] = {}
+
+    async def handler(document_id):
+        db = await get_standalone_db()
+        try:
+            cursor = await db.execute(
+                "SELECT filename FROM documents WHERE id = ?", (document_id,)
+            )
+            filename = (await cursor.fetchone())["filename"]
+            attempts[filename] = attempts.get(filename, 0) + 1
+            if filename == "broken.txt" and attempts[filename] == 1:
+                raise RuntimeError("无法解析")
+            await db.execute(
+                "UPDATE documents SET status = 'completed', chunk_size = 2 WHERE id = ?",
+                (document_id,),
+            )
+            await db.commit()
+        finally:
+            await db.close()
+
+    monkeypatch.setattr(ingest_queue, "handler", handler)
+    copied = []
+    save_stream = document_service.save_stream
+
+    def counting_save_stream(stream, *args):
+        copied.append(stream.name.rsplit("/", 1)[-1])
+        return save_stream(stream, *args)
+
+    monkeypatch.setattr(document_service, "save_stream", counting_save_stream)
+
+    async def run():
+        first = await bulk.bulk_ingest(archive, profile="fast")
+        copied.clear()
+        # 重新运行：已完成的文件被跳过，失败的文件重新处理
+        second = await bulk.bulk_ingest(archive, profile="fast")
+        db = await get_standalone_db()
+        try:
+            cursor = await db.execute(
+                "SELECT filename, description, status FROM documents ORDER BY filename"
+            )
+            documents = [tuple(row) for row in await cursor.fetchall()]
+        finally:
+            await db.close()
+        return first, second, documents
+
+    first, second, documents = asyncio.run(run())
+
+    assert (first.files, first.queued, first.completed, first.failed) == (3, 2, 1, 1)
+    assert first.chunks == 2
+    assert [name for name, _ in first.errors] == ["empty.md", "broken.txt"]
+    assert (second.queued, second.skipped, second.completed) == (1, 1, 1)
+    # 已导入过的文件不再复制到上传目录（空文件没有登记，仍会复制后被拒绝）
+    assert copied == ["empty.md"]
+    assert documents == [
+        ("broken.txt", "物理/电学/broken.txt", "completed"),
+        ("力学.txt", "物理/力学.txt", "completed"),
+    ]
+
+
+def test_bulk_ingest_resumes_interrupted_run(archive, monkeypatch):
+    started = asyncio.Event()
+    interrupted = True
+
+    async def handler(document_id):
+        if interrupted:
+            started.set()
+            await asyncio.Event().wait()
+        db = await get_standalone_db()
+        try:
+            await db.execute(
+                "UPDATE documents SET status = 'completed', chunk_size = 1 WHERE id = ?",
+                (document_id,),
+            )
+            await db.commit()
+        finally:
+            await db.close()
+
+    monkeypatch.setattr(ingest_queue, "handler", handler)
+
+    async def run():
+        nonlocal interrupted
+        # 第一个文档处理中时中断导入
+        task = asyncio.create_task(bulk.bulk_ingest(archive, profile="fast", workers=1))
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        db = await get_standalone_db()
+        try:
+            cursor = await db.execute("SELECT status FROM documents")
+            interrupted_statuses = [row["status"] for row in await cursor.fetchall()]
+            # 模拟登记了文档但尚未加入队列时中断
+            await db.execute(
+                """
+                DELETE FROM ingest_jobs WHERE status = 'queued' AND document_id IN
+                    (SELECT id FROM documents WHERE filename = 'broken.txt')
+                """
+            )
+            await db.commit()
+        finally:
+            await db.close()
+
+        interrupted = False
+        report = await bulk.bulk_ingest(archive, profile="fast")
+        db = await get_standalone_db()
+        try:
+            cursor = await db.execute(
+                "SELECT filename, status FROM documents ORDER BY filename"
+            )
+            documents = [tuple(row) for row in await cursor.fetchall()]
+        finally:
+            await db.close()
+        return interrupted_statuses, report, documents
+
+    interrupted_statuses, report, documents = asyncio.run(run())
+
+    assert "completed" not in interrupted_statuses
+    # 未完成的文档不算作已导入，继续处理直到完成
+    assert (report.queued, report.skipped, report.completed, report.failed) == (2, 0, 2, 0)
+    assert [name for name, _ in report.errors] == ["empty.md"]
+    assert documents == [("broken.txt", "completed"), ("力学.txt", "completed")]
@@ -0,0 +1,251 @@
+import gc
+import subprocess
+import sys
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+import fitz
+import pytest
+from app.embedding import document_ocr, ocr_cache
+
+
+@pytest.fixture(autouse=True)
+def ocr_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(document_ocr.settings, "UPLOAD_DIR", tmp_path / "upload")
+    return tmp_path / "upload" / "ocr_cache"
+
+
+def _make_pdf(path, pages: int):
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page(width=200, height=200)
+        # 各页内容不同（位于测试的文本区域之外），不会命中彼此的 OCR 缓存
+        page.insert_text((20, 190), f"page {i}", fontsize=8)
+    doc.save(path)
+
+
+def _fake_layout(images, batch_size=None):
+    return [
+        SimpleNamespace(
+            bboxes=[
+                SimpleNamespace(label="Text", bbox=[0, 0, 10, 10]),
+                SimpleNamespace(label="Picture", bbox=[0, 0, 20, 20]),
+                SimpleNamespace(label="Text", bbox=[10, 10, 30, 30]),
+            ]
+        )
+        for _ in images
+    ]
+
+
+def test_iter_ocr_pdf_pages_yields_pages_in_order(tmp_path, monkeypatch):
+    path = tmp_path / "scan.pdf"
+    _make_pdf(path, 3)
+    monkeypatch.setattr(document_ocr.settings, "OCR_LAYOUT_DPI", 150)
+    monkeypatch.setattr(document_ocr, "get_layout_predictor", lambda: _fake_layout)
+    monkeypatch.setattr(
+        document_ocr,
+        "_perform_ocr_on_cropped_image",
+        lambda image, use_cls=None: f"{image.width}x{image.height}",
+    )
+    reported = []
+
+    pages = list(
+        document_ocr.iter_ocr_pdf_pages(str(path), lambda *item: reported.append(item))
+    )
+
+    assert [page for page, _ in pages] == [0, 1, 2]
+    # 空白页无法估计文字高度，区域以配置档的 300 dpi 重新渲染
+    assert all(texts == ["20x20", "40x40"] for _, texts in pages)
+    assert ("render", 3, 3) in reported
+    assert ("ocr", 3, 3) in reported
+
+
+def test_layout_detection_runs_in_batches(tmp_path, monkeypatch):
+    path = tmp_path / "scan.pdf"
+    _make_pdf(path, 5)
+    batches = []
+
+    def layout(images, batch_size=None):
+        batches.append((len(images), batch_size))
+        return _fake_layout(images)
+
+    monkeypatch.setattr(document_ocr.settings, "OCR_LAYOUT_BATCH_SIZE", 2)
+    monkeypatch.setattr(document_ocr, "get_layout_predictor", lambda: layout)
+    monkeypatch.setattr(
+        document_ocr, "_perform_ocr_on_cropped_image", lambda image, use_cls=None: "字"
+    )
+
+    renders = []
+    render_pages = document_ocr._render_pages
+    render_regions = document_ocr._render_page_regions
+
+    def tracked_render_pages(document, page_nums, profile):
+        renders.append(("pages", list(page_nums)))
+        return render_pages(document, page_nums, profile)
+
+    def tracked_render_regions(document, page_num, regions):
+        renders.append(("regions", page_num))
+        return render_regions(document, page_num, regions)
+
+    monkeypatch.setattr(document_ocr, "_render_pages", tracked_render_pages)
+    monkeypatch.setattr(document_ocr, "_render_page_regions", tracked_render_regions)
+
+    pages = list(document_ocr.iter_ocr_pdf_pages(str(path), pages=[0, 1, 2, 4]))
+
+    assert [page for page, _ in pages] == [0, 1, 2, 4]
+    assert batches == [(2, 2), (2, 2)]
+    # 一批的区域渲染不排在下一批的预先渲染之后
+    assert renders == [
+        ("pages", [0, 1]),
+        ("regions", 0),
+        ("regions", 1),
+        ("pages", [2, 4]),
+        ("regions", 2),
+        ("regions", 4),
+    ]
+
+
+def test_inflight_pages_are_bounded(tmp_path, monkeypatch):
+    path = tmp_path / "scan.pdf"
+    _make_pdf(path, 12)
+    crops = []
+    render_regions = document_ocr._render_page_regions
+
+    def tracked_render(*args):
+        images = render_regions(*args)
+        crops.extend(weakref.ref(image) for image in images)
+        return images
+
+    def slow_ocr(image, use_cls=None):
+        time.sleep(0.01)
+        return "字"
+
+    monkeypatch.setattr(document_ocr.settings, "OCR_MAX_INFLIGHT_PAGES", 2)
+    monkeypatch.setattr(document_ocr, "get_layout_predictor", lambda: _fake_layout)
+    monkeypatch.setattr(document_ocr, "_render_page_regions", tracked_render)
+    monkeypatch.setattr(document_ocr, "_perform_ocr_on_cropped_image", slow_ocr)
+    alive = []
+
+    for _ in document_ocr.iter_ocr_pdf_pages(str(path)):
+        gc.collect()
+        alive.append(sum(ref() is not None for ref in crops))
+
+    assert len(alive) == 12
+    # 每页两个区域，已产出页面的区域图像都已释放
+    assert max(alive) <= 2 * 2
+
+
+def test_text_regions_render_at_resolution_for_glyph_size(tmp_path, monkeypatch):
+    path = tmp_path / "scan.pdf"
+    doc = fitz.open()
+    page = doc.new_page(width=600, height=450)
+    page.insert_text((20, 60), "Heading", fontsize=36)
+    page.insert_text((20, 350), "small body text", fontsize=8)
+    doc.save(path)
+    layout_sizes = []
+
+    def layout(images, batch_size=None):
+        layout_sizes.extend(image.size for image in images)
+        # 上下两半各一个文本区域（低分辨率图像的像素坐标）
+        return [
+            SimpleNamespace(
+                bboxes=[
+                    SimpleNamespace(label="Text", bbox=[0, 0, 800, 150]),
+                    SimpleNamespace(label="Text", bbox=[0, 300, 800, 600]),
+                ]
+            )
+            for image in images
+        ]
+
+    ocr_sizes = []
+    monkeypatch.setattr(document_ocr.settings, "OCR_MAX_RENDER_PIXELS", 2_000_000)
+    monkeypatch.setattr(document_ocr, "get_layout_predictor", lambda: layout)
+    monkeypatch.setattr(
+        document_ocr,
+        "_perform_ocr_on_cropped_image",
+        lambda image, use_cls=None: ocr_sizes.append(image.size) or "",
+    )
+
+    [(_, blocks)] = list(document_ocr.iter_ocr_pdf_blocks(str(path)))
+
+    assert layout_sizes == [(800, 600)]  # 96 dpi
+    assert blocks[1].bbox == (0, 225, 600, 450)
+    (heading_width, _), (body_width, body_height) = ocr_sizes
+    # 小字区域的分辨率更高，但都不超过配置档的 300 dpi 与像素上限
+    assert heading_width < body_width <= 600 * 300 / 72
+    assert body_width * body_height < 2_000_000 * 1.01
+
+
+def test_ocr_results_are_cached_per_page(tmp_path, ocr_cache_dir, monkeypatch):
+    recognized = []
+
+    def ocr(image, use_cls=None):
+        recognized.append(image.size)
+        return "字"
+
+    monkeypatch.setattr(document_ocr.settings, "OCR_LAYOUT_BATCH_SIZE", 1)
+    monkeypatch.setattr(document_ocr.settings, "OCR_MAX_INFLIGHT_PAGES", 1)
+    monkeypatch.setattr(document_ocr, "get_layout_predictor", lambda: _fake_layout)
+    monkeypatch.setattr(document_ocr, "_perform_ocr_on_cropped_image", ocr)
+    path = tmp_path / "scan.pdf"
+    _make_pdf(path, 3)
+
+    # 识别完第一页后取消
+    pages = document_ocr.iter_ocr_pdf_blocks(str(path))
+    next(pages)
+    pages.close()
+    recognized.clear()
+
+    first = list(document_ocr.iter_ocr_pdf_blocks(str(path)))
+    # 第一页读取缓存，每页两个文本区域
+    assert len(recognized) == 2 * 2
+    assert len(list(ocr_cache_dir.glob("*/*.json"))) == 3
+
+    recognized.clear()
+    other = tmp_path / "other.pdf"
+    _make_pdf(other, 4)  # 前三页与 scan.pdf 相同
+    second = list(document_ocr.iter_ocr_pdf_blocks(str(other)))
+
+    assert len(recognized) == 2
+    assert second[:3] == first
+
+    pruned = ocr_cache.prune_ocr_cache(max_bytes=0)
+    assert (pruned.removed, pruned.size_after) == (4, 0)
+
+
+def test_importing_services_does_not_load_ocr_models():
+    code = (
+        "import sys, app.services.document_service; "
+        "print('surya' in sys.modules, 'rapidocr' in sys.modules)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=Path(__file__).parent.parent,
+    )
+    assert result.stdout.split()[-2:] == ["False", "False"]
+
+
+def test_ocr_engine_loads_once_across_threads(monkeypatch):
+    import rapidocr
+
+    created = []
+
+    class SlowOCR:
+        def __init__(self, config_path):
+            time.sleep(0.05)
+            created.append(self)
+
+    monkeypatch.setattr(rapidocr, "RapidOCR", SlowOCR)
+    monkeypatch.setattr(document_ocr, "_ocr", None)
+
+    with ThreadPoolExecutor(8) as executor:
+        engines = list(executor.map(lambda _: document_ocr.get_ocr_engine(), range(8)))
+
+    assert len(created) == 1
+    assert all(engine is created[0] for engine in engines)
@@ -1,6 +1,8 @@
+import asyncio
 import time
 
 import chromadb
+from app.config import settings
 from app.embedding import Embedding
 
 
@@ -51,3 +53,24 @@ async def test_chroma_embedding():
             print(f'  文本块内容:\n"""\n{results["documents"][0][i]}\n"""')  # type: ignore
     else:
         raise ValueError("查询没有返回结果。")
+
+
+def test_copy_reuses_vectors(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CHROMA_DIRECTORY", tmp_path / "chroma")
+    em = Embedding("test_copy")
+    try:
+        em.collection.add(
+            ids=["src_0", "src_1"],
+            embeddings=[[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]],
+            documents=["第一段", "第二段"],
+            metadatas=[{"doc_id": "src"}, {"doc_id": "src"}],
+        )
+
+        copied = asyncio.run(em.copy("src", "dst"))
+
+        assert copied == 2
+        result = em.collection.get(where={"doc_id": "dst"}, include=["documents"])
+        assert sorted(result["ids"]) == ["dst_0", "dst_1"]
+        assert sorted(result["documents"]) == ["第一段", "第二段"]  # type: ignore
+    finally:
+        em.client.delete_collection("test_copy")
@@ -0,0 +1,132 @@
+import asyncio
+
+from app.embedding.extract_pool import ExtractionPool
+
+
+def test_iter_pages_extracts_in_process_pool(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("第一行\n第二行", encoding="utf-8")
+
+    async def run():
+        pool = ExtractionPool(workers=1)
+        try:
+            return [page async for page in pool.iter_pages(path, "txt")]
+        finally:
+            pool.shutdown()
+
+    assert [page.text for page in asyncio.run(run())] == ["第一行\n第二行"]
+
+
+def test_iter_pages_streams_from_process_pool(tmp_path):
+    path = tmp_path / "notes.md"
+    path.write_text("# 标题\n正文", encoding="utf-8")
+
+    async def run():
+        pool = ExtractionPool(workers=1)
+        try:
+            return [page async for page in pool.iter_pages(path, "md")]
+        finally:
+            pool.shutdown()
+
+    assert [page.text for page in asyncio.run(run())] == ["# 标题\n正文"]
+
+
+def test_iter_pages_converts_pdf_ranges_in_parallel(tmp_path, monkeypatch):
+    import fitz
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "PDF_MARKDOWN_RANGE_PAGES", 4)
+    path = tmp_path / "book.pdf"
+    doc = fitz.open()
+    for page in range(10):
+        doc.new_page().insert_text(
+            (72, 72), f"Page {page} of a born-digital reference book with text."
+        )
+    doc.save(path)
+    reported = []
+
+    async def run():
+        pool = ExtractionPool(workers=2)
+        try:
+            return [
+                page
+                async for page in pool.iter_pages(
+                    path, "pdf", lambda *item: reported.append(item)
+                )
+            ]
+        finally:
+            pool.shutdown()
+
+    pages = asyncio.run(run())
+    assert len(pages) == 10
+    assert [page.number for page in pages] == list(range(10))
+    assert all(f"Page {i} of" in page.text for i, page in enumerate(pages))
+    assert reported[-1] == ("extract", 10, 10)
+
+
+def test_ocr_segments_report_stage_progress(tmp_path, monkeypatch):
+    import queue
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from types import SimpleNamespace
+
+    import fitz
+    from app.config import settings
+    from app.embedding import document_ocr
+
+    def scanned_page(doc):
+        pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 16, 16), False)
+        pixmap.clear_with(200)
+        doc.new_page().insert_image(fitz.Rect(72, 72, 272, 272), pixmap=pixmap)
+
+    # 扫描页、文字页、两页扫描页：两个扫描片段
+    path = tmp_path / "scan.pdf"
+    doc = fitz.open()
+    scanned_page(doc)
+    doc.new_page().insert_text((72, 72), "Born-digital lecture notes with text.")
+    scanned_page(doc)
+    scanned_page(doc)
+    doc.save(path)
+
+    monkeypatch.setattr(settings, "UPLOAD_DIR", tmp_path / "upload")
+    monkeypatch.setattr(settings, "OCR_PAGE_CACHE", False)
+    monkeypatch.setattr(
+        document_ocr,
+        "get_layout_predictor",
+        lambda: lambda images, batch_size=None: [
+            SimpleNamespace(bboxes=[SimpleNamespace(label="Text", bbox=[0, 0, 50, 50])])
+            for _ in images
+        ],
+    )
+    monkeypatch.setattr(
+        document_ocr, "_perform_ocr_on_cropped_image", lambda image, use_cls=None: "字"
+    )
+    # 在当前进程的线程中执行子进程任务，使上面的替换生效
+    executor = ThreadPoolExecutor(2)
+    monkeypatch.setattr(ExtractionPool, "pool", property(lambda self: executor))
+    monkeypatch.setattr(
+        ExtractionPool,
+        "manager",
+        property(lambda self: SimpleNamespace(Queue=queue.Queue, Event=threading.Event)),
+    )
+    reported = []
+
+    async def run():
+        pool = ExtractionPool(workers=2)
+        return [
+            page
+            async for page in pool.iter_pages(
+                path, "pdf", lambda *item: reported.append(item)
+            )
+        ]
+
+    try:
+        pages = asyncio.run(run())
+    finally:
+        executor.shutdown()
+
+    assert [page.text for page in pages if page.number != 1] == ["字"] * 3
+    ocr = [item for item in reported if item[0] == "ocr"]
+    assert ocr == [("ocr", 1, 3), ("ocr", 2, 3), ("ocr", 3, 3)]
+    assert ("render", 3, 3) in reported
+    assert reported[-1] == ("extract", 4, 4)
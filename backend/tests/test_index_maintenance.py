@@ -0,0 +1,105 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+from app.config import settings
+from app.database import get_standalone_db, init_db
+from app.embedding import Embedding
+from app.services import index_maintenance as maintenance
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{tmp_path / 'rag.db'}")
+    monkeypatch.setattr(settings, "UPLOAD_DIR", tmp_path / "upload")
+    monkeypatch.setattr(settings, "CHROMA_DIRECTORY", tmp_path / "chroma")
+    (tmp_path / "upload").mkdir()
+    em = Embedding("maintenance_test")
+    monkeypatch.setattr(maintenance, "vector_db", em)
+    asyncio.run(init_db())
+    return em
+
+
+def _add_vectors(em, doc_id: str, count: int):
+    em.collection.add(
+        ids=[f"{doc_id}_{i}" for i in range(count)],
+        embeddings=[[float(i), 1.0, 0.0] for i in range(count)],
+        documents=[f"{doc_id} 第 {i} 段" for i in range(count)],
+        metadatas=[{"doc_id": doc_id} for _ in range(count)],
+    )
+
+
+async def _insert_document(db, document_id: str, status: str, chunk_size: int):
+    await db.execute(
+        """
+        INSERT INTO documents (id, filename, type, status, chunk_size, content_hash)
+        VALUES (?, ?, 'txt', ?, ?, ?)
+        """,
+        (document_id, f"{document_id}.txt", status, chunk_size, document_id * 8),
+    )
+    (settings.UPLOAD_DIR / document_id).write_text("内容", encoding="utf-8")
+
+
+def test_verify_is_incremental_and_repair_requeues(store):
+    _add_vectors(store, "ok", 2)
+    _add_vectors(store, "short", 1)
+    _add_vectors(store, "gone", 2)  # 删除文档时未能删除
+    _add_vectors(store, "ghost", 1)  # 崩溃留下，只有完整核对能发现
+    stale = settings.UPLOAD_DIR / "upload.part"
+    stale.write_bytes(b"x")
+    os.utime(stale, (0, 0))
+    (settings.UPLOAD_DIR / "fresh.part").write_bytes(b"x")
+
+    async def run():
+        db = await get_standalone_db()
+        try:
+            await _insert_document(db, "ok", "completed", 2)
+            await _insert_document(db, "short", "completed", 3)
+            await _insert_document(db, "stuck", "processing", 0)
+            await db.execute("INSERT INTO vector_cleanups (document_id) VALUES ('gone')")
+            await db.commit()
+
+            first = await maintenance.verify_index(db)
+            second = await maintenance.verify_index(db)
+            full = await maintenance.verify_index(db, full=True)
+            requeued = await maintenance.repair_index(db, full)
+            cursor = await db.execute("SELECT document_id FROM ingest_jobs")
+            jobs = sorted(row[0] for row in await cursor.fetchall())
+            cursor = await db.execute("SELECT COUNT(*) FROM vector_cleanups")
+            (cleanups,) = await cursor.fetchone()
+            return first, second, full, requeued, jobs, cleanups
+        finally:
+            await db.close()
+
+    first, second, full, requeued, jobs, cleanups = asyncio.run(run())
+
+    assert (first.checked, first.skipped) == (2, 0)
+    assert first.mismatched == {"short": (3, 1)}
+    assert first.stalled == ["stuck"]
+    assert first.orphan_vectors == {"gone": 2}
+    assert first.orphan_files == [settings.UPLOAD_DIR / "upload.part"]
+    # 一致的文档在更新前不再核对
+    assert (second.checked, second.skipped) == (1, 1)
+    assert full.orphan_vectors == {"gone": 2, "ghost": 1}
+
+    assert requeued == ["short", "stuck"]
+    assert jobs == ["short", "stuck"]
+    assert cleanups == 0
+    assert store.count_chunks_by_document() == {"ok": 2, "short": 1}
+    assert not stale.exists()
+    assert (settings.UPLOAD_DIR / "fresh.part").exists()
+
+
+def test_compact_removes_orphan_segment_directories(store):
+    _add_vectors(store, "ok", 2)
+    leftover = settings.CHROMA_DIRECTORY / str(uuid.uuid4())
+    leftover.mkdir()
+    (leftover / "data_level0.bin").write_bytes(b"\0" * 1024)
+
+    result = maintenance.compact_vector_store()
+
+    assert result.removed_segments == [leftover.name]
+    assert not leftover.exists()
+    assert result.size_after < result.size_before
+    assert store.count_chunks("ok") == 2
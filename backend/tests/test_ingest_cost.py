@@ -0,0 +1,80 @@
+import asyncio
+
+import fitz
+import pytest
+from app.config import settings
+from app.database import get_standalone_db, init_db
+from app.embedding.extract_profile import ACCURATE, FAST
+from app.services.ingest_cost import (
+    PDF_SCANNED_PAGE_COST,
+    estimate_ingest,
+    inspect_ingest_file,
+    prior_stage_costs,
+    record_ingest_timing,
+)
+from docx import Document
+from pptx import Presentation
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{tmp_path / 'rag.db'}")
+    asyncio.run(init_db())
+
+
+def test_inspect_counts_units_without_parsing(tmp_path):
+    pptx_path = tmp_path / "deck.pptx"
+    prs = Presentation()
+    for _ in range(3):
+        prs.slides.add_slide(prs.slide_layouts[6])
+    prs.save(pptx_path)
+
+    docx_path = tmp_path / "lesson.docx"
+    document = Document()
+    document.add_paragraph("教学目标")
+    document.add_paragraph("课后作业")
+    document.save(docx_path)
+
+    pdf_path = tmp_path / "scan.pdf"
+    doc = fitz.open()
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 16, 16), False)
+    pixmap.clear_with(200)
+    for _ in range(2):
+        doc.new_page().insert_image(fitz.Rect(72, 72, 272, 272), pixmap=pixmap)
+    doc.save(pdf_path)
+
+    assert inspect_ingest_file(pptx_path, "pptx").pages == 3
+    # python-docx 的默认模板本身不含段落
+    assert inspect_ingest_file(docx_path, "docx").pages == 2
+    pdf = inspect_ingest_file(pdf_path, "pdf")
+    assert (pdf.pages, pdf.scanned_pages) == (2, 2)
+    # 低分辨率配置档的扫描页代价按像素数缩小
+    assert prior_stage_costs(pdf, "pdf", FAST)["extract"] == pytest.approx(
+        2 * PDF_SCANNED_PAGE_COST * 0.25
+    )
+
+
+def test_estimate_is_calibrated_by_history(temp_db, tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_bytes(b"x" * 1024 * 1024)
+
+    async def run():
+        db = await get_standalone_db()
+        try:
+            before = await estimate_ingest(db, path, "txt")
+            # 其他配置档与文档类型的记录不影响校准
+            await record_ingest_timing(db, "a", "txt", ACCURATE.name, "extract", 10, 20)
+            await record_ingest_timing(db, "b", "txt", FAST.name, "extract", 10, 90)
+            await record_ingest_timing(db, "c", "pdf", ACCURATE.name, "embed", 10, 90)
+            await db.commit()
+            after = await estimate_ingest(db, path, "txt")
+            cached = await estimate_ingest(db, path, "txt", cached=True)
+            return before, after, cached
+        finally:
+            await db.close()
+
+    before, after, cached = asyncio.run(run())
+    assert after.stages["extract"] == pytest.approx(2 * before.stages["extract"])
+    assert after.stages["embed"] == pytest.approx(before.stages["embed"])
+    assert cached.stages["extract"] == 0
+    assert after.total > before.total
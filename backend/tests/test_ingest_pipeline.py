@@ -0,0 +1,106 @@
+import asyncio
+
+from app.config import settings
+from app.embedding.chunk import chunk_hash
+from app.embedding.document_ir import Page
+from app.services import ingest_pipeline
+
+
+class FakeVectorDB:
+    def __init__(self, chunks: dict[str, str] | None = None):
+        # 文档块 ID → 文本
+        self.chunks = dict(chunks or {})
+        self.metadata = {
+            id: {"chunk_hash": chunk_hash(text)} for id, text in self.chunks.items()
+        }
+        self.added: list[list[str]] = []
+        self.updated: list[str] = []
+
+    async def add(self, texts, doc_id, ids=None, anchors=None):
+        self.added.append(list(texts))
+        self.chunks.update(zip(ids, texts))
+        for id, text, anchor in zip(ids, texts, anchors):
+            self.metadata[id] = {"chunk_hash": chunk_hash(text), **anchor}
+
+    def get_chunk_metadata(self, doc_id):
+        return {id: dict(metadata) for id, metadata in self.metadata.items()}
+
+    def update_metadata(self, ids, metadatas):
+        self.updated.extend(ids)
+        self.metadata.update(zip(ids, metadatas))
+
+    def delete_ids(self, ids):
+        for id in ids:
+            del self.chunks[id]
+            del self.metadata[id]
+
+
+async def _pages(pages: list[str]):
+    for number, text in enumerate(pages):
+        yield Page.from_text(number, text)
+
+
+def _run(pages: list[str], **kwargs) -> int:
+    return asyncio.run(
+        ingest_pipeline.run_ingest_pipeline(
+            "doc", _pages(pages), max_chunk_size=700, overlap_size=50, **kwargs
+        )
+    )
+
+
+def test_pipeline_chunks_and_embeds_pages_in_batches(monkeypatch):
+    fake = FakeVectorDB()
+    monkeypatch.setattr(ingest_pipeline, "vector_db", fake)
+    monkeypatch.setattr(settings, "EMBEDDING_BATCH_SIZE", 3)
+    reported = []
+    extracted = []
+
+    async def on_extracted():
+        extracted.append(True)
+
+    pages = ["\n".join(f"第{page}页第{line}行" for line in range(2)) for page in range(4)]
+    count = _run(
+        pages,
+        progress=lambda *item: reported.append(item),
+        on_extracted=on_extracted,
+    )
+
+    assert count == 8
+    assert [len(texts) for texts in fake.added] == [3, 3, 2]
+    assert fake.added[0][0] == "第0页第0行"
+    assert len(fake.chunks) == 8
+    assert extracted == [True]
+    assert reported[-1] == ("embed", 8, 8)
+
+
+def test_pipeline_only_embeds_changed_chunks(monkeypatch):
+    fake = FakeVectorDB({"doc_0": "不变", "doc_1": "旧内容", "doc_2": "重复", "doc_3": "重复"})
+    monkeypatch.setattr(ingest_pipeline, "vector_db", fake)
+
+    count = _run(["不变\n新内容\n重复"])
+
+    assert count == 3
+    assert fake.added == [["新内容"]]
+    assert sorted(fake.chunks.values()) == ["不变", "新内容", "重复"]
+    assert "doc_0" in fake.chunks
+
+
+def test_pipeline_records_chunk_anchors(monkeypatch):
+    fake = FakeVectorDB()
+    monkeypatch.setattr(ingest_pipeline, "vector_db", fake)
+
+    _run(["标题\n\n正文", "第二页"])
+    (body_id,) = [id for id, text in fake.chunks.items() if text == "正文"]
+    assert fake.metadata[body_id] == {
+        "chunk_hash": chunk_hash("正文"),
+        "page": 0,
+        "start": 4,
+        "end": 6,
+    }
+
+    # 内容不变、位置变化的文档块只更新位置
+    _run(["新的标题\n正文", "第二页"])
+
+    assert fake.updated == [body_id]
+    assert fake.metadata[body_id]["start"] == 5
+    assert fake.added[-1] == ["新的标题"]
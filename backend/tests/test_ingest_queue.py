@@ -0,0 +1,182 @@
+import asyncio
+
+import pytest
+from app.config import settings
+from app.database import get_standalone_db, init_db
+from app.services.ingest_queue import IngestQueue
+from app.utils.admission import QueueFullError
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{tmp_path / 'rag.db'}")
+    monkeypatch.setattr(settings, "INGEST_RETRY_BACKOFF", 0)
+    monkeypatch.setattr(settings, "INGEST_POLL_INTERVAL", 0.05)
+    asyncio.run(init_db())
+
+
+async def _insert_document(db, document_id: str, status: str = "processing"):
+    await db.execute(
+        "INSERT INTO documents (id, filename, type, status) VALUES (?, ?, ?, ?)",
+        (document_id, f"{document_id}.txt", "txt", status),
+    )
+    await db.commit()
+
+
+async def _wait_for_job(db, document_id: str, status: str):
+    for _ in range(100):
+        cursor = await db.execute(
+            "SELECT * FROM ingest_jobs WHERE document_id = ?", (document_id,)
+        )
+        job = await cursor.fetchone()
+        if job and job["status"] == status:
+            return job
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"job of {document_id} never reached {status}")
+
+
+def test_retries_failed_job(temp_db):
+    calls = []
+
+    async def handler(document_id):
+        calls.append(document_id)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+
+    async def run():
+        queue = IngestQueue(handler)
+        db = await get_standalone_db()
+        try:
+            await _insert_document(db, "a")
+            await queue.start(workers=1)
+            await queue.enqueue(db, "a")
+            job = await _wait_for_job(db, "a", "done")
+            await queue.stop()
+            return job
+        finally:
+            await db.close()
+
+    job = asyncio.run(run())
+    assert calls == ["a", "a"]
+    assert job["attempts"] == 2
+
+
+def test_marks_document_failed_after_max_attempts(temp_db, monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_MAX_ATTEMPTS", 2)
+
+    async def handler(document_id):
+        raise RuntimeError("boom")
+
+    async def run():
+        queue = IngestQueue(handler)
+        db = await get_standalone_db()
+        try:
+            await _insert_document(db, "a")
+            await queue.start(workers=1)
+            await queue.enqueue(db, "a")
+            await _wait_for_job(db, "a", "failed")
+            await queue.stop()
+            cursor = await db.execute("SELECT * FROM documents WHERE id = 'a'")
+            return await cursor.fetchone()
+        finally:
+            await db.close()
+
+    document = asyncio.run(run())
+    assert document["status"] == "failed"
+    assert document["message"] == "boom"
+
+
+def test_recovers_interrupted_jobs(temp_db):
+    handled = []
+
+    async def handler(document_id):
+        handled.append(document_id)
+
+    async def run():
+        db = await get_standalone_db()
+        try:
+            await _insert_document(db, "running")
+            await _insert_document(db, "legacy")
+            await db.execute(
+                """
+                INSERT INTO ingest_jobs (document_id, status, attempts)
+                VALUES ('running', 'running', 1)
+                """
+            )
+            await db.commit()
+
+            queue = IngestQueue(handler)
+            await queue.start(workers=2)
+            await _wait_for_job(db, "running", "done")
+            await _wait_for_job(db, "legacy", "done")
+            await queue.stop()
+        finally:
+            await db.close()
+
+    asyncio.run(run())
+    assert sorted(handled) == ["legacy", "running"]
+
+
+def test_claims_cheap_jobs_first_with_aging(temp_db, monkeypatch):
+    async def handler(document_id):
+        pass
+
+    async def run():
+        queue = IngestQueue(handler)
+        db = await get_standalone_db()
+        try:
+            for document_id in ["big", "small", "medium"]:
+                await _insert_document(db, document_id)
+            await queue.enqueue(db, "big", cost=1800)
+            await queue.enqueue(db, "small", cost=2)
+            await queue.enqueue(db, "medium", cost=60)
+            schedule = await queue.schedule(db)
+
+            first = await queue._claim(db)
+            # 大任务已等待足够久，老化补偿使其排在新的小任务之前
+            await db.execute(
+                "UPDATE ingest_jobs SET enqueued_at = enqueued_at - 3600 WHERE document_id = 'big'"
+            )
+            await db.commit()
+            second = await queue._claim(db)
+            return schedule, first["document_id"], second["document_id"]
+        finally:
+            await db.close()
+
+    schedule, first, second = asyncio.run(run())
+    assert {id: position for id, (position, _) in schedule.items()} == {
+        "small": 1,
+        "medium": 2,
+        "big": 3,
+    }
+    # 前面任务的估计耗时由 worker 均分，再加上自身的估计耗时
+    assert schedule["big"] == (3, 62 / settings.INGEST_WORKERS + 1800)
+    assert first == "small"
+    assert second == "big"
+
+
+def test_rejects_documents_when_queue_is_full(temp_db, monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_MAX_QUEUED", 2)
+    monkeypatch.setattr(settings, "INGEST_WORKERS", 2)
+
+    async def handler(document_id):
+        pass
+
+    async def run():
+        queue = IngestQueue(handler)
+        db = await get_standalone_db()
+        try:
+            for document_id, cost in [("a", 30), ("b", 50)]:
+                await _insert_document(db, document_id)
+                await queue.check_capacity(db)
+                await queue.enqueue(db, document_id, cost=cost)
+            with pytest.raises(QueueFullError) as e:
+                await queue.check_capacity(db)
+            return e.value, await queue.metrics(db)
+        finally:
+            await db.close()
+
+    error, metrics = asyncio.run(run())
+    assert error.retry_after == 20
+    assert metrics["queued"] == 2
+    assert metrics["queued_cost"] == 80
@@ -0,0 +1,59 @@
+from app.embedding import doc_to_text_utils
+from docx import Document
+from pptx import Presentation
+from pptx.util import Inches
+
+
+def test_iter_docx_blocks_includes_tables_in_order(tmp_path):
+    path = tmp_path / "lesson.docx"
+    document = Document()
+    document.add_paragraph("教学目标")
+    table = document.add_table(rows=2, cols=2)
+    table.cell(0, 0).text = "章节"
+    table.cell(0, 1).text = "课时"
+    table.cell(1, 0).text = "电路基础"
+    table.cell(1, 1).text = "4"
+    document.add_paragraph("课后作业")
+    document.save(path)
+
+    blocks = list(doc_to_text_utils.iter_docx_blocks(path))
+
+    assert [(b.kind, b.text) for b in blocks] == [
+        ("paragraph", "教学目标"),
+        ("table_row", "章节 | 课时"),
+        ("table_row", "电路基础 | 4"),
+        ("paragraph", "课后作业"),
+    ]
+    pages = list(doc_to_text_utils.iter_file_pages(path, "docx"))
+    assert [page.number for page in pages] == [0]
+    assert pages[0].blocks[3].start == len("教学目标\n章节 | 课时\n电路基础 | 4\n")
+
+
+def test_iter_pptx_blocks_yields_per_slide(tmp_path):
+    path = tmp_path / "deck.pptx"
+    prs = Presentation()
+    for title in ["第一讲", "第二讲"]:
+        slide = prs.slides.add_slide(prs.slide_layouts[5])
+        slide.shapes.title.text = title
+        rows = slide.shapes.add_table(1, 2, Inches(1), Inches(2), Inches(4), Inches(1))
+        rows.table.cell(0, 0).text = "定义"
+        rows.table.cell(0, 1).text = title
+        slide.notes_slide.notes_text_frame.text = f"{title}讲稿"
+    prs.save(path)
+
+    blocks = list(doc_to_text_utils.iter_pptx_blocks(path))
+    pages = list(doc_to_text_utils.iter_file_pages(path, "pptx"))
+
+    assert [(b.page, b.kind) for b in blocks[:3]] == [
+        (0, "paragraph"),
+        (0, "table_row"),
+        (0, "note"),
+    ]
+    assert blocks[1].text == "定义 | 第一讲"
+    assert blocks[1].bbox == (72.0, 144.0, 360.0, 216.0)
+    assert [page.number for page in pages] == [0, 1]
+    assert pages[0].blocks[1].bbox == blocks[1].bbox
+    assert [page.text for page in pages] == [
+        "第一讲\n定义 | 第一讲\n备注: 第一讲讲稿",
+        "第二讲\n定义 | 第二讲\n备注: 第二讲讲稿",
+    ]
@@ -0,0 +1,119 @@
+import fitz
+from app.embedding import doc_to_text_utils
+from app.embedding.document_ir import TextBlock
+from app.embedding.extract_profile import FAST
+from app.utils.pdf import (
+    BLANK_PAGE,
+    SCANNED_PAGE,
+    TEXT_PAGE,
+    classify_pdf,
+    is_text_pdf,
+)
+
+TEXT = "Born-digital lecture notes with a real text layer on this page."
+
+
+def _make_mixed_pdf(path):
+    """文字页、扫描页、空白页、文字页"""
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), TEXT)
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 16, 16), False)
+    pixmap.clear_with(200)
+    doc.new_page().insert_image(fitz.Rect(72, 72, 272, 272), pixmap=pixmap)
+    doc.new_page()
+    doc.new_page().insert_text((72, 72), TEXT.upper())
+    doc.save(path)
+
+
+def test_classify_pdf_pages(tmp_path):
+    path = tmp_path / "mixed.pdf"
+    _make_mixed_pdf(path)
+
+    result = classify_pdf(path, early_exit=False)
+
+    assert result.pages == {0: TEXT_PAGE, 1: SCANNED_PAGE, 2: BLANK_PAGE, 3: TEXT_PAGE}
+    assert result.text_ratio == 2 / 3
+    assert result.is_text
+
+
+def test_classify_pdf_exits_early_and_samples(tmp_path):
+    path = tmp_path / "book.pdf"
+    doc = fitz.open()
+    for _ in range(200):
+        doc.new_page().insert_text((72, 72), TEXT)
+    doc.save(path)
+
+    early = classify_pdf(path)
+    sampled = classify_pdf(path, sample_pages=20, early_exit=False)
+
+    assert early.is_text and not early.complete
+    assert len(early.pages) < 20
+    assert len(sampled.pages) == 20 and sampled.text_ratio == 1.0
+    assert is_text_pdf(path)
+
+
+def test_iter_pdf_pages_only_ocrs_scanned_pages(tmp_path, monkeypatch):
+    path = tmp_path / "mixed.pdf"
+    _make_mixed_pdf(path)
+    ocr_requests = []
+
+    def fake_ocr(pdf_path, progress=None, pages=None, profile=None):
+        ocr_requests.append(list(pages))
+        for page in pages:
+            yield page, [
+                TextBlock(text=f"ocr page {page}", kind="paragraph", bbox=(72, 72, 272, 96)),
+                TextBlock(text="", kind="paragraph", bbox=(0, 0, 1, 1)),
+            ]
+
+    monkeypatch.setattr(doc_to_text_utils, "iter_ocr_pdf_blocks", fake_ocr)
+    reported = []
+
+    pages = list(
+        doc_to_text_utils.iter_pdf_pages(path, lambda *item: reported.append(item))
+    )
+
+    assert ocr_requests == [[1]]
+    assert [page.number for page in pages] == [0, 1, 2, 3]
+    assert TEXT in pages[0].text
+    assert pages[1].text == "ocr page 1"
+    assert [b.bbox for b in pages[1].blocks] == [(72, 72, 272, 96)]
+    assert TEXT.upper() in pages[3].text
+    assert reported[-1] == ("extract", 4, 4)
+
+
+def test_fast_profile_reads_text_layer(tmp_path, monkeypatch):
+    path = tmp_path / "mixed.pdf"
+    _make_mixed_pdf(path)
+    ocr_profiles = []
+
+    def fake_ocr(pdf_path, progress=None, pages=None, profile=None):
+        ocr_profiles.append(profile)
+        for page in pages:
+            yield page, [TextBlock(text="ocr", kind="paragraph")]
+
+    monkeypatch.setattr(doc_to_text_utils, "iter_ocr_pdf_blocks", fake_ocr)
+    monkeypatch.setattr(
+        doc_to_text_utils.pymupdf4llm,
+        "to_markdown",
+        lambda *args, **kwargs: (_ for _ in ()).throw(AssertionError("markdown")),
+    )
+
+    pages = list(doc_to_text_utils.iter_pdf_pages(path, profile=FAST))
+
+    assert ocr_profiles == [FAST]
+    assert pages[0].text.strip() == TEXT
+    assert pages[1].text == "ocr"
+
+
+def test_pdf_segments_split_text_ranges_and_group_scans():
+    kinds = [TEXT_PAGE] * 5 + [SCANNED_PAGE] * 3 + [BLANK_PAGE, TEXT_PAGE]
+
+    segments = doc_to_text_utils.pdf_segments(kinds, range_pages=2)
+
+    assert segments == [
+        (False, [0, 1]),
+        (False, [2, 3]),
+        (False, [4]),
+        (True, [5, 6, 7]),
+        (False, [8, 9]),
+    ]
@@ -0,0 +1,47 @@
+import asyncio
+from pathlib import Path
+
+import aiosqlite
+from app.services.progress import DocumentProgress
+
+SCHEMA_PATH = Path(__file__).parent.parent / "schema.sql"
+
+
+async def _prepare_db() -> aiosqlite.Connection:
+    db = await aiosqlite.connect(":memory:")
+    db.row_factory = aiosqlite.Row
+    await db.executescript(SCHEMA_PATH.read_text(encoding="utf-8"))
+    await db.execute(
+        "INSERT INTO documents (id, filename, type, status) VALUES ('a', 'a.pdf', 'pdf', 'processing')"
+    )
+    await db.commit()
+    return db
+
+
+def test_progress_writes_are_coalesced():
+    async def run():
+        db = await _prepare_db()
+        try:
+            before = db.total_changes
+            async with DocumentProgress(db, "a", interval=60) as progress:
+                for page in range(1, 401):
+                    progress.report("render", page, 400)
+                for region in range(1, 1001):
+                    progress.report("ocr", region, 1000)
+            # 一次进度更新 + updated_at 触发器
+            changes = db.total_changes - before
+            cursor = await db.execute("SELECT progress, message FROM documents")
+            return changes, tuple(await cursor.fetchone())
+        finally:
+            await db.close()
+
+    changes, row = asyncio.run(run())
+    assert changes <= 2
+    assert row == (70, "文字识别 1000/1000")
+
+
+def test_progress_never_goes_backwards():
+    progress = DocumentProgress(None, "a", interval=60)  # type: ignore
+    progress.report("embed", 50, 100)
+    progress.report("render", 1, 100)
+    assert progress.progress == 87
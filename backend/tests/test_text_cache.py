@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+from app.config import settings
+from app.embedding import text_cache
+from app.embedding.document_ir import Page, TextBlock
+from app.embedding.extract_profile import ACCURATE, FAST
+
+
+async def _pages(pages, fail_after=None):
+    for i, text in enumerate(pages):
+        if i == fail_after:
+            raise RuntimeError("extraction failed")
+        yield Page.from_text(i, text)
+
+
+async def _consume(pages):
+    return [page async for page in pages]
+
+
+def test_cache_pages_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIR", tmp_path)
+    stale = text_cache.cache_dir() / "abc.accurate.oldsignature.jsonl.gz"
+    stale.parent.mkdir(parents=True)
+    stale.write_bytes(b"")
+    pages = _pages(["第一页", "第二页"])
+
+    written = asyncio.run(_consume(text_cache.cache_pages("abc", ACCURATE, pages)))
+
+    assert [page.text for page in written] == ["第一页", "第二页"]
+    assert text_cache.has_cached_pages("abc", ACCURATE)
+    assert not text_cache.has_cached_pages("abc", FAST)
+    assert not stale.exists()
+    cached = text_cache.iter_cached_pages("abc", ACCURATE)
+    assert asyncio.run(_consume(cached)) == written
+
+    text_cache.remove_cached_pages("abc")
+    assert not text_cache.has_cached_pages("abc", ACCURATE)
+
+
+def test_cache_discards_incomplete_extraction(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIR", tmp_path)
+
+    pages = _pages(["a", "b"], fail_after=1)
+    with pytest.raises(RuntimeError):
+        asyncio.run(_consume(text_cache.cache_pages("abc", ACCURATE, pages)))
+
+    assert not text_cache.has_cached_pages("abc", ACCURATE)
+    assert list(text_cache.cache_dir().iterdir()) == []
+
+
+def test_page_round_trips_blocks_and_offsets():
+    page = Page.from_blocks(
+        3,
+        [
+            TextBlock(text="标题", kind="paragraph", bbox=(0, 0, 10, 5)),
+            TextBlock(text="章节 | 课时", kind="table_row"),
+        ],
+    )
+
+    restored = Page.from_dict(page.to_dict())
+
+    assert restored == page
+    assert restored.text == "标题\n章节 | 课时"
+    assert [(b.page, b.start, b.end) for b in restored.blocks] == [(3, 0, 2), (3, 3, 10)]
+    assert restored.blocks[0].bbox == (0, 0, 10, 5)
+    assert [b.text for b in Page.from_text(0, "# 标题\n\n第一段\n续行\n\n").blocks] == [
+        "# 标题",
+        "第一段\n续行",
+    ]
@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import io
+
+import pytest
+from app.utils.upload import UploadTooLargeError, save_upload_file
+from fastapi import UploadFile
+
+
+def test_save_upload_file_streams_and_hashes(tmp_path):
+    content = b"0123456789" * 1000
+    dest = tmp_path / "doc"
+    upload = UploadFile(io.BytesIO(content), filename="test.txt")
+
+    size, digest = asyncio.run(save_upload_file(upload, dest, 1 << 20, chunk_size=64))
+
+    assert size == len(content)
+    assert digest == hashlib.sha256(content).hexdigest()
+    assert dest.read_bytes() == content
+    assert not (tmp_path / "doc.part").exists()
+
+
+def test_save_upload_file_rejects_oversized(tmp_path):
+    dest = tmp_path / "doc"
+    upload = UploadFile(io.BytesIO(b"x" * 1000), filename="test.txt")
+
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(save_upload_file(upload, dest, 100, chunk_size=64))
+
+    assert not dest.exists()
+    assert not (tmp_path / "doc.part").exists()
+
+
+def test_create_documents_from_archive(tmp_path, monkeypatch):
+    import zipfile
+    from pathlib import Path
+
+    import aiosqlite
+    from app.config import settings
+    from app.services.document_service import DocumentService
+
+    monkeypatch.setattr(settings, "UPLOAD_DIR", tmp_path)
+    schema = (Path(__file__).parent.parent / "schema.sql").read_text(encoding="utf-8")
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr("course/lecture.txt", "第一讲")
+        zf.writestr("course/notes.md", "# 笔记")
+        zf.writestr("course/tool.exe", b"MZ")
+        zf.writestr("course/empty.txt", "")
+        zf.writestr("__MACOSX/course/._lecture.txt", "junk")
+    buffer.seek(0)
+
+    async def run():
+        db = await aiosqlite.connect(":memory:")
+        db.row_factory = aiosqlite.Row
+        await db.executescript(schema)
+        try:
+            service = DocumentService(db)
+            results = await service.create_documents_from_archive(
+                UploadFile(buffer, filename="course.zip"), profile="fast"
+            )
+            cursor = await db.execute("SELECT document_id FROM ingest_jobs")
+            jobs = [row[0] for row in await cursor.fetchall()]
+            cursor = await db.execute("SELECT id, type, profile FROM documents")
+            rows = await cursor.fetchall()
+            assert {row[2] for row in rows} == {"fast"}
+            types = {row[0]: row[1] for row in rows}
+            return results, jobs, types
+        finally:
+            await db.close()
+
+    results, jobs, types = asyncio.run(run())
+
+    assert [r["filename"] for r in results] == ["lecture.txt", "notes.md", "empty.txt"]
+    created = [r["id"] for r in results if "id" in r]
+    assert len(created) == 2
+    assert results[2]["error"] == "文件大小为0"
+    assert sorted(jobs) == sorted(created)
+    assert sorted(types.values()) == ["md", "txt"]
+    assert (tmp_path / created[0]).read_text(encoding="utf-8") == "第一讲"
+
+
+def test_duplicate_upload_completes_without_queueing(tmp_path, monkeypatch):
+    from pathlib import Path
+
+    import aiosqlite
+    from app.config import settings
+    from app.services import document_service
+    from app.services.document_service import DocumentService, ingest_signature
+
+    monkeypatch.setattr(settings, "UPLOAD_DIR", tmp_path)
+    schema = (Path(__file__).parent.parent / "schema.sql").read_text(encoding="utf-8")
+    content = "第一讲".encode("utf-8")
+    copies = []
+
+    class FakeVectorDB:
+        def remove(self, doc_id):
+            pass
+
+        async def copy(self, src_doc_id, dst_doc_id):
+            copies.append((src_doc_id, dst_doc_id))
+            return 3
+
+    async def no_estimate(*args, **kwargs):
+        raise AssertionError("复用的文档不应估计处理耗时")
+
+    monkeypatch.setattr(document_service, "vector_db", FakeVectorDB())
+    monkeypatch.setattr(document_service, "estimate_ingest", no_estimate)
+
+    async def run():
+        db = await aiosqlite.connect(":memory:")
+        db.row_factory = aiosqlite.Row
+        await db.executescript(schema)
+        try:
+            await db.execute(
+                """
+                INSERT INTO documents (
+                    id, filename, type, status, content_hash, profile, ingest_signature
+                ) VALUES ('first', 'a.txt', 'txt', 'completed', ?, 'fast', ?)
+                """,
+                (hashlib.sha256(content).hexdigest(), ingest_signature()),
+            )
+            document = await DocumentService(db).create_document(
+                UploadFile(io.BytesIO(content), filename="b.txt"), "txt", profile="fast"
+            )
+            cursor = await db.execute("SELECT COUNT(*) FROM ingest_jobs")
+            (jobs,) = await cursor.fetchone()
+            return document, jobs
+        finally:
+            await db.close()
+
+    document, jobs = asyncio.run(run())
+
+    assert document["status"] == "completed"
+    assert document["chunk_size"] == 3
+    assert copies == [("first", document["id"])]
+    assert jobs == 0
+
+
+def test_bulk_upload_limits_apply_across_archives(tmp_path, monkeypatch):
+    import zipfile
+    from pathlib import Path
+
+    import aiosqlite
+    from app.api.endpoints import knowledge
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(settings, "MAX_BULK_UPLOAD_FILES", 3)
+    monkeypatch.setattr(settings, "MAX_BULK_UPLOAD_SIZE", 25)
+    schema = (Path(__file__).parent.parent / "schema.sql").read_text(encoding="utf-8")
+
+    def archive(name, entries):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zf:
+            for entry, content in entries.items():
+                zf.writestr(entry, content)
+        buffer.seek(0)
+        return UploadFile(buffer, filename=name)
+
+    files = [
+        archive("first.zip", {"a.txt": "a" * 10, "b.txt": "b" * 10}),
+        archive("second.zip", {"c.txt": "c" * 10, "d.txt": "dd"}),
+        UploadFile(io.BytesIO(b"e"), filename="e.txt"),
+    ]
+
+    async def run():
+        db = await aiosqlite.connect(":memory:")
+        db.row_factory = aiosqlite.Row
+        await db.executescript(schema)
+        try:
+            response = await knowledge.upload_documents_bulk(
+                files=files, description=None, profile="fast", db=db
+            )
+            cursor = await db.execute("SELECT COUNT(*) FROM documents")
+            (count,) = await cursor.fetchone()
+            return response["documents"], count
+        finally:
+            await db.close()
+
+    results, count = asyncio.run(run())
+
+    assert [r["filename"] for r in results] == ["a.txt", "b.txt", "c.txt", "d.txt", "e.txt"]
+    assert all("id" in r for r in results[:2])
+    assert results[2]["error"] == "文件总大小超过限制"
+    # 失败的条目也占用文件数量
+    assert results[3]["error"] == results[4]["error"] == "文件数量超过限制"
+    assert count == 2